@@ -0,0 +1,124 @@
+#
+# Project Ginger Base
+#
+# Copyright IBM Corp, 2017
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+"""Threshold alert rules evaluated on the host statistics samples."""
+
+import operator
+import re
+
+# <metric> <operator> <threshold> [for <seconds>s] [clear <threshold>]
+ALERT_RULE_RE = re.compile(r'^\s*([\w.]+)\s*(>=|<=|>|<)\s*([-+\d.eE]+)'
+                           r'(?:\s+for\s+(\d+)s?)?'
+                           r'(?:\s+clear\s+([-+\d.eE]+))?\s*$')
+ALERT_OPERATORS = {'>': operator.gt, '>=': operator.ge,
+                   '<': operator.lt, '<=': operator.le}
+ALERT_RAISED = 'raised'
+ALERT_CLEARED = 'cleared'
+
+
+class AlertRule(object):
+    """A threshold on a sample value, with hysteresis.
+
+    The alert is raised once the condition has held for the rule duration,
+    and cleared once the value crosses back the clear threshold, which
+    defaults to the raise threshold. Each transition is reported once,
+    whatever the number of samples evaluated in between.
+
+    Args:
+        name (str): the rule name.
+        rule (str): the rule, as '<metric> <operator> <threshold>
+            [for <seconds>s] [clear <threshold>]', for instance
+            'cpu_utilization > 90 for 60s clear 80'.
+
+    Raises:
+        ValueError: if the rule cannot be parsed, or if the clear threshold
+            is on the wrong side of the raise threshold.
+
+    """
+
+    def __init__(self, name, rule):
+        match = ALERT_RULE_RE.match(rule)
+        if match is None:
+            raise ValueError("invalid alert rule '%s'" % rule)
+
+        self.name = name
+        self.rule = rule.strip()
+        self.metric, op, threshold, duration, clear = match.groups()
+        self._compare = ALERT_OPERATORS[op]
+        self.threshold = float(threshold)
+        self.duration = int(duration or 0)
+        self.clear = float(clear) if clear is not None else self.threshold
+        # the clear threshold must not satisfy the condition, for instance
+        # be at most the threshold of a '>' rule
+        if self.clear != self.threshold and \
+                self._compare(self.clear, self.threshold):
+            raise ValueError("invalid clear threshold in '%s'" % rule)
+
+        self.active = False
+        # time of the last transition, and of the first sample meeting the
+        # condition while not active
+        self.since = None
+        self._pending = None
+        self.value = None
+
+    def evaluate(self, value, timestamp):
+        """Evaluate the rule on a sample.
+
+        Args:
+            value (float): the metric value, None or NaN if unknown, which
+                leaves the rule state unchanged.
+            timestamp (float): time the sample was collected.
+
+        Returns:
+            str: ALERT_RAISED or ALERT_CLEARED on a transition, else None.
+
+        """
+        if value is None or value != value:
+            return None
+
+        self.value = value
+        if self.active:
+            if not self._compare(value, self.clear):
+                self.active = False
+                self.since = timestamp
+                return ALERT_CLEARED
+        elif self._compare(value, self.threshold):
+            if self._pending is None:
+                self._pending = timestamp
+            if timestamp - self._pending >= self.duration:
+                self.active = True
+                self.since = timestamp
+                self._pending = None
+                return ALERT_RAISED
+        else:
+            self._pending = None
+        return None
+
+    def info(self):
+        """Get the rule and its state.
+
+        Returns:
+            dict: the rule 'name', 'rule' text and 'metric', whether it is
+                'active', the time of its last transition ('since') and the
+                last 'value' evaluated.
+
+        """
+        return {'name': self.name, 'rule': self.rule, 'metric': self.metric,
+                'active': self.active, 'since': self.since,
+                'value': self.value}
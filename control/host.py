@@ -19,8 +19,11 @@
 # License along with this library; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
 
+import cherrypy
+
 from wok.control.base import Collection, Resource
-from wok.control.utils import UrlSubNode
+from wok.control.utils import model_fn, UrlSubNode
+from wok.exception import InvalidOperation, InvalidParameter
 
 from wok.plugins.gingerbase.control.smt import Smt
 from wok.plugins.gingerbase.control.cpuinfo import CPUInfo
@@ -28,6 +31,13 @@ from wok.plugins.gingerbase.control.packagesupdate import PackagesUpdate
 from wok.plugins.gingerbase.control.packagesupdate import SwUpdateProgress
 
 
+# media types of the host statistics history formats
+HISTORY_FORMATS = {
+    'application/json': 'json',
+    'text/csv': 'csv',
+    'application/vnd.gingerbase.columns': 'columns',
+}
+
 HOST_ACTIVITY = {
     'POST': {
         'reboot': "GGBHOST0001L",
@@ -36,6 +46,14 @@ HOST_ACTIVITY = {
     },
 }
 
+ALERTS_ACTIVITY = {
+    'POST': {'default': "GGBHOST0003L"},
+}
+
+ALERT_ACTIVITY = {
+    'DELETE': {'default': "GGBHOST0004L"},
+}
+
 REPOSITORIES_ACTIVITY = {
     'POST': {'default': "GGBREPOS0001L"},
 }
@@ -77,17 +95,131 @@ class HostStats(Resource):
     def __init__(self, model, id=None):
         super(HostStats, self).__init__(model, id)
         self.history = HostStatsHistory(self.model)
+        self.stream = HostStatsStream(self.model)
+        self.processes = HostStatsProcesses(self.model)
+        self.alerts = HostStatsAlerts(self.model)
 
     @property
     def data(self):
         return self.info
 
+    def lookup(self):
+        # the 'groups' query string parameter selects the detailed statistics
+        lookup = getattr(self.model, model_fn(self, 'lookup'))
+        self.info = lookup(*self.model_args, **cherrypy.request.params)
+
 
 class HostStatsHistory(Resource):
     @property
     def data(self):
         return self.info
 
+    def get(self):
+        # the format query string parameter takes precedence over the
+        # Accept header
+        fmt = cherrypy.request.params.get('format')
+        if fmt is None:
+            fmt = 'json'
+            for accept in cherrypy.request.headers.elements('Accept'):
+                if accept.value in HISTORY_FORMATS:
+                    fmt = HISTORY_FORMATS[accept.value]
+                    break
+
+        cherrypy.response.headers['Vary'] = 'Accept'
+        if fmt == 'json':
+            return super(HostStatsHistory, self).get()
+
+        params = dict(cherrypy.request.params, format=fmt)
+        export = getattr(self.model, model_fn(self, 'export'))
+        data = export(*self.model_args, **params)
+        media_type = dict((f, m) for m, f in HISTORY_FORMATS.iteritems())
+        cherrypy.response.headers['Content-Type'] = media_type[fmt]
+        cherrypy.response.headers['Content-Disposition'] = \
+            'attachment; filename="host-stats.%s"' % fmt
+        return data
+
+    def lookup(self):
+        # the query string parameters select the history resolution and range
+        lookup = getattr(self.model, model_fn(self, 'lookup'))
+        self.info = lookup(*self.model_args, **cherrypy.request.params)
+
+
+class HostStatsProcesses(Resource):
+    @property
+    def data(self):
+        return self.info
+
+    def lookup(self):
+        # the 'top' query string parameter sets the number of processes
+        lookup = getattr(self.model, model_fn(self, 'lookup'))
+        self.info = lookup(*self.model_args, **cherrypy.request.params)
+
+
+class HostStatsAlerts(Collection):
+    def __init__(self, model):
+        super(HostStatsAlerts, self).__init__(model)
+        self.admin_methods = ['POST']
+        self.resource = HostStatsAlert
+
+        # set user log messages and make sure all parameters are present
+        self.log_map = ALERTS_ACTIVITY
+        self.log_args.update({'name': ''})
+
+
+class HostStatsAlert(Resource):
+    def __init__(self, model, ident):
+        super(HostStatsAlert, self).__init__(model, ident)
+        self.admin_methods = ['DELETE']
+        self.uri_fmt = '/host/stats/alerts/%s'
+        self.log_map = ALERT_ACTIVITY
+
+    @property
+    def data(self):
+        return self.info
+
+
+class HostStatsStream(Resource):
+    """Server-Sent Events stream of the host statistics samples."""
+
+    @cherrypy.expose
+    def index(self, *args, **kargs):
+        if cherrypy.request.method != 'GET':
+            raise cherrypy.HTTPError(405)
+
+        # EventSource clients resume from the last event id they received
+        since = cherrypy.request.headers.get('Last-Event-ID',
+                                             kargs.get('since'))
+        if since is not None:
+            try:
+                since = int(since)
+                if since < 0:
+                    raise ValueError()
+            except ValueError:
+                e = InvalidParameter('GGBHOST0008E', {'value': since})
+                raise cherrypy.HTTPError(400, e.message)
+
+        try:
+            events = self.model.hoststats_stream(since)
+        except InvalidOperation, e:
+            # every subscriber holds a server thread, clients fall back to
+            # polling the history
+            cherrypy.response.headers['Retry-After'] = '60'
+            raise cherrypy.HTTPError(503, e.message)
+        cherrypy.response.headers['Content-Type'] = 'text/event-stream'
+        cherrypy.response.headers['Cache-Control'] = 'no-cache'
+
+        def sse():
+            for seq, data in events:
+                if data is None:
+                    # keeps the connection alive, and finds out the clients
+                    # gone
+                    yield ':keepalive\n\n'
+                    continue
+                yield 'id: %d\ndata: %s\n\n' % (seq, data)
+
+        return sse()
+    index._cp_config = {'response.stream': True, 'tools.gzip.on': False}
+
 
 class Capabilities(Resource):
     def __init__(self, model, id=None):
@@ -0,0 +1,44 @@
+#
+# Project Ginger Base
+#
+# Copyright IBM Corp, 2017
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+
+import cherrypy
+
+from wok.control.base import Resource
+from wok.control.utils import UrlSubNode
+
+
+METRICS_CONTENT_TYPE = \
+    'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+
+@UrlSubNode('metrics', True)
+class Metrics(Resource):
+    """Host statistics in the OpenMetrics text format, for scrapers."""
+
+    def __init__(self, model, id=None):
+        super(Metrics, self).__init__(model, id)
+        self.uri_fmt = '/metrics'
+
+    @cherrypy.expose
+    def index(self, *args, **kargs):
+        if cherrypy.request.method != 'GET':
+            raise cherrypy.HTTPError(405)
+
+        cherrypy.response.headers['Content-Type'] = METRICS_CONTENT_TYPE
+        return self.model.metrics_lookup()
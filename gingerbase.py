@@ -33,7 +33,8 @@ class Gingerbase(WokRoot):
     def __init__(self, wok_options):
         make_dirs = [
             os.path.dirname(os.path.abspath(config.get_object_store())),
-            os.path.abspath(config.get_debugreports_path())
+            os.path.abspath(config.get_debugreports_path()),
+            os.path.abspath(config.get_stats_history_path())
         ]
         for directory in make_dirs:
             if not os.path.isdir(directory):
@@ -48,6 +48,26 @@ messages = {
     "GGBHOST0002E": _("Unable to reboot host machine as there are running virtual machines"),
     "GGBHOST0003E": _("There may be virtual machines running on the host"),
     "GGBHOST0005E": _("When specifying CPU topology, each element must be an integer greater than zero."),
+    "GGBHOST0006E": _("Host statistics history is not available at resolution %(resolution)s. "
+                      "Available resolutions (in seconds): %(resolutions)s"),
+    "GGBHOST0007E": _("Invalid value '%(value)s' for host statistics history parameter '%(name)s'. "
+                      "It must be a positive number of seconds."),
+    "GGBHOST0008E": _("Invalid host statistics sequence number '%(value)s'. It must be a non-negative integer."),
+    "GGBHOST0009E": _("Unknown host statistics group '%(group)s'. Available groups: %(groups)s"),
+    "GGBHOST0010E": _("Host statistics summaries are not available over %(window)s seconds. "
+                      "Available windows (in seconds): %(windows)s"),
+    "GGBHOST0011E": _("Invalid number of processes '%(value)s'. It must be a positive integer."),
+    "GGBHOST0012E": _("Invalid host statistics alert rule '%(rule)s'. It must be in the format "
+                      "'<metric> <operator> <threshold> [for <seconds>s] [clear <threshold>]'."),
+    "GGBHOST0013E": _("Unknown host statistics alert metric '%(metric)s'. Available metrics: %(metrics)s"),
+    "GGBHOST0014E": _("Host statistics alert rule '%(name)s' already exists."),
+    "GGBHOST0015E": _("Host statistics alert rule '%(name)s' not found."),
+    "GGBHOST0016E": _("Host statistics alert rule name must be a non-empty string."),
+    "GGBHOST0017E": _("Host statistics alert rule must be a string."),
+    "GGBHOST0018E": _("Invalid host statistics history format '%(format)s'. Valid formats are: %(formats)s."),
+    "GGBHOST0019E": _("Invalid number of host statistics history points '%(value)s'. It must be a positive integer."),
+    "GGBHOST0020E": _("Invalid host statistics history resampling method '%(method)s'. Valid methods are: %(methods)s."),
+    "GGBHOST0021E": _("Too many host statistics stream subscribers. At most %(subscribers)s clients can subscribe at a time."),
 
     "GGBPKGUPD0001E": _("No packages marked for update"),
     "GGBPKGUPD0002E": _("Package %(name)s is not marked to be updated."),
@@ -114,12 +134,17 @@ messages = {
     "GINSMT0012E": _("Zipl file does not exist."),
     "GINSMT0013E": _("SMT is not supported on '%(name)s' architecture."),
 
+    # These messages (ending with W) are for user notifications
+    "GGBHOST0001W": _("Host statistics alert '%(name)s' raised: %(rule)s (value: %(value)s)"),
+
     # These messages (ending with L) are for user log purposes
     "GGBDR0001L": _("Create host debug report '%(name)s'"),
     "GGBDR0002L": _("Update host debug report '%(ident)s'"),
     "GGBDR0003L": _("Remove host debug report '%(ident)s'"),
     "GGBHOST0001L": _("Reboot host"),
     "GGBHOST0002L": _("Shutdown host"),
+    "GGBHOST0003L": _("Add host statistics alert rule '%(name)s'"),
+    "GGBHOST0004L": _("Remove host statistics alert rule '%(ident)s'"),
     "GGBPKGUPD0001L": _("Update host software"),
     "GGBPKGUPD0002L": _("Update package '%(ident)s'"),
     "GGBREPOS0001L": _("Add host software repository '%(repo_id)s'"),
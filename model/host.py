@@ -19,31 +19,174 @@
 # License along with this library; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
 
+import bisect
+import collections
+import heapq
+import json
+import math
 import os
 import platform
 import psutil
 import re
+import threading
 import time
 from cherrypy.process.plugins import BackgroundTask
-from collections import defaultdict
-import glob
 
 from wok.asynctask import AsyncTask
 from wok.basemodel import Singleton
-from wok.exception import InvalidOperation
-from wok.exception import OperationFailed
+from wok.exception import InvalidOperation, InvalidParameter
+from wok.exception import NotFoundError, OperationFailed
 from wok.utils import run_command, wok_log
+from wok.model.notifications import add_notification
 from wok.model.tasks import TaskModel
 
-from wok.plugins.gingerbase.config import config
+from wok.plugins.gingerbase.alerts import ALERT_RAISED, AlertRule
+from wok.plugins.gingerbase.config import config, get_stats_history_path
 from wok.plugins.gingerbase.i18n import messages
 from wok.plugins.gingerbase.lscpu import LsCpu
 from wok.plugins.gingerbase.model.debugreports import DebugReportsModel
 from wok.plugins.gingerbase.model.smt import SmtModel
+from wok.plugins.gingerbase.netinfo import get_interface_type, is_wlan
+from wok.plugins.gingerbase.procstats import cgroup_attrs, cgroup_rates
+from wok.plugins.gingerbase.procstats import cpu_breakdown, cpu_busy_percent
+from wok.plugins.gingerbase.procstats import disk_rates, filesystem_rates
+from wok.plugins.gingerbase.procstats import net_rates
+from wok.plugins.gingerbase.procstats import numa_rates, power_rates
+from wok.plugins.gingerbase.procstats import PAGE_SIZE, SOFTIRQ_TYPES
+from wok.plugins.gingerbase.procstats import PRESSURE_KINDS
+from wok.plugins.gingerbase.procstats import PRESSURE_RESOURCES, ProcStats
+from wok.plugins.gingerbase.procstats import ProcessStats, PROTOCOL_COUNTERS
+from wok.plugins.gingerbase.procstats import SOCKET_COUNTS
 from wok.plugins.gingerbase.repositories import Repositories
+from wok.plugins.gingerbase.statsbuffer import CollectorHealth
+from wok.plugins.gingerbase.statsbuffer import DynamicStatsBuffer
+from wok.plugins.gingerbase.statsbuffer import FLOAT_TYPECODE, INT_TYPECODE
+from wok.plugins.gingerbase.statsbuffer import NAN
+from wok.plugins.gingerbase.statsbuffer import open_stats_buffer
+from wok.plugins.gingerbase.statsbuffer import RESAMPLE_LTTB, RESAMPLE_MINMAX
+from wok.plugins.gingerbase.statsbuffer import StatsPublisher, StatsRollup
+from wok.plugins.gingerbase.statsbuffer import StatsResampler, StatsSummary
+from wok.plugins.gingerbase.statsexport import COLUMN_FLOAT, COLUMN_INT
+from wok.plugins.gingerbase.statsexport import encode_columns, encode_csv
 from wok.plugins.gingerbase.swupdate import SoftwareUpdate
 
 HOST_STATS_INTERVAL = 1
+# without readers for HOST_STATS_IDLE_TIMEOUT seconds, samples are collected
+# every HOST_STATS_IDLE_INTERVAL seconds only
+HOST_STATS_IDLE_INTERVAL = 10
+HOST_STATS_IDLE_TIMEOUT = 300
+# Every stream subscriber holds a server thread for as long as it is
+# connected: their number is capped, so that they do not starve the other
+# requests. A comment line is sent when no sample was published for
+# HOST_STATS_STREAM_KEEPALIVE seconds, which also frees the threads of the
+# clients gone
+HOST_STATS_STREAM_SUBSCRIBERS = 10
+HOST_STATS_STREAM_KEEPALIVE = 15
+# number of samples kept in memory (1 hour) and returned by default in the
+# statistics history (1 min)
+HOST_STATS_HISTORY_DEPTH = 3600
+HOST_STATS_HISTORY_WINDOW = 60
+# downsampled history: (resolution in seconds, number of samples), that is,
+# 10 seconds for 6 hours and 1 minute for 7 days
+HOST_STATS_ROLLUPS = [(10, 2160), (60, 10080)]
+# memory statistics in bytes, and paging rates: bytes swapped in and out
+# and major page faults per second
+HOST_STATS_MEMORY = ['total', 'free', 'cached', 'buffers', 'avail',
+                     'swap_total', 'swap_used', 'dirty', 'writeback', 'slab',
+                     'hugepages_total', 'hugepages_free', 'ksm_shared',
+                     'ksm_sharing', 'committed', 'commit_limit']
+HOST_STATS_PAGING = ['swap_in_rate', 'swap_out_rate', 'major_faults']
+HOST_STATS_RATES = ['disk_read_rate', 'disk_write_rate',
+                    'net_recv_rate', 'net_sent_rate']
+# pressure stall information: avg10 and avg60 percentages, and stall time in
+# microseconds per second, of the 'some' and 'full' lines of each resource
+HOST_STATS_PRESSURE = ['avg10', 'avg60', 'stall']
+# scheduler and kernel activity: load averages, runnable and blocked tasks,
+# and context switches, interrupts, softirqs (also per type) and forks per
+# second
+HOST_STATS_KERNEL = ['load1', 'load5', 'load15', 'procs_running',
+                     'procs_blocked', 'ctxt_rate', 'intr_rate',
+                     'softirq_rate', 'forks_rate']
+# CPU power management, sampled every HOST_STATS_POWER_INTERVAL seconds:
+# average frequency of the CPUs in MHz, highest thermal zone temperature in
+# degrees Celsius, and thermal throttling events per second of all the cores
+# and of the most throttled package
+HOST_STATS_POWER = ['freq', 'temp', 'core_throttle_rate',
+                    'package_throttle_rate']
+HOST_STATS_POWER_INTERVAL = 10
+# TCP and UDP retransmits, resets, listen queue overflows and errors per
+# second, and the sockets in use by protocol and state
+HOST_STATS_PROTOCOLS = ([name + '_rate' for name, _ in PROTOCOL_COUNTERS] +
+                        [name for name, _ in SOCKET_COUNTS])
+# filesystems capacity, sampled every HOST_STATS_FILESYSTEMS_INTERVAL
+# seconds: percentage of space and of inodes used of the fullest
+# filesystems, and the shortest projected time in seconds until one is full.
+# The fill rates are calculated over the last HOST_STATS_FILL_WINDOW seconds
+HOST_STATS_FILESYSTEM = ['used_percent', 'inodes_used_percent',
+                         'time_to_full']
+HOST_STATS_FILESYSTEMS_INTERVAL = 30
+HOST_STATS_FILL_WINDOW = 3600
+# sections of the samples returned as a dictionary of their values
+HOST_STATS_FLAT_SECTIONS = [('power', HOST_STATS_POWER),
+                            ('protocols', HOST_STATS_PROTOCOLS),
+                            ('filesystem', HOST_STATS_FILESYSTEM)]
+HOST_STATS_COLUMNS = ([('cpu_utilization', FLOAT_TYPECODE)] +
+                      [('memory.' + key, INT_TYPECODE)
+                       for key in HOST_STATS_MEMORY] +
+                      [('memory.' + key, FLOAT_TYPECODE)
+                       for key in HOST_STATS_PAGING] +
+                      [(key, INT_TYPECODE) for key in HOST_STATS_RATES] +
+                      [('pressure.%s.%s.%s' % (resource, kind, key),
+                        FLOAT_TYPECODE)
+                       for resource in PRESSURE_RESOURCES
+                       for kind in PRESSURE_KINDS
+                       for key in HOST_STATS_PRESSURE] +
+                      [('kernel.' + key, FLOAT_TYPECODE)
+                       for key in HOST_STATS_KERNEL] +
+                      [('kernel.softirq.' + softirq, FLOAT_TYPECODE)
+                       for softirq in SOFTIRQ_TYPES] +
+                      [(section + '.' + key, FLOAT_TYPECODE)
+                       for section, keys in HOST_STATS_FLAT_SECTIONS
+                       for key in keys])
+# sections of the samples that can be left out, and the producer of each.
+# The columns of the sections not collected are NaN, as those not reported
+HOST_STATS_SECTIONS = [('pressure', 'pressure'), ('kernel', 'kernel'),
+                       ('protocols', 'protocols'), ('power', 'power'),
+                       ('filesystem', 'filesystems')]
+# value of the columns of a producer that failed or is disabled: NaN for
+# those returned as None when they are not reported, 0 for the others
+HOST_STATS_MISSING = dict(
+    (name, NAN if name.split('.', 1)[0] in dict(HOST_STATS_SECTIONS)
+     else 0) for name, _ in HOST_STATS_COLUMNS)
+# columns exported as integers, whatever the buffer typecode
+HOST_STATS_INT_COLUMNS = set(['memory.' + key for key in HOST_STATS_MEMORY] +
+                             HOST_STATS_RATES)
+# history resampling methods, for charts asking for a number of points
+HOST_STATS_RESAMPLE_METHODS = [RESAMPLE_MINMAX, RESAMPLE_LTTB]
+# history export formats, besides the JSON lookup
+HOST_STATS_EXPORT_FORMATS = ['csv', 'columns']
+# statistics broken down per device, returned on request only. They are kept
+# at the collection resolution for 10 minutes by default
+HOST_STATS_GROUPS = ['cpus', 'cores', 'disks', 'nics', 'cgroups', 'numa',
+                     'thermal', 'filesystems']
+HOST_STATS_GROUPS_DEPTH = 600
+# groups collected along with a section of the samples, by group
+HOST_STATS_GROUP_SECTIONS = {'thermal': 'power', 'filesystems': 'filesystem'}
+# windows in seconds of the quantiles and histograms of the CPU utilization
+# and the rates, maintained as samples are collected. The histogram buckets
+# are bounded by tens of percent and powers of ten of bytes per second
+HOST_STATS_SUMMARY_WINDOWS = [60, 300, 3600]
+HOST_STATS_SUMMARY_COLUMNS = ([('cpu_utilization', range(10, 100, 10))] +
+                              [(key, [10 ** n for n in xrange(3, 10)])
+                               for key in HOST_STATS_RATES])
+# the processes are scanned at most every 5 seconds, and the top 10 of each
+# resource returned by default
+HOST_PROCESSES_INTERVAL = 5
+HOST_PROCESSES_TOP = 10
+HOST_PROCESSES_ORDER = [
+    ('cpu', lambda process: process['cpu_utilization']),
+    ('rss', lambda process: process['rss']),
+    ('io', lambda process: process['read_rate'] + process['write_rate'])]
 DOM_STATE_MAP = {0: 'nostate',
                  1: 'running',
                  2: 'blocked',
@@ -398,145 +541,1098 @@ class HostStatsModel(object):
     __metaclass__ = Singleton
 
     def __init__(self, **kargs):
-        self.host_stats = defaultdict(list)
         gbconfig = config.get('gingerbase', {})
         self.statshistory_on = gbconfig.get('statshistory_on', True)
+        self.interval = gbconfig.get('statshistory_interval',
+                                     HOST_STATS_INTERVAL)
+        self.idle_interval = gbconfig.get('statshistory_idle_interval',
+                                          HOST_STATS_IDLE_INTERVAL)
+        self.idle_timeout = gbconfig.get('statshistory_idle_timeout',
+                                         HOST_STATS_IDLE_TIMEOUT)
+        self.stream_subscribers = gbconfig.get(
+            'statshistory_stream_subscribers', HOST_STATS_STREAM_SUBSCRIBERS)
+        self.power_interval = gbconfig.get('statshistory_power_interval',
+                                           HOST_STATS_POWER_INTERVAL)
+        self.filesystems_interval = gbconfig.get(
+            'statshistory_filesystems_interval',
+            HOST_STATS_FILESYSTEMS_INTERVAL)
+        # time of the last read of the statistics, by any client
+        self.last_read = time.time()
+        history_path = None
+        if self.statshistory_on and gbconfig.get('statshistory_persist',
+                                                 True):
+            history_path = get_stats_history_path()
+        try:
+            self._create_history(gbconfig, history_path)
+        except EnvironmentError, e:
+            wok_log.error("Unable to keep the host statistics history in "
+                          "%s, keeping it in memory only. Details: %s",
+                          history_path, e)
+            self._create_history(gbconfig, None)
+        groups_depth = gbconfig.get('statshistory_groups_depth',
+                                    HOST_STATS_GROUPS_DEPTH)
+        # only the enabled sections and groups are collected
+        sections = gbconfig.get('statshistory_sections',
+                                [section for section, _ in
+                                 HOST_STATS_SECTIONS])
+        self.disabled_producers = set(
+            producer for section, producer in HOST_STATS_SECTIONS
+            if section not in sections)
+        self.groups = [group for group in
+                       gbconfig.get('statshistory_groups', HOST_STATS_GROUPS)
+                       if group in HOST_STATS_GROUPS and
+                       (group not in HOST_STATS_GROUP_SECTIONS or
+                        HOST_STATS_GROUP_SECTIONS[group] in sections)]
+        # the groups are not persisted, their samples are numbered after
+        # the history restored
+        self.group_stats = dict(
+            (group, DynamicStatsBuffer(groups_depth, self.host_stats.seq))
+            for group in self.groups)
+        # attributes of the current devices of each group, like the type of
+        # the network interfaces, returned along with their statistics
+        self.group_attrs = dict((group, {}) for group in HOST_STATS_GROUPS)
+        self.summaries = dict(
+            (window, StatsSummary(HOST_STATS_SUMMARY_COLUMNS, window))
+            for window in gbconfig.get('statshistory_summaries',
+                                       HOST_STATS_SUMMARY_WINDOWS))
+        self._load_summaries()
+        # timestamp and cumulative counters of the previous sample, used to
+        # calculate the io rates
+        self.timestamp = None
+        self.counters = {}
+        # values of the producers sampled at a lower rate, repeated until
+        # their next sample, by producer
+        self._periodic_samples = {}
+        # (timestamp, counters) of each filesystem over the fill window
+        self._filesystem_usage = {}
+        # snapshot of the counters of the last sample, for the metrics
+        self.last_counters = {}
+        self.health = CollectorHealth(self.interval)
+        # expected time since the previous sample, and whether the
+        # background task was backing off
+        self._tick_interval = self.interval
+        self._idle = False
+        self.proc = ProcStats()
+        # every sample is published once to all the stream subscribers
+        self.publisher = StatsPublisher(json.dumps)
+        # producers, and the alerts, that failed on the last sample, logged
+        # once
+        self._failed_producers = set()
+        self.host_stats_thread = None
+        self._update_lock = threading.RLock()
+        # threshold rules evaluated on every sample, by name
+        self.alert_rules = collections.OrderedDict()
+        for name, rule in sorted(gbconfig.get('statshistory_alerts',
+                                              {}).items()):
+            try:
+                self.add_alert_rule(name, rule)
+            except (InvalidOperation, InvalidParameter), e:
+                wok_log.error("Ignoring host statistics alert rule '%s' of "
+                              "gingerbase.conf. Details: %s", name, e)
 
         # create thread to collect statistcs and cache values only if
-        # statshistory_on is enabled in gingerbase.conf
-        if self.statshistory_on:
-            self.host_stats_thread = BackgroundTask(HOST_STATS_INTERVAL,
-                                                    self.update_host_stats)
-            self.host_stats_thread.start()
-
-    def lookup(self, *name):
-        if not self.statshistory_on:
-            self.update_host_stats()
+        # statshistory_on is enabled in gingerbase.conf, or if alert rules
+        # are set
+        if self.statshistory_on or self.alert_rules:
+            self.start_collector()
+
+    def _create_history(self, gbconfig, path):
+        # with a path, the history is stored in one file per resolution
+        def file_path(name):
+            return os.path.join(path, name) if path is not None else None
+
+        depth = gbconfig.get('statshistory_depth', HOST_STATS_HISTORY_DEPTH)
+        self.host_stats = open_stats_buffer(
+            [('timestamp', FLOAT_TYPECODE)] + HOST_STATS_COLUMNS, depth,
+            file_path('host.stats'))
+        self.rollups = [StatsRollup(HOST_STATS_COLUMNS, resolution, samples,
+                                    file_path('host-%ds.stats' % resolution))
+                        for resolution, samples in
+                        gbconfig.get('statshistory_rollups',
+                                     HOST_STATS_ROLLUPS)]
+
+    def _load_summaries(self):
+        # the summaries are not persisted, rebuild them from the history
+        # kept across restarts
+        if not self.summaries or not len(self.host_stats):
+            return
+
+        window = self.host_stats.window(
+            columns=['timestamp'] + [n for n, _ in HOST_STATS_SUMMARY_COLUMNS])
+        start = time.time() - max(self.summaries)
+        for i, timestamp in enumerate(window['timestamp']):
+            if timestamp > start:
+                sample = dict((name, values[i])
+                              for name, values in window.iteritems())
+                for summary in self.summaries.itervalues():
+                    summary.add(sample, timestamp)
+
+    def start_collector(self):
+        with self._update_lock:
+            if self.host_stats_thread is None:
+                self.host_stats_thread = BackgroundTask(self.interval,
+                                                        self._collector_tick)
+                self.host_stats_thread.start()
+
+    def _collector_tick(self):
+        # Back off while nobody reads the statistics: the background task
+        # keeps running at the sampling interval, but skips the collection
+        # until the idle interval is over. The first read after that brings
+        # it back to full rate.
+        now = time.time()
+        idle = (self.idle_interval > self.interval and
+                not self.publisher.subscribers and
+                now - self.last_read >= self.idle_timeout)
+        # half an interval of slack, for the jitter of the ticks
+        due = self.idle_interval - self.interval / 2.0
+        if idle and self.timestamp is not None and \
+                now - self.timestamp < due:
+            return
+
+        # The sample is expected an idle interval after the previous one
+        # when backing off, and for the first one at full rate again, which
+        # can follow the last idle sample by up to an idle interval
+        self._tick_interval = self.idle_interval if idle or self._idle \
+            else self.interval
+        self._idle = idle
+        self.update_host_stats()
+
+    def mark_read(self):
+        """
+        record a read of the statistics, which keeps the collector at full
+        rate
+        """
+        self.last_read = time.time()
+
+    def lookup(self, *name, **params):
+        groups = self.get_groups_param(params)
+        self.mark_read()
+        # Samples are collected on demand when statshistory_on is disabled.
+        # Otherwise, the last one is only refreshed if the background task
+        # was backing off. Concurrent requests share the same collection.
+        max_age = self.interval if not self.statshistory_on else \
+            2 * self.interval
+        with self._update_lock:
+            if (self.timestamp is None or
+                    time.time() - self.timestamp >= max_age):
+                self.update_host_stats()
+            # the same sample for the host and its groups
+            sample = self.host_stats.last()
+            group_samples = dict((group, self.group_stats[group].last())
+                                 for group in groups)
+
+        stats = self._get_stats_values(sample)
+        for group in groups:
+            stats[group] = self._get_group_values(group,
+                                                  group_samples[group])
+        return stats
+
+    def get_groups_param(self, params):
+        """
+        parse the comma separated list of statistics groups, from
+        HOST_STATS_GROUPS, requested by the 'groups' parameter
+        """
+        groups = params.get('groups')
+        if not groups:
+            return []
 
-        return {'cpu_utilization': self.host_stats['cpu_utilization'][-1],
-                'memory': self.host_stats['memory'][-1],
-                'disk_read_rate': self.host_stats['disk_read_rate'][-1],
-                'disk_write_rate': self.host_stats['disk_write_rate'][-1],
-                'net_recv_rate': self.host_stats['net_recv_rate'][-1],
-                'net_sent_rate': self.host_stats['net_sent_rate'][-1]}
+        groups = groups.split(',')
+        for group in groups:
+            if group not in self.group_stats:
+                available = ', '.join(self.groups)
+                raise InvalidParameter('GGBHOST0009E',
+                                       {'group': group, 'groups': available})
+        return groups
+
+    def _get_stats_values(self, sample):
+        stats = dict((key, sample[key]) for key in
+                     ['timestamp', 'seq', 'cpu_utilization'] +
+                     HOST_STATS_RATES)
+        stats['memory'] = dict((key, sample['memory.' + key])
+                               for key in HOST_STATS_MEMORY +
+                               HOST_STATS_PAGING)
+        stats['pressure'] = self._get_pressure_values(sample)
+        stats['kernel'] = self._get_kernel_values(sample)
+        for section, keys in HOST_STATS_FLAT_SECTIONS:
+            stats[section] = self._get_section_values(sample, section, keys)
+        return stats
+
+    def _get_section_values(self, sample, section, keys, prefix=''):
+        # values not reported, like the power ones in guests, are stored as
+        # NaN
+        values = {}
+        for key in keys:
+            value = sample[prefix + section + '.' + key]
+            values[key] = None if value != value else value
+        return values
+
+    def _get_kernel_values(self, sample, prefix=''):
+        # values the kernel does not report are stored as NaN
+        def value(column):
+            value = sample[prefix + 'kernel.' + column]
+            return None if value != value else value
+
+        kernel = dict((key, value(key)) for key in HOST_STATS_KERNEL)
+        kernel['softirqs'] = dict((softirq, value('softirq.' + softirq))
+                                  for softirq in SOFTIRQ_TYPES)
+        return kernel
+
+    def _get_pressure_values(self, sample, prefix=''):
+        # values the kernel does not report are stored as NaN
+        pressure = {}
+        for resource in PRESSURE_RESOURCES:
+            pressure[resource] = {}
+            for kind in PRESSURE_KINDS:
+                values = {}
+                for key in HOST_STATS_PRESSURE:
+                    value = sample[prefix + 'pressure.%s.%s.%s' %
+                                   (resource, kind, key)]
+                    values[key] = None if value != value else value
+                pressure[resource][kind] = values
+        return pressure
+
+    def stream(self, since=None):
+        """
+        generator of the samples collected after the one with the 'since'
+        sequence number (the last one by default), as (seq, JSON) tuples,
+        or (seq, None) when no sample was collected for a while. The
+        samples are collected once, whatever the number of subscribers, by
+        the background task, which is started on demand when
+        statshistory_on is disabled.
+        """
+        if not self.publisher.reserve(self.stream_subscribers):
+            raise InvalidOperation('GGBHOST0021E',
+                                   {'subscribers': self.stream_subscribers})
+
+        self.mark_read()
+        self.start_collector()
+        events = self._stream(since)
+        # started right away, so that its slot is released when it is
+        # closed or collected, even if it is never iterated
+        next(events)
+        return events
+
+    def _stream(self, since):
+        try:
+            yield
+            seq = None
+            if since is not None:
+                # samples the client missed are sent from the history first
+                seq = min(since, self.publisher.seq)
+                window = self.host_stats.window(since=since)
+                columns = [key for key in window if key != 'seq']
+                for i, seq in enumerate(window['seq']):
+                    sample = dict((key, window[key][i]) for key in columns)
+                    sample['seq'] = seq
+                    yield seq, json.dumps(self._get_stats_values(sample))
+
+            for event in self.publisher.listen(seq,
+                                               HOST_STATS_STREAM_KEEPALIVE,
+                                               reserved=True):
+                yield event
+        finally:
+            self.publisher.release()
+
+    def get_history(self, resolution=None, period=None, since=None,
+                    groups=None, summary=None, points=None, method=None):
+        """
+        method to get the statistics history covering the last 'period'
+        seconds at the given resolution in seconds. When no resolution is
+        given, the finest one that retains the whole period is used. If
+        'since' is given, only the samples with a greater sequence number are
+        returned; otherwise HOST_STATS_HISTORY_WINDOW samples are returned by
+        default. Downsampled history also reports the minimum and maximum
+        values of each sample. The statistics 'groups' are only returned
+        with the samples at the collection resolution. The 'summary' window,
+        in seconds, adds the quantiles, maximum and histogram of the CPU
+        utilization and rates over that window. The history is resampled to
+        at most 'points' samples by 'method', RESAMPLE_MINMAX (the default)
+        or RESAMPLE_LTTB; min/max buckets also report the minimum and
+        maximum values of each sample.
+        """
+        self.mark_read()
+        if summary is not None and summary not in self.summaries:
+            windows = ', '.join(str(w) for w in sorted(self.summaries))
+            raise InvalidParameter('GGBHOST0010E',
+                                   {'window': summary, 'windows': windows})
+        method = method or RESAMPLE_MINMAX
+        if method not in HOST_STATS_RESAMPLE_METHODS:
+            methods = ', '.join(HOST_STATS_RESAMPLE_METHODS)
+            raise InvalidParameter('GGBHOST0020E',
+                                   {'method': method, 'methods': methods})
+        # the collector appends to the history and the groups under the
+        # same lock, so their windows end at the same sample
+        with self._update_lock:
+            stats, window = self._get_history_window(resolution, period,
+                                                     since)
+            rollup = stats is not self.host_stats
+            if rollup:
+                # the groups are only kept at the collection resolution
+                groups = None
+            group_windows = {}
+            for group in groups or []:
+                # same sequence numbers as the history window
+                group_window = self.group_stats[group].window(
+                    len(window['seq']), since=window['seq'][0] - 1
+                    if window['seq'] else since)
+                # the groups may keep less samples, align them with the
+                # history
+                missing = len(window['seq']) - len(group_window['seq'])
+                group_windows[group] = dict(
+                    (key, [None] * missing + values)
+                    for key, values in group_window.iteritems())
+
+        extremes = rollup
+        if points is not None and len(window['seq']) > points:
+            window, group_windows = self._resample_history(
+                window, group_windows, points, method, rollup)
+            extremes = rollup or method == RESAMPLE_MINMAX
+
+        history = self._get_history_values(window)
+        history['timestamp'] = window['timestamp']
+        history['seq'] = window['seq']
+        if summary is not None:
+            # the collector updates the summaries under the same lock
+            with self._update_lock:
+                history['summary'] = self.summaries[summary].summary()
+            history['summary']['window'] = summary
+        if extremes:
+            history['min'] = self._get_history_values(window, 'min.')
+            history['max'] = self._get_history_values(window, 'max.')
+        for group, group_window in group_windows.iteritems():
+            history[group] = self._get_group_values(group, group_window)
+        return history
+
+    def _resample_history(self, window, group_windows, points, method,
+                          rollup):
+        # LTTB preserves the shape of the CPU utilization, the other columns
+        # are taken at the same samples
+        resampler = StatsResampler(window['timestamp'], points, method,
+                                   window['cpu_utilization'])
+        resampled = {'timestamp': resampler.first(window['timestamp']),
+                     'seq': resampler.last(window['seq'])}
+        for name, _ in HOST_STATS_COLUMNS:
+            values, minimums, maximums = resampler.aggregate(window[name])
+            resampled[name] = values
+            if rollup:
+                # the extremes of downsampled samples
+                minimums = resampler.aggregate(window['min.' + name])[1]
+                maximums = resampler.aggregate(window['max.' + name])[2]
+            resampled['min.' + name] = minimums
+            resampled['max.' + name] = maximums
+
+        groups = {}
+        for group, group_window in group_windows.iteritems():
+            groups[group] = dict((key, resampler.aggregate(values)[0])
+                                 for key, values in group_window.iteritems()
+                                 if key != 'seq')
+        return resampled, groups
+
+    def _get_history_window(self, resolution, period, since):
+        # the history tier and samples selected by the resolution, range and
+        # since parameters, by default the finest resolution retaining the
+        # whole period
+        tiers = [(self.interval, self.host_stats)]
+        tiers += [(r.resolution, r.buckets) for r in self.rollups]
+
+        if resolution is None:
+            resolution, stats = tiers[0]
+            if period is not None:
+                for resolution, stats in tiers:
+                    if resolution * stats.capacity >= period:
+                        break
+        else:
+            stats = dict(tiers).get(resolution)
+            if stats is None:
+                resolutions = ', '.join(str(r) for r, _ in tiers)
+                raise InvalidParameter('GGBHOST0006E',
+                                       {'resolution': resolution,
+                                        'resolutions': resolutions})
+
+        if since is not None and since > stats.seq:
+            # the client saw samples of a history since reset, like one not
+            # persisted across a restart: it gets the default window again
+            since = None
+        count = None if since is not None else HOST_STATS_HISTORY_WINDOW
+        if period is not None:
+            count = int(math.ceil(float(period) / resolution))
+
+        window = stats.window(count, since=since)
+        if period is not None and stats is self.host_stats:
+            # samples are sparser while the collector backs off
+            start = bisect.bisect_left(window['timestamp'],
+                                       time.time() - period)
+            window = dict((key, values[start:])
+                          for key, values in window.iteritems())
+        return stats, window
+
+    def export_history(self, fmt, resolution=None, period=None, since=None):
+        """
+        method to export the statistics history selected as in get_history,
+        without the groups, in the 'csv' or 'columns' format. Downsampled
+        history also exports the minimum and maximum values of each sample,
+        as 'min.' and 'max.' prefixed columns.
+        """
+        self.mark_read()
+        if fmt not in HOST_STATS_EXPORT_FORMATS:
+            formats = ', '.join(['json'] + HOST_STATS_EXPORT_FORMATS)
+            raise InvalidParameter('GGBHOST0018E',
+                                   {'format': fmt, 'formats': formats})
+        stats, window = self._get_history_window(resolution, period, since)
+        prefixes = ['']
+        if stats is not self.host_stats:
+            prefixes += ['min.', 'max.']
+        names = [(prefix + name, name) for prefix in prefixes
+                 for name, _ in HOST_STATS_COLUMNS]
+
+        if fmt == 'csv':
+            return encode_csv([('timestamp', window['timestamp']),
+                               ('seq', window['seq'])] +
+                              [(name, window[name]) for name, _ in names])
+
+        # the timestamps are exported in milliseconds, so they delta-encode
+        timestamps = [int(round(t * 1000)) for t in window['timestamp']]
+        columns = [('timestamp_ms', COLUMN_INT, timestamps),
+                   ('seq', COLUMN_INT, window['seq'])]
+        for name, column in names:
+            kind = COLUMN_INT if column in HOST_STATS_INT_COLUMNS \
+                else COLUMN_FLOAT
+            columns.append((name, kind, window[name]))
+        return encode_columns(columns)
+
+    def _get_history_values(self, window, prefix=''):
+        # the memory, pressure, kernel and flat sections statistics are
+        # returned as a list of dictionaries
+        history = dict((key, window[prefix + key])
+                       for key in ['cpu_utilization'] + HOST_STATS_RATES)
+        memory_keys = HOST_STATS_MEMORY + HOST_STATS_PAGING
+        memory = [window[prefix + 'memory.' + key] for key in memory_keys]
+        history['memory'] = [dict(zip(memory_keys, values))
+                             for values in zip(*memory)]
+        pressure_columns = [name for name, _ in HOST_STATS_COLUMNS
+                            if name.startswith('pressure.')]
+        pressure = [window[prefix + name] for name in pressure_columns]
+        history['pressure'] = [
+            self._get_pressure_values(dict(zip(pressure_columns, values)))
+            for values in zip(*pressure)]
+        kernel_columns = [name for name, _ in HOST_STATS_COLUMNS
+                          if name.startswith('kernel.')]
+        kernel = [window[prefix + name] for name in kernel_columns]
+        history['kernel'] = [
+            self._get_kernel_values(dict(zip(kernel_columns, values)))
+            for values in zip(*kernel)]
+        for section, keys in HOST_STATS_FLAT_SECTIONS:
+            names = [section + '.' + key for key in keys]
+            columns = [window[prefix + name] for name in names]
+            history[section] = [
+                self._get_section_values(dict(zip(names, values)), section,
+                                         keys)
+                for values in zip(*columns)]
+        return history
+
+    def _get_group_values(self, group, sample):
+        # (series, field) columns are returned as {series: {field: value}}
+        attrs = self.group_attrs[group]
+        values = {}
+        for key, value in sample.iteritems():
+            if key != 'seq':
+                series, field = key
+                if series not in values:
+                    values[series] = dict(attrs.get(series, {}))
+                values[series][field] = value
+        return values
 
     def update_host_stats(self):
-        preTimeStamp = self.host_stats['timestamp']
+        with self._update_lock:
+            self._update_host_stats()
+
+    def _update_host_stats(self):
+        preTimeStamp = self.timestamp
         timestamp = time.time()
-        # FIXME when we upgrade psutil, we can get uptime by psutil.uptime
-        # we get uptime by float(open("/proc/uptime").readline().split()[0])
-        # and calculate the first io_rate after the OS started.
-        with open("/proc/uptime") as time_f:
-            seconds = (timestamp - preTimeStamp if preTimeStamp else
-                       float(time_f.readline().split()[0]))
-
-        self.host_stats['timestamp'] = timestamp
-        self._get_host_disk_io_rate(seconds)
-        self._get_host_network_io_rate(seconds)
-
-        self._get_percentage_host_cpu_usage()
-        self._get_host_memory_stats()
-
-        # store only 60 stats (1 min)
-        for key, value in self.host_stats.iteritems():
-            if isinstance(value, list):
-                if len(value) == 60:
-                    self.host_stats[key] = value[10:]
-
-    def _get_percentage_host_cpu_usage(self):
+        # the first io rates are calculated since the OS started
+        if preTimeStamp:
+            seconds = timestamp - preTimeStamp
+        else:
+            with open("/proc/uptime") as time_f:
+                seconds = float(time_f.readline().split()[0])
+
+        self.timestamp = timestamp
+        sample = {'timestamp': timestamp}
+        # the interval is only expected to be regular when the samples are
+        # collected by the background task
+        periodic = preTimeStamp and self.host_stats_thread is not None
+        self.health.tick(seconds if periodic else None, self._tick_interval)
+
+        # every producer is timed, to find out which one delays the ticks
+        for name, producer, args in [
+                ('disk', self._get_host_disk_io_rate, (seconds, sample)),
+                ('network', self._get_host_network_io_rate, (seconds, sample)),
+                ('protocols', self._get_protocol_stats, (seconds, sample)),
+                ('cpu', self._get_percentage_host_cpu_usage, (sample,)),
+                ('kernel', self._get_kernel_activity, (seconds, sample)),
+                ('memory', self._get_host_memory_stats, (seconds, sample)),
+                ('pressure', self._get_host_pressure, (seconds, sample)),
+                ('cgroups', self._get_cgroup_stats, (seconds, sample)),
+                ('numa', self._get_numa_stats, (seconds, sample)),
+                ('power', self._get_periodic_stats,
+                 ('power', self.power_interval, self._read_power_stats,
+                  seconds, sample)),
+                ('filesystems', self._get_periodic_stats,
+                 ('filesystems', self.filesystems_interval,
+                  self._read_filesystem_stats, seconds, sample))]:
+            if name in self.disabled_producers:
+                continue
+            start = time.time()
+            try:
+                producer(*args)
+            except Exception, e:
+                # a failing producer does not stop the collection: its
+                # columns are filled with HOST_STATS_MISSING, as those of
+                # the disabled ones
+                if name not in self._failed_producers:
+                    self._failed_producers.add(name)
+                    wok_log.error("Unable to collect the %s host "
+                                  "statistics. Details: %s", name, e)
+            else:
+                self._failed_producers.discard(name)
+            self.health.account(name, time.time() - start)
+        for name, value in HOST_STATS_MISSING.iteritems():
+            sample.setdefault(name, value)
+
+        self.host_stats.append(sample)
+        for rollup in self.rollups:
+            rollup.add(sample, timestamp)
+        for summary in self.summaries.itervalues():
+            summary.add(sample, timestamp)
+        # the groups are appended even when empty, to keep the sequence
+        # numbers of their samples in sync with the host statistics
+        for group, stats in self.group_stats.iteritems():
+            stats.append(sample.pop(group, {}))
+
+        # a failing rule or notification does not stop the collection
+        # either
+        try:
+            self._evaluate_alerts(sample, timestamp)
+        except Exception, e:
+            if 'alerts' not in self._failed_producers:
+                self._failed_producers.add('alerts')
+                wok_log.error("Unable to evaluate the host statistics "
+                              "alerts. Details: %s", e)
+        else:
+            self._failed_producers.discard('alerts')
+        sample['seq'] = self.host_stats.seq
+        self.publisher.publish(sample['seq'], self._get_stats_values(sample))
+        self.last_counters = dict(self.counters)
+        self.health.account('total', time.time() - timestamp)
+
+    def add_alert_rule(self, name, rule):
+        """
+        add a threshold rule on a sample value, like
+        'cpu_utilization > 90 for 60s clear 80', evaluated on every sample
+        """
+        try:
+            alert_rule = AlertRule(name, rule)
+        except ValueError:
+            raise InvalidParameter('GGBHOST0012E', {'rule': rule})
+
+        metrics = [key for key, _ in HOST_STATS_COLUMNS]
+        if alert_rule.metric not in metrics:
+            raise InvalidParameter('GGBHOST0013E',
+                                   {'metric': alert_rule.metric,
+                                    'metrics': ', '.join(metrics)})
+
+        with self._update_lock:
+            if name in self.alert_rules:
+                raise InvalidOperation('GGBHOST0014E', {'name': name})
+            self.alert_rules[name] = alert_rule
+
+    def _evaluate_alerts(self, sample, timestamp):
+        # only the transitions are reported, so an alert is notified once
+        # until it is cleared
+        for rule in self.alert_rules.itervalues():
+            event = rule.evaluate(sample[rule.metric], timestamp)
+            if event is None:
+                continue
+
+            args = {'name': rule.name, 'rule': rule.rule,
+                    'value': rule.value}
+            if event == ALERT_RAISED:
+                wok_log.warning("Host statistics alert '%(name)s' raised: "
+                                "%(rule)s (value: %(value)s)" % args)
+                add_notification('GGBHOST0001W', args, '/plugins/gingerbase')
+            else:
+                wok_log.info("Host statistics alert '%(name)s' cleared: "
+                             "%(rule)s (value: %(value)s)" % args)
+
+    def _get_percentage_host_cpu_usage(self, sample):
         # This is cpu usage producer. This producer will calculate the usage
-        # at an interval of HOST_STATS_INTERVAL.
-        # The psutil.cpu_percent works as non blocking.
-        # psutil.cpu_percent maintains a cpu time sample.
-        # It will update the cpu time sample when it is called.
-        # So only this producer can call psutil.cpu_percent in gingerbase.
-        self.host_stats['cpu_utilization'].append(psutil.cpu_percent(None))
-
-    def _get_host_memory_stats(self):
-        virt_mem = psutil.virtual_memory()
+        # at an interval of self.interval, from the cpu times of the
+        # previous sample.
+        cpu_times = self.proc.cpu_times()
+        prev_cpu_times = self.counters.get('cpu_times', {})
+        sample['cpu_utilization'] = \
+            cpu_busy_percent(prev_cpu_times.get('cpu'), cpu_times['cpu'])
+
+        # time spent in each state, per logical CPU and per core
+        if 'cpus' in self.group_stats:
+            sample['cpus'] = self._get_cpu_breakdown(
+                prev_cpu_times, dict((cpu, times) for cpu, times in
+                                     cpu_times.iteritems() if cpu != 'cpu'))
+        if 'cores' in self.group_stats:
+            core_times = self.proc.core_times(cpu_times)
+            sample['cores'] = self._get_cpu_breakdown(
+                self.counters.get('core_times', {}), core_times)
+            self.counters['core_times'] = core_times
+
+        self.counters['cpu_times'] = cpu_times
+
+    def _get_cpu_breakdown(self, prev_times, times):
+        breakdown = {}
+        for name, cur in times.iteritems():
+            for field, value in cpu_breakdown(prev_times.get(name),
+                                              cur).iteritems():
+                breakdown[(name, field)] = value
+        return breakdown
+
+    def _get_host_memory_stats(self, seconds, sample):
+        meminfo = self.proc.memory()
+        sample['memory.total'] = meminfo['MemTotal']
+        sample['memory.free'] = meminfo['MemFree']
+        sample['memory.cached'] = meminfo['Cached']
+        sample['memory.buffers'] = meminfo['Buffers']
         # available:
         #  the actual amount of available memory that can be given
-        #  instantly to processes that request more memory in bytes; this
-        #  is calculated by summing different memory values depending on
-        #  the platform (e.g. free + buffers + cached on Linux)
-        memory_stats = {'total': virt_mem.total,
-                        'free': virt_mem.free,
-                        'cached': virt_mem.cached,
-                        'buffers': virt_mem.buffers,
-                        'avail': virt_mem.available}
-        self.host_stats['memory'].append(memory_stats)
-
-    def _get_host_disk_io_rate(self, seconds):
-        disk_read_bytes = self.host_stats['disk_read_bytes']
-        disk_write_bytes = self.host_stats['disk_write_bytes']
-        prev_read_bytes = disk_read_bytes[-1] if disk_read_bytes else 0
-        prev_write_bytes = disk_write_bytes[-1] if disk_write_bytes else 0
-
-        disk_io = psutil.disk_io_counters(False)
-        read_bytes = disk_io.read_bytes
-        write_bytes = disk_io.write_bytes
+        #  instantly to processes that request more memory in bytes. Kernels
+        #  older than 3.14 do not estimate it, use free + buffers + cached
+        sample['memory.avail'] = meminfo.get(
+            'MemAvailable',
+            meminfo['MemFree'] + meminfo['Buffers'] + meminfo['Cached'])
+        sample['memory.swap_total'] = meminfo.get('SwapTotal', 0)
+        sample['memory.swap_used'] = \
+            meminfo.get('SwapTotal', 0) - meminfo.get('SwapFree', 0)
+        sample['memory.dirty'] = meminfo.get('Dirty', 0)
+        sample['memory.writeback'] = meminfo.get('Writeback', 0)
+        sample['memory.slab'] = meminfo.get('Slab', 0)
+        # the huge pages are counted in pages of Hugepagesize
+        hugepage_size = meminfo.get('Hugepagesize', 0)
+        sample['memory.hugepages_total'] = \
+            meminfo.get('HugePages_Total', 0) * hugepage_size
+        sample['memory.hugepages_free'] = \
+            meminfo.get('HugePages_Free', 0) * hugepage_size
+        sample['memory.ksm_shared'], sample['memory.ksm_sharing'] = \
+            self.proc.ksm()
+        sample['memory.committed'] = meminfo.get('Committed_AS', 0)
+        sample['memory.commit_limit'] = meminfo.get('CommitLimit', 0)
+
+        # swapping and major faults are the signs of memory overcommit
+        prev_paging = self.counters.get('paging', {})
+        paging = self.proc.paging()
+        for key, counter, scale in [('swap_in_rate', 'pswpin', PAGE_SIZE),
+                                    ('swap_out_rate', 'pswpout', PAGE_SIZE),
+                                    ('major_faults', 'pgmajfault', 1)]:
+            delta = paging.get(counter, 0) - prev_paging.get(counter, 0)
+            sample['memory.' + key] = float(delta) * scale / seconds
+        self.counters['paging'] = paging
+
+    def _get_kernel_activity(self, seconds, sample):
+        # parsed from the /proc/stat content already read for the cpu usage
+        prev_activity = self.counters.get('kernel', {})
+        activity = self.proc.kernel_activity()
+        for key in ['load1', 'load5', 'load15', 'procs_running',
+                    'procs_blocked']:
+            sample['kernel.' + key] = activity.get(key, NAN)
+        for key, counter in [('ctxt_rate', 'ctxt'), ('intr_rate', 'intr'),
+                             ('forks_rate', 'processes')]:
+            delta = activity.get(counter, 0) - prev_activity.get(counter, 0)
+            sample['kernel.' + key] = round(delta / seconds, 1)
+
+        # kernels older than 4.1 count the softirqs of other types
+        softirqs = activity.get('softirq', [])
+        prev_softirqs = prev_activity.get('softirq', [0] * len(softirqs))
+        if len(softirqs) != len(SOFTIRQ_TYPES):
+            softirqs = prev_softirqs = [NAN] * len(SOFTIRQ_TYPES)
+        for softirq, value, prev in zip(SOFTIRQ_TYPES, softirqs,
+                                        prev_softirqs):
+            sample['kernel.softirq.' + softirq] = round((value - prev) /
+                                                        seconds, 1)
+        sample['kernel.softirq_rate'] = sum(
+            sample['kernel.softirq.' + softirq] for softirq in SOFTIRQ_TYPES)
+        self.counters['kernel'] = activity
+
+    def _get_host_pressure(self, seconds, sample):
+        prev_pressure = self.counters.get('pressure', {})
+        pressure = self.proc.pressure()
+        for resource in PRESSURE_RESOURCES:
+            for kind in PRESSURE_KINDS:
+                column = 'pressure.%s.%s.' % (resource, kind)
+                if (resource, kind) not in pressure:
+                    # the kernel does not support PSI or the 'full' line
+                    for key in HOST_STATS_PRESSURE:
+                        sample[column + key] = NAN
+                    continue
+
+                avg10, avg60, total = pressure[(resource, kind)]
+                prev_total = prev_pressure.get((resource, kind), (0, 0, 0))[2]
+                sample[column + 'avg10'] = avg10
+                sample[column + 'avg60'] = avg60
+                sample[column + 'stall'] = round((total - prev_total) /
+                                                 seconds, 1)
+        self.counters['pressure'] = pressure
+
+    def _get_host_disk_io_rate(self, seconds, sample):
+        prev_read_bytes = self.counters.get('disk_read_bytes', 0)
+        prev_write_bytes = self.counters.get('disk_write_bytes', 0)
+        prev_disk_stats = self.counters.get('disk_stats', {})
+
+        disk_stats = self.proc.disk_stats()
+        if 'disks' in self.group_stats:
+            sample['disks'] = {}
+            for disk, counters in disk_stats.iteritems():
+                rates = disk_rates(prev_disk_stats.get(disk), counters,
+                                   seconds)
+                name = self.proc.disk_name(disk)
+                for field, value in rates.iteritems():
+                    sample['disks'][(name, field)] = value
+
+        read_bytes, write_bytes = self.proc.disk_io(disk_stats)
 
         rd_rate = int(float(read_bytes - prev_read_bytes) / seconds + 0.5)
         wr_rate = int(float(write_bytes - prev_write_bytes) / seconds + 0.5)
 
-        self.host_stats['disk_read_rate'].append(rd_rate)
-        self.host_stats['disk_write_rate'].append(wr_rate)
-        self.host_stats['disk_read_bytes'].append(read_bytes)
-        self.host_stats['disk_write_bytes'].append(write_bytes)
-
-    def _get_host_network_io_rate(self, seconds):
-        net_recv_bytes = self.host_stats['net_recv_bytes']
-        net_sent_bytes = self.host_stats['net_sent_bytes']
-        prev_recv_bytes = net_recv_bytes[-1] if net_recv_bytes else 0
-        prev_sent_bytes = net_sent_bytes[-1] if net_sent_bytes else 0
-
-        net_ios = None
-        if hasattr(psutil, 'net_io_counters'):
-            net_ios = psutil.net_io_counters(True)
-        elif hasattr(psutil, 'network_io_counters'):
-            net_ios = psutil.network_io_counters(True)
-
-        recv_bytes = 0
-        sent_bytes = 0
-        for key in set(self.nics() +
-                       self.wlans()) & set(net_ios.iterkeys()):
-            recv_bytes = recv_bytes + net_ios[key].bytes_recv
-            sent_bytes = sent_bytes + net_ios[key].bytes_sent
+        sample['disk_read_rate'] = rd_rate
+        sample['disk_write_rate'] = wr_rate
+        self.counters['disk_read_bytes'] = read_bytes
+        self.counters['disk_write_bytes'] = write_bytes
+        self.counters['disk_stats'] = disk_stats
+
+    def _get_host_network_io_rate(self, seconds, sample):
+        prev_recv_bytes = self.counters.get('net_recv_bytes', 0)
+        prev_sent_bytes = self.counters.get('net_sent_bytes', 0)
+
+        prev_net_stats = self.counters.get('net_stats', {})
+
+        net_stats = self.proc.net_stats()
+        if frozenset(net_stats) != frozenset(self.group_attrs['nics']):
+            self.group_attrs['nics'] = dict(
+                (iface, {'type': self._get_interface_type(iface)})
+                for iface in net_stats)
+        if 'nics' in self.group_stats:
+            sample['nics'] = {}
+            for iface, counters in net_stats.iteritems():
+                rates = net_rates(prev_net_stats.get(iface), counters,
+                                  seconds)
+                for field, value in rates.iteritems():
+                    sample['nics'][(iface, field)] = value
+
+        # bonds, bridges and VLANs traffic is already accounted in the
+        # physical interfaces
+        recv_bytes, sent_bytes = self.proc.net_io(net_stats)
 
         rx_rate = int(float(recv_bytes - prev_recv_bytes) / seconds + 0.5)
         tx_rate = int(float(sent_bytes - prev_sent_bytes) / seconds + 0.5)
 
-        self.host_stats['net_recv_rate'].append(rx_rate)
-        self.host_stats['net_sent_rate'].append(tx_rate)
-        self.host_stats['net_recv_bytes'].append(recv_bytes)
-        self.host_stats['net_sent_bytes'].append(sent_bytes)
-
-    def wlans(self):
-        WLAN_PATH = '/sys/class/net/*/wireless'
-        return [b.split('/')[-2] for b in glob.glob(WLAN_PATH)]
-
-    # FIXME if we do not want to list usb nic
-    def nics(self):
-        NIC_PATH = '/sys/class/net/*/device'
-        return list(set([b.split('/')[-2] for b in glob.glob(NIC_PATH)]) -
-                    set(self.wlans()))
+        sample['net_recv_rate'] = rx_rate
+        sample['net_sent_rate'] = tx_rate
+        self.counters['net_recv_bytes'] = recv_bytes
+        self.counters['net_sent_bytes'] = sent_bytes
+        self.counters['net_stats'] = net_stats
+
+    def _get_protocol_stats(self, seconds, sample):
+        # retransmits and listen queue overflows explain the latency the
+        # throughput does not
+        prev_protocol_stats = self.counters.get('protocol_stats', {})
+        protocol_stats = self.proc.protocol_stats()
+        for name, _ in PROTOCOL_COUNTERS:
+            if name not in protocol_stats:
+                sample['protocols.%s_rate' % name] = NAN
+                continue
+            delta = protocol_stats[name] - prev_protocol_stats.get(name, 0)
+            sample['protocols.%s_rate' % name] = round(delta / seconds, 1)
+        for name, _ in SOCKET_COUNTS:
+            sample['protocols.' + name] = protocol_stats.get(name, NAN)
+        self.counters['protocol_stats'] = protocol_stats
+
+    def _get_cgroup_stats(self, seconds, sample):
+        # Activity of the top-level slices and of each guest scope, to tell
+        # the guests load from the host services. The CPU utilization is
+        # relative to the CPUs of the last cpu_times.
+        if 'cgroups' not in self.group_stats:
+            return
+
+        prev_cgroup_stats = self.counters.get('cgroup_stats', {})
+        cgroup_stats = self.proc.cgroup_stats()
+        if frozenset(cgroup_stats) != frozenset(self.group_attrs['cgroups']):
+            self.group_attrs['cgroups'] = dict(
+                (cgroup, cgroup_attrs(cgroup)) for cgroup in cgroup_stats)
+
+        cpus = max(len(self.counters['cpu_times']) - 1, 1)
+        sample['cgroups'] = {}
+        for cgroup, counters in cgroup_stats.iteritems():
+            rates = cgroup_rates(prev_cgroup_stats.get(cgroup), counters,
+                                 seconds, cpus)
+            for field, value in rates.iteritems():
+                sample['cgroups'][(cgroup, field)] = value
+        self.counters['cgroup_stats'] = cgroup_stats
+
+    def _get_numa_stats(self, seconds, sample):
+        # memory usage, allocations and CPU utilization of each NUMA node,
+        # to find out the cross-node memory traffic
+        if 'numa' not in self.group_stats:
+            return
+
+        prev_numa_stats = self.counters.get('numa_stats', {})
+        prev_node_times = self.counters.get('node_times', {})
+        numa_stats = self.proc.numa_stats()
+        node_times = self.proc.node_times(self.counters['cpu_times'])
+        sample['numa'] = {}
+        for node, counters in numa_stats.iteritems():
+            rates = numa_rates(prev_numa_stats.get(node), counters, seconds)
+            if node in node_times:
+                rates['cpu_utilization'] = cpu_busy_percent(
+                    prev_node_times.get(node), node_times[node])
+            for field, value in rates.iteritems():
+                sample['numa'][(node, field)] = value
+        self.counters['numa_stats'] = numa_stats
+        self.counters['node_times'] = node_times
+
+    def _get_periodic_stats(self, name, interval, read, seconds, sample):
+        # Values that change slowly, or are costly to read, are only read
+        # every 'interval' seconds and repeated in the samples in between,
+        # which keeps the groups in sync with the history. Half an interval
+        # of slack, for the jitter of the ticks.
+        timestamp = sample['timestamp']
+        last = self.counters.get(name + '_timestamp')
+        if last is None or timestamp - last >= interval - self.interval / 2.0:
+            if last is not None:
+                seconds = timestamp - last
+            self._periodic_samples[name] = read(timestamp, seconds)
+            self.counters[name + '_timestamp'] = timestamp
+
+        for key, value in self._periodic_samples[name].iteritems():
+            # the group samples are consumed by their buffers
+            sample[key] = dict(value) if key in self.group_stats else value
+
+    def _read_power_stats(self, timestamp, seconds):
+        prev_power_stats = self.counters.get('power_stats', {})
+        power_stats = self.proc.power_stats(self.counters['cpu_times'])
+        rates = dict((cpu, power_rates(prev_power_stats.get(cpu), counters,
+                                       seconds))
+                     for cpu, counters in power_stats.iteritems())
+        temps = dict((zone, value / 1000.0) for zone, value in
+                     self.proc.thermal_stats().iteritems())
+        self.counters['power_stats'] = power_stats
+
+        def column(field, aggregate):
+            values = [r[field] for r in rates.itervalues() if field in r]
+            return aggregate(values) if values else NAN
+
+        power_sample = {
+            'power.freq': column('freq', lambda v: sum(v) / len(v)),
+            'power.temp': max(temps.values()) if temps else NAN,
+            'power.core_throttle_rate': column('core_throttle', sum),
+            # every CPU reports the events of its package
+            'power.package_throttle_rate': column('package_throttle', max)}
+        if 'thermal' not in self.group_stats:
+            return power_sample
+
+        zones = self.proc.thermal_zones
+        if frozenset(zones) != frozenset(self.group_attrs['thermal']):
+            self.group_attrs['thermal'] = dict(
+                (zone, {'type': zone_type})
+                for zone, zone_type in zones.iteritems())
+        group = {}
+        for cpu, values in rates.iteritems():
+            for field, value in values.iteritems():
+                group[(cpu, field)] = value
+        for zone, value in temps.iteritems():
+            group[(zone, 'temp')] = value
+        power_sample['thermal'] = group
+        return power_sample
+
+    def _read_filesystem_stats(self, timestamp, seconds):
+        # the fill rates are calculated since the oldest usage kept in the
+        # fill window, which smooths out the short-lived files
+        filesystem_stats = self.proc.filesystem_stats()
+        usage = dict((mountpoint, self._filesystem_usage.get(
+            mountpoint, collections.deque())) for mountpoint in
+            filesystem_stats)
+        rates = {}
+        for mountpoint, counters in filesystem_stats.iteritems():
+            samples = usage[mountpoint]
+            while samples and timestamp - samples[0][0] > \
+                    HOST_STATS_FILL_WINDOW:
+                samples.popleft()
+            if samples:
+                start, prev = samples[0]
+                rates[mountpoint] = filesystem_rates(prev, counters,
+                                                     timestamp - start)
+            else:
+                rates[mountpoint] = filesystem_rates(None, counters, seconds)
+            samples.append((timestamp, counters))
+        self._filesystem_usage = usage
+        self.counters['filesystem_stats'] = filesystem_stats
+
+        def column(fields, aggregate):
+            values = [r[field] for r in rates.itervalues()
+                      for field in fields if field in r]
+            return aggregate(values) if values else NAN
+
+        filesystem_sample = {
+            'filesystem.used_percent': column(['used_percent'], max),
+            'filesystem.inodes_used_percent': column(['inodes_used_percent'],
+                                                     max),
+            # running out of inodes fills a filesystem up as well
+            'filesystem.time_to_full': column(['time_to_full',
+                                               'inodes_time_to_full'], min)}
+        if 'filesystems' not in self.group_stats:
+            return filesystem_sample
+
+        if frozenset(filesystem_stats) != \
+                frozenset(self.group_attrs['filesystems']):
+            self.group_attrs['filesystems'] = dict(
+                (mountpoint, {'device': counters['device'],
+                              'type': counters['type']})
+                for mountpoint, counters in filesystem_stats.iteritems())
+        group = {}
+        for mountpoint, values in rates.iteritems():
+            for field, value in values.iteritems():
+                group[(mountpoint, field)] = value
+        filesystem_sample['filesystems'] = group
+        return filesystem_sample
+
+    def _get_interface_type(self, iface):
+        # only looked up when the set of interfaces changes
+        if iface in self.proc.physical_ifaces:
+            return 'wlan' if is_wlan(iface) else 'nic'
+        return get_interface_type(iface)
 
 
 class HostStatsHistoryModel(object):
     def __init__(self, **kargs):
         self.history = HostStatsModel(**kargs)
 
-    def lookup(self, *name):
+    def lookup(self, *name, **params):
         if not self.history.statshistory_on:
             # return values of only one execution
-            return self.history.lookup()
-
-        return {'cpu_utilization': self.history.host_stats['cpu_utilization'],
-                'memory': self.history.host_stats['memory'],
-                'disk_read_rate': self.history.host_stats['disk_read_rate'],
-                'disk_write_rate': self.history.host_stats['disk_write_rate'],
-                'net_recv_rate': self.history.host_stats['net_recv_rate'],
-                'net_sent_rate': self.history.host_stats['net_sent_rate']}
+            return self.history.lookup(**params)
+
+        groups = self.history.get_groups_param(params)
+        resolution = self._get_seconds_param(params, 'resolution')
+        period = self._get_seconds_param(params, 'range')
+        summary = self._get_seconds_param(params, 'summary')
+        since = self._get_since_param(params)
+        points = params.get('points')
+        if points is not None:
+            try:
+                points = int(points)
+                if points <= 0:
+                    raise ValueError()
+            except ValueError:
+                raise InvalidParameter('GGBHOST0019E', {'value': points})
+        return self.history.get_history(resolution, period, since, groups,
+                                        summary, points,
+                                        params.get('resample'))
+
+    def export(self, *name, **params):
+        # bulk download of the history, without the groups and summaries
+        resolution = self._get_seconds_param(params, 'resolution')
+        period = self._get_seconds_param(params, 'range')
+        since = self._get_since_param(params)
+        return self.history.export_history(params.get('format'), resolution,
+                                           period, since)
+
+    def _get_since_param(self, params):
+        since = params.get('since')
+        if since is None:
+            return None
+
+        try:
+            since = int(since)
+            if since < 0:
+                raise ValueError()
+        except ValueError:
+            raise InvalidParameter('GGBHOST0008E', {'value': since})
+        return since
+
+    def _get_seconds_param(self, params, name):
+        value = params.get(name)
+        if value is None:
+            return None
+
+        try:
+            seconds = int(value)
+            if seconds <= 0:
+                raise ValueError()
+        except ValueError:
+            raise InvalidParameter('GGBHOST0007E',
+                                   {'name': name, 'value': value})
+        return seconds
+
+
+class HostStatsAlertsModel(object):
+    def __init__(self, **kargs):
+        self.stats = HostStatsModel(**kargs)
+
+    def get_list(self):
+        return self.stats.alert_rules.keys()
+
+    def create(self, params):
+        name = params['name']
+        self.stats.add_alert_rule(name, params['rule'])
+        # the rules are only evaluated on the samples being collected
+        self.stats.start_collector()
+        return name
+
+
+class HostStatsAlertModel(object):
+    def __init__(self, **kargs):
+        self.stats = HostStatsModel(**kargs)
+
+    def lookup(self, name):
+        rule = self.stats.alert_rules.get(name)
+        if rule is None:
+            raise NotFoundError('GGBHOST0015E', {'name': name})
+        return rule.info()
+
+    def delete(self, name):
+        with self.stats._update_lock:
+            if self.stats.alert_rules.pop(name, None) is None:
+                raise NotFoundError('GGBHOST0015E', {'name': name})
+
+
+class HostStatsProcessesModel(object):
+    def __init__(self, **kargs):
+        gbconfig = config.get('gingerbase', {})
+        self.interval = gbconfig.get('statshistory_processes_interval',
+                                     HOST_PROCESSES_INTERVAL)
+        self.proc = ProcessStats()
+        self.processes = []
+        self.timestamp = None
+        self._lock = threading.Lock()
+
+    def lookup(self, *name, **params):
+        top = params.get('top', HOST_PROCESSES_TOP)
+        try:
+            top = int(top)
+            if top <= 0:
+                raise ValueError()
+        except ValueError:
+            raise InvalidParameter('GGBHOST0011E', {'value': top})
+
+        # /proc is only rescanned once the last scan is older than the
+        # interval, concurrent requests share the same scan
+        with self._lock:
+            if (self.timestamp is None or
+                    time.time() - self.timestamp >= self.interval):
+                self.processes = self.proc.scan()
+                self.timestamp = time.time()
+            processes = self.processes
+            timestamp = self.timestamp
+
+        result = {'timestamp': timestamp}
+        for order, key in HOST_PROCESSES_ORDER:
+            result[order] = heapq.nlargest(top, processes, key=key)
+        return result
 
 
 class CapabilitiesModel(object):
@@ -0,0 +1,333 @@
+#
+# Project Ginger Base
+#
+# Copyright IBM Corp, 2017
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+
+from wok.plugins.gingerbase.model.host import HOST_STATS_MEMORY
+from wok.plugins.gingerbase.model.host import HostStatsModel
+from wok.plugins.gingerbase.procstats import DISK_IO_MS, DISK_READ_SECTORS
+from wok.plugins.gingerbase.procstats import DISK_READS, DISK_WRITE_SECTORS
+from wok.plugins.gingerbase.procstats import DISK_WRITES, PAGE_SIZE
+from wok.plugins.gingerbase.procstats import PRESSURE_KINDS
+from wok.plugins.gingerbase.procstats import PRESSURE_RESOURCES, SECTOR_SIZE
+from wok.plugins.gingerbase.procstats import SOFTIRQ_TYPES, THROTTLE_KINDS
+
+METRICS_PREFIX = 'gingerbase_'
+# /proc/net/dev counters kept by ProcStats.net_stats(), see NET_COLUMNS
+NET_COUNTERS = [('received_bytes', 'Bytes received'),
+                ('received_packets', 'Packets received'),
+                ('receive_errors', 'Receive errors'),
+                ('receive_drops', 'Received packets dropped'),
+                ('sent_bytes', 'Bytes sent'),
+                ('sent_packets', 'Packets sent'),
+                ('send_errors', 'Send errors'),
+                ('send_drops', 'Sent packets dropped')]
+# help of the ProcStats.protocol_stats() counters, see procstats
+# PROTOCOL_COUNTERS
+PROTOCOL_HELP = [('tcp_retrans', 'TCP segments retransmitted.'),
+                 ('tcp_resets', 'TCP resets sent.'),
+                 ('tcp_estab_resets',
+                  'TCP connections reset while established.'),
+                 ('tcp_attempt_fails', 'TCP connection attempts failed.'),
+                 ('tcp_listen_overflows',
+                  'TCP connections dropped as the listen queue was full.'),
+                 ('tcp_listen_drops',
+                  'TCP connections dropped while listening.'),
+                 ('udp_errors', 'UDP datagrams received with errors.'),
+                 ('udp_rcvbuf_errors',
+                  'UDP datagrams dropped as the receive buffer was full.'),
+                 ('udp_sndbuf_errors',
+                  'UDP datagrams dropped as the send buffer was full.')]
+
+
+def format_metrics(families):
+    """Render metric families in the OpenMetrics text format.
+
+    Args:
+        families (List[tuple]): (name, type, help, samples) tuples, where
+            samples is a list of (labels dict, value) pairs.
+
+    Returns:
+        str: the exposition, terminated by '# EOF'.
+
+    """
+    lines = []
+    for name, metric_type, help_text, samples in families:
+        name = METRICS_PREFIX + name
+        lines.append('# TYPE %s %s' % (name, metric_type))
+        lines.append('# HELP %s %s' % (name, help_text))
+        # counter samples are exposed with the _total suffix
+        sample_name = name + '_total' if metric_type == 'counter' else name
+        for labels, value in samples:
+            lines.append('%s%s %s' % (sample_name, _format_labels(labels),
+                                      _format_value(value)))
+    lines.append('# EOF')
+    return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (key, str(value).replace('\\', '\\\\')
+                     .replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in sorted(labels.iteritems()))
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+class MetricsModel(object):
+    """
+    Host statistics in the OpenMetrics text format, rendered from the last
+    sample and counters kept by the statistics collector. Scrapes never
+    collect statistics: the first one starts the background collector when
+    statshistory_on is disabled.
+    """
+
+    def __init__(self, **kargs):
+        self.stats = HostStatsModel(**kargs)
+
+    def lookup(self, *name):
+        self.stats.start_collector()
+        families = []
+        if len(self.stats.host_stats):
+            families += self._get_sample_families(
+                self.stats.host_stats.last())
+        families += self._get_counter_families(self.stats.last_counters)
+        families += self._get_health_families(self.stats.health)
+        return format_metrics(families)
+
+    def _get_sample_families(self, sample):
+        # NaN when the kernel does not report it
+        families = [
+            ('load_average', 'gauge',
+             'Average number of runnable and blocked tasks.',
+             [({'window': window}, value) for window, value in [
+                 ('1m', sample['kernel.load1']),
+                 ('5m', sample['kernel.load5']),
+                 ('15m', sample['kernel.load15'])] if value == value]),
+            ('tasks', 'gauge',
+             'Tasks runnable or blocked on I/O.',
+             [({'state': state}, value) for state, value in [
+                 ('running', sample['kernel.procs_running']),
+                 ('blocked', sample['kernel.procs_blocked'])]
+              if value == value]),
+            ('cpu_frequency_hertz', 'gauge',
+             'Average current frequency of the CPUs.',
+             [({}, value) for value in [sample['power.freq'] * 1000000]
+              if value == value]),
+            ('temperature_celsius', 'gauge',
+             'Highest temperature of the thermal zones.',
+             [({}, value) for value in [sample['power.temp']]
+              if value == value]),
+            ('network_sockets', 'gauge',
+             'Sockets in use, by protocol.',
+             [({'protocol': protocol}, value) for protocol, value in [
+                 ('all', sample['protocols.sockets']),
+                 ('tcp', sample['protocols.tcp_inuse']),
+                 ('udp', sample['protocols.udp_inuse'])] if value == value]),
+            ('network_tcp_connections', 'gauge',
+             'TCP connections, by state.',
+             [({'state': state}, value) for state, value in [
+                 ('established', sample['protocols.tcp_established']),
+                 ('time_wait', sample['protocols.tcp_time_wait']),
+                 ('orphan', sample['protocols.tcp_orphan'])]
+              if value == value])]
+        return families + [
+            ('stats_timestamp_seconds', 'gauge',
+             'Time the last host statistics sample was collected.',
+             [({}, sample['timestamp'])]),
+            ('cpu_utilization_ratio', 'gauge',
+             'Host CPU utilization.',
+             [({}, sample['cpu_utilization'] / 100.0)]),
+            ('memory_bytes', 'gauge',
+             'Host memory statistics, by type.',
+             [({'type': key}, sample['memory.' + key])
+              for key in HOST_STATS_MEMORY]),
+            ('disk_read_rate_bytes_per_second', 'gauge',
+             'Bytes read from the physical disks per second.',
+             [({}, sample['disk_read_rate'])]),
+            ('disk_write_rate_bytes_per_second', 'gauge',
+             'Bytes written to the physical disks per second.',
+             [({}, sample['disk_write_rate'])]),
+            ('network_receive_rate_bytes_per_second', 'gauge',
+             'Bytes received by the physical interfaces per second.',
+             [({}, sample['net_recv_rate'])]),
+            ('network_send_rate_bytes_per_second', 'gauge',
+             'Bytes sent by the physical interfaces per second.',
+             [({}, sample['net_sent_rate'])]),
+            ('pressure_ratio', 'gauge',
+             'Share of time some or all tasks were stalled on a resource, '
+             'averaged over a window.',
+             [({'resource': resource, 'kind': kind, 'window': window},
+               value / 100.0)
+              for resource in PRESSURE_RESOURCES
+              for kind in PRESSURE_KINDS
+              for window, value in [
+                  ('10s', sample['pressure.%s.%s.avg10' % (resource, kind)]),
+                  ('60s', sample['pressure.%s.%s.avg60' % (resource, kind)])]
+              # NaN when the kernel does not report it
+              if value == value])]
+
+    def _get_health_families(self, health):
+        producers = sorted(health.producers.items())
+        families = [
+            ('collector_ticks', 'counter',
+             'Samples collected.',
+             [({}, health.ticks)]),
+            ('collector_missed_ticks', 'counter',
+             'Samples not collected because a tick was late.',
+             [({}, health.missed_ticks)]),
+            ('collector_interval_seconds', 'gauge',
+             'Expected time between samples.',
+             [({}, health.interval)]),
+            ('collector_max_interval_seconds', 'gauge',
+             'Longest time between two samples.',
+             [({}, health.max_interval)])]
+        if health.last_interval is not None:
+            families.append(('collector_last_interval_seconds', 'gauge',
+                             'Time between the last two samples.',
+                             [({}, health.last_interval)]))
+        families += [
+            ('collector_producer_seconds', 'counter',
+             'Time spent collecting each part of the samples.',
+             [({'producer': name}, times[0]) for name, times in producers]),
+            ('collector_producer_last_seconds', 'gauge',
+             'Time spent collecting each part of the last sample.',
+             [({'producer': name}, times[1]) for name, times in producers]),
+            ('collector_producer_max_seconds', 'gauge',
+             'Longest time spent collecting each part of a sample.',
+             [({'producer': name}, times[2]) for name, times in producers])]
+        return families
+
+    def _get_counter_families(self, counters):
+        if 'disk_stats' not in counters or 'net_stats' not in counters:
+            return []
+
+        families = [
+            ('disk_read_bytes', 'counter',
+             'Bytes read from the physical disks.',
+             [({}, counters['disk_read_bytes'])]),
+            ('disk_written_bytes', 'counter',
+             'Bytes written to the physical disks.',
+             [({}, counters['disk_write_bytes'])]),
+            ('network_received_bytes', 'counter',
+             'Bytes received by the physical interfaces.',
+             [({}, counters['net_recv_bytes'])]),
+            ('network_sent_bytes', 'counter',
+             'Bytes sent by the physical interfaces.',
+             [({}, counters['net_sent_bytes'])])]
+
+        disks = [({'device': self.stats.proc.disk_name(disk)}, values)
+                 for disk, values in sorted(counters['disk_stats'].items())]
+        for name, help_text, index, scale in [
+                ('reads', 'Reads completed', DISK_READS, 1),
+                ('writes', 'Writes completed', DISK_WRITES, 1),
+                ('read_bytes', 'Bytes read', DISK_READ_SECTORS,
+                 SECTOR_SIZE),
+                ('written_bytes', 'Bytes written', DISK_WRITE_SECTORS,
+                 SECTOR_SIZE),
+                ('io_time_seconds', 'Time spent doing I/O', DISK_IO_MS,
+                 0.001)]:
+            families.append(('disk_device_' + name, 'counter',
+                             help_text + ' by each block device.',
+                             [(labels, values[index] * scale)
+                              for labels, values in disks]))
+
+        kernel = counters.get('kernel', {})
+        for name, help_text, counter in [
+                ('context_switches', 'Context switches.', 'ctxt'),
+                ('interrupts', 'Interrupts serviced.', 'intr'),
+                ('forks', 'Processes and threads created.', 'processes')]:
+            if counter in kernel:
+                families.append((name, 'counter', help_text,
+                                 [({}, kernel[counter])]))
+        if len(kernel.get('softirq', [])) == len(SOFTIRQ_TYPES):
+            families.append(('softirqs', 'counter',
+                             'Softirqs serviced, by type.',
+                             [({'type': softirq}, value)
+                              for softirq, value in zip(SOFTIRQ_TYPES,
+                                                        kernel['softirq'])]))
+
+        paging = counters.get('paging', {})
+        for name, help_text, counter, scale in [
+                ('swap_in_bytes', 'Bytes swapped in.', 'pswpin', PAGE_SIZE),
+                ('swap_out_bytes', 'Bytes swapped out.', 'pswpout',
+                 PAGE_SIZE),
+                ('major_page_faults', 'Page faults that needed I/O.',
+                 'pgmajfault', 1)]:
+            if counter in paging:
+                families.append(('memory_' + name, 'counter', help_text,
+                                 [({}, paging[counter] * scale)]))
+
+        families.append(('pressure_stall_seconds', 'counter',
+                         'Time some or all tasks were stalled on a '
+                         'resource.',
+                         [({'resource': resource, 'kind': kind},
+                           values[2] / 1000000.0)
+                          for (resource, kind), values in
+                          sorted(counters.get('pressure', {}).items())]))
+
+        filesystems = [({'mountpoint': mountpoint,
+                         'device': values['device'], 'type': values['type']},
+                        values)
+                       for mountpoint, values in
+                       sorted(counters.get('filesystem_stats', {}).items())]
+        for name, help_text, key in [
+                ('size_bytes', 'Size', 'size'),
+                ('free_bytes', 'Free space', 'free'),
+                ('avail_bytes', 'Space available to unprivileged users',
+                 'avail'),
+                ('files', 'Inodes', 'files'),
+                ('files_free', 'Free inodes', 'files_free')]:
+            families.append(('filesystem_' + name, 'gauge',
+                             help_text + ' of each mounted filesystem.',
+                             [(labels, values[key])
+                              for labels, values in filesystems]))
+
+        power_stats = sorted(counters.get('power_stats', {}).items())
+        families.append(('cpu_thermal_throttles', 'counter',
+                         'Thermal throttling events of the core and of the '
+                         'package of each CPU.',
+                         [({'cpu': cpu, 'kind': kind},
+                           values[kind + '_throttle'])
+                          for cpu, values in power_stats
+                          for kind in THROTTLE_KINDS
+                          if kind + '_throttle' in values]))
+
+        protocol_stats = counters.get('protocol_stats', {})
+        for name, help_text in PROTOCOL_HELP:
+            if name in protocol_stats:
+                families.append(('network_' + name, 'counter', help_text,
+                                 [({}, protocol_stats[name])]))
+
+        iface_types = self.stats.group_attrs['nics']
+        ifaces = [({'interface': iface,
+                    'type': iface_types.get(iface, {}).get('type',
+                                                           'unknown')},
+                   values)
+                  for iface, values in sorted(counters['net_stats'].items())]
+        for index, (name, help_text) in enumerate(NET_COUNTERS):
+            families.append(('network_interface_' + name, 'counter',
+                             help_text + ' by each network interface.',
+                             [(labels, values[index])
+                              for labels, values in ifaces]))
+        return families
@@ -0,0 +1,1335 @@
+#
+# Project Ginger Base
+#
+# Copyright IBM Corp, 2017
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+"""Host statistics collector reading the kernel counters from /proc."""
+
+import os
+import re
+
+PROC_STAT = '/proc/stat'
+PROC_MEMINFO = '/proc/meminfo'
+PROC_VMSTAT = '/proc/vmstat'
+PROC_LOADAVG = '/proc/loadavg'
+PROC_DISKSTATS = '/proc/diskstats'
+PROC_NET_DEV = '/proc/net/dev'
+PROC_NET_SNMP = '/proc/net/snmp'
+PROC_NET_SNMP6 = '/proc/net/snmp6'
+PROC_NET_NETSTAT = '/proc/net/netstat'
+PROC_NET_SOCKSTAT = '/proc/net/sockstat'
+PROC_NET_SOCKSTAT6 = '/proc/net/sockstat6'
+PROC_PRESSURE = '/proc/pressure/%s'
+PROC_UPTIME = '/proc/uptime'
+PROC_MOUNTINFO = '/proc/self/mountinfo'
+PROC_FILESYSTEMS = '/proc/filesystems'
+PROC_DIR = '/proc'
+PROC_PID = '/proc/%s/%s'
+NET_DEVICE = '/sys/class/net/%s/device'
+NET_WIRELESS = '/sys/class/net/%s/wireless'
+CPU_TOPOLOGY = '/sys/devices/system/cpu/%s/topology/%s'
+BLOCK_DEVICE = '/sys/class/block/%s'
+CGROUP_ROOT = '/sys/fs/cgroup'
+KSM_COUNTER = '/sys/kernel/mm/ksm/%s'
+NODE_DIR = '/sys/devices/system/node'
+CPU_SYSFS = '/sys/devices/system/cpu/%s/%s'
+THERMAL_DIR = '/sys/class/thermal'
+
+READ_SIZE = 65536
+SECTOR_SIZE = 512
+
+# /proc/stat cpu lines: user nice system idle iowait irq softirq steal guest
+# guest_nice, in USER_HZ
+CPU_USER = 0
+CPU_NICE = 1
+CPU_SYSTEM = 2
+CPU_IDLE = 3
+CPU_IOWAIT = 4
+CPU_IRQ = 5
+CPU_SOFTIRQ = 6
+CPU_STEAL = 7
+CPU_GUEST = 8
+CPU_FIELDS = ['user', 'system', 'iowait', 'steal', 'irq', 'softirq', 'guest']
+
+# /proc/stat kernel activity counters: interrupts, context switches and
+# forks since boot, and tasks runnable and blocked on I/O. The softirq line
+# counts the softirqs of each type, in this order since Linux 4.1
+STAT_COUNTER_RE = re.compile(r'^(intr|ctxt|processes|procs_running|'
+                             r'procs_blocked) (\d+)', re.M)
+STAT_SOFTIRQ_RE = re.compile(r'^softirq \d+ ([\d ]+)$', re.M)
+SOFTIRQ_TYPES = ['hi', 'timer', 'net_tx', 'net_rx', 'block', 'irq_poll',
+                 'tasklet', 'sched', 'hrtimer', 'rcu']
+
+# /proc/diskstats fields after the device name: reads, reads merged, sectors
+# read, ms reading, writes, writes merged, sectors written, ms writing, I/Os
+# in progress, ms doing I/O, weighted ms doing I/O
+DISK_READS = 0
+DISK_READ_SECTORS = 2
+DISK_READ_MS = 3
+DISK_WRITES = 4
+DISK_WRITE_SECTORS = 6
+DISK_WRITE_MS = 7
+DISK_IO_MS = 9
+DISK_WEIGHTED_MS = 10
+DISK_FIELDS = ['read_iops', 'write_iops', 'read_rate', 'write_rate', 'await',
+               'queue_depth', 'util']
+
+# /proc/net/dev fields after the interface name: bytes packets errs drop fifo
+# frame compressed multicast, received then sent. Only received and sent
+# bytes, packets, errs and drop are kept
+NET_RECV_BYTES = 0
+NET_SENT_BYTES = 4
+NET_COLUMNS = [0, 1, 2, 3, 8, 9, 10, 11]
+NET_FIELDS = ['recv_rate', 'recv_packets', 'recv_errors', 'recv_drops',
+              'sent_rate', 'sent_packets', 'sent_errors', 'sent_drops']
+
+# Protocol counters since boot, by name, and the /proc/net/snmp,
+# /proc/net/snmp6 and /proc/net/netstat counters summed into each, named as
+# by nstat: the table name followed by the counter name. The Tcp and TcpExt
+# tables count both IPv4 and IPv6, the Udp table IPv4 only
+PROTOCOL_COUNTERS = [
+    ('tcp_retrans', ['TcpRetransSegs']),
+    ('tcp_resets', ['TcpOutRsts']),
+    ('tcp_estab_resets', ['TcpEstabResets']),
+    ('tcp_attempt_fails', ['TcpAttemptFails']),
+    ('tcp_listen_overflows', ['TcpExtListenOverflows']),
+    ('tcp_listen_drops', ['TcpExtListenDrops']),
+    ('udp_errors', ['UdpInErrors', 'Udp6InErrors']),
+    ('udp_rcvbuf_errors', ['UdpRcvbufErrors', 'Udp6RcvbufErrors']),
+    ('udp_sndbuf_errors', ['UdpSndbufErrors', 'Udp6SndbufErrors'])]
+# Sockets counts, by name, and the /proc/net/sockstat and sockstat6 values
+# summed into each, named as the counters above. Established connections
+# are counted by the TcpCurrEstab /proc/net/snmp value, the TCP sockets in
+# use do not include those in TIME-WAIT
+SOCKET_COUNTS = [
+    ('sockets', ['socketsused']),
+    ('tcp_established', ['TcpCurrEstab']),
+    ('tcp_inuse', ['TCPinuse', 'TCP6inuse']),
+    ('tcp_time_wait', ['TCPtw']),
+    ('tcp_orphan', ['TCPorphan']),
+    ('udp_inuse', ['UDPinuse', 'UDP6inuse'])]
+
+# Pressure Stall Information, available since Linux 4.20
+PRESSURE_RESOURCES = ['cpu', 'memory', 'io']
+PRESSURE_KINDS = ['some', 'full']
+PRESSURE_RE = re.compile(r'^(some|full) avg10=([\d.]+) avg60=([\d.]+) '
+                         r'avg300=[\d.]+ total=(\d+)', re.M)
+
+# cgroup v2 accounting of the top-level systemd slices and of the guests,
+# the scopes under machine.slice
+CGROUP_SLICES = ['machine.slice', 'system.slice', 'user.slice']
+CGROUP_MACHINES = 'machine.slice'
+CGROUP_FIELDS = ['cpu_utilization', 'cpu_throttled', 'memory', 'read_rate',
+                 'write_rate', 'read_iops', 'write_iops', 'cpu_stall',
+                 'memory_stall', 'io_stall']
+# counters: microseconds in cpu.stat, summed over the devices in io.stat
+CGROUP_CPU_RE = re.compile(r'^(usage_usec|throttled_usec) (\d+)', re.M)
+CGROUP_IO_RE = re.compile(r'\b(rbytes|wbytes|rios|wios)=(\d+)')
+# (field, counter) of the cgroup counters reported per second
+CGROUP_RATES = [('cpu_throttled', 'throttled_usec'),
+                ('read_rate', 'rbytes'), ('write_rate', 'wbytes'),
+                ('read_iops', 'rios'), ('write_iops', 'wios'),
+                ('cpu_stall', 'cpu_stall'), ('memory_stall', 'memory_stall'),
+                ('io_stall', 'io_stall')]
+# libvirt names the QEMU guest scopes machine-qemu\x2d<id>\x2d<name>.scope
+CGROUP_QEMU_RE = re.compile(r'^machine-qemu\\x2d\d+\\x2d(.+)\.scope$')
+CGROUP_ESCAPE_RE = re.compile(r'\\x([0-9a-f]{2})')
+
+# NUMA nodes: memory in bytes, and pages allocated per second on the
+# intended node (hit), on this node instead of another one (miss), and on
+# another node instead of this one (foreign)
+NUMA_FIELDS = ['cpu_utilization', 'memory_total', 'memory_free',
+               'memory_used', 'numa_hit', 'numa_miss', 'numa_foreign']
+NUMA_COUNTERS = ['numa_hit', 'numa_miss', 'numa_foreign']
+NODE_MEMINFO_RE = re.compile(r'^Node \d+ (MemTotal|MemFree):\s+(\d+)', re.M)
+NODE_NAME_RE = re.compile(r'^node\d+$')
+NUMASTAT_RE = re.compile(r'^(numa_hit|numa_miss|numa_foreign) (\d+)', re.M)
+
+# CPU power management: current frequency in kHz, time spent in each idle
+# state in microseconds, and thermal throttling events of the core and of
+# its package. Thermal zone temperatures are in millidegrees Celsius
+CPU_FREQ = 'cpufreq/scaling_cur_freq'
+CPUIDLE_DIR = 'cpuidle'
+CPU_THROTTLE = 'thermal_throttle/%s_throttle_count'
+THROTTLE_KINDS = ['core', 'package']
+CPUIDLE_STATE_RE = re.compile(r'^state\d+$')
+THERMAL_ZONE_RE = re.compile(r'^thermal_zone\d+$')
+
+# /proc/self/mountinfo fields: mount id, parent id, major:minor, root, mount
+# point, options and optional fields, then after a '-' separator the
+# filesystem type, the source and the superblock options. Paths escape
+# blanks and backslashes in octal
+MOUNTINFO_DEVICE = 2
+MOUNTINFO_MOUNTPOINT = 4
+MOUNTINFO_OPTIONAL = 6
+MOUNTINFO_ESCAPE_RE = re.compile(r'\\([0-7]{3})')
+
+# /proc/meminfo values are in kB, except the huge pages counts
+MEMINFO_RE = re.compile(r'^(\w+):\s+(\d+)( kB)?', re.M)
+# /proc/vmstat counters: pages swapped in and out, and major page faults
+VMSTAT_RE = re.compile(r'^(pswpin|pswpout|pgmajfault) (\d+)', re.M)
+
+# /proc/<pid>/stat fields after the command name: state is the first one,
+# then the user and system times and the start time since boot, in USER_HZ
+PID_UTIME = 11
+PID_STIME = 12
+PID_STARTTIME = 19
+PID_IO_RE = re.compile(r'^(read_bytes|write_bytes): (\d+)', re.M)
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+
+class ProcFile(object):
+    """Kernel statistics file kept open and re-read from its beginning.
+
+    Args:
+        path (str): path of the file.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = os.open(path, os.O_RDONLY)
+
+    def read(self):
+        """Get the current content of the file.
+
+        The /proc files backed by a seq_file, like /proc/net/dev and
+        /proc/diskstats, return about a page per read, whatever the size
+        requested: a short read is not the end of the file.
+
+        Returns:
+            str: the file content.
+
+        """
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        chunks = []
+        data = os.read(self._fd, READ_SIZE)
+        while data:
+            chunks.append(data)
+            data = os.read(self._fd, READ_SIZE)
+        return ''.join(chunks)
+
+    def close(self):
+        os.close(self._fd)
+
+
+def open_proc_file(path):
+    """Open a kernel statistics file.
+
+    Args:
+        path (str): path of the file.
+
+    Returns:
+        ProcFile: the opened file, or None if the kernel does not provide it.
+
+    """
+    try:
+        return ProcFile(path)
+    except (IOError, OSError):
+        return None
+
+
+def cpu_busy_percent(prev, cur):
+    """Calculate the CPU utilization between two /proc/stat cpu lines.
+
+    Time spent in iowait counts as idle, and guest time is already accounted
+    in user and nice.
+
+    Args:
+        prev (List[int]): previous cpu times, None for the host boot.
+        cur (List[int]): current cpu times.
+
+    Returns:
+        float: utilization percentage, between 0 and 100.
+
+    """
+    total = sum(cur[:CPU_GUEST])
+    idle = cur[CPU_IDLE] + cur[CPU_IOWAIT]
+    if prev:
+        total -= sum(prev[:CPU_GUEST])
+        idle -= prev[CPU_IDLE] + prev[CPU_IOWAIT]
+    if total <= 0:
+        return 0.0
+    return round(100.0 * (total - idle) / total, 1)
+
+
+def cpu_breakdown(prev, cur):
+    """Calculate the time spent by a CPU in each state between two
+    /proc/stat cpu lines.
+
+    Guest time is reported apart from user time, which accounts it.
+
+    Args:
+        prev (List[int]): previous cpu times, None for the host boot.
+        cur (List[int]): current cpu times.
+
+    Returns:
+        dict: percentage of time spent in each of CPU_FIELDS states.
+
+    """
+    delta = [c - p for c, p in zip(cur, prev)] if prev else cur
+    total = sum(delta[:CPU_GUEST])
+    if total <= 0:
+        return dict.fromkeys(CPU_FIELDS, 0.0)
+
+    scale = 100.0 / total
+    guest = sum(delta[CPU_GUEST:])
+    return {'user': round((delta[CPU_USER] + delta[CPU_NICE] - guest) *
+                          scale, 1),
+            'system': round(delta[CPU_SYSTEM] * scale, 1),
+            'iowait': round(delta[CPU_IOWAIT] * scale, 1),
+            'irq': round(delta[CPU_IRQ] * scale, 1),
+            'softirq': round(delta[CPU_SOFTIRQ] * scale, 1),
+            'steal': round(delta[CPU_STEAL] * scale, 1),
+            'guest': round(guest * scale, 1)}
+
+
+def disk_rates(prev, cur, seconds):
+    """Calculate the activity of a block device between two /proc/diskstats
+    lines.
+
+    Args:
+        prev (List[int]): previous device counters, None for the host boot.
+        cur (List[int]): current device counters.
+        seconds (float): time elapsed between the two lines.
+
+    Returns:
+        dict: the DISK_FIELDS values: read and write operations per second,
+            read and written bytes per second, average time to complete an
+            operation in ms, average number of queued operations and
+            percentage of time the device was busy.
+
+    """
+    delta = [c - p for c, p in zip(cur, prev)] if prev else cur
+    ios = delta[DISK_READS] + delta[DISK_WRITES]
+    wait_ms = delta[DISK_READ_MS] + delta[DISK_WRITE_MS]
+    ms = seconds * 1000
+    return {'read_iops': round(delta[DISK_READS] / seconds, 1),
+            'write_iops': round(delta[DISK_WRITES] / seconds, 1),
+            'read_rate': round(delta[DISK_READ_SECTORS] * SECTOR_SIZE /
+                               seconds),
+            'write_rate': round(delta[DISK_WRITE_SECTORS] * SECTOR_SIZE /
+                                seconds),
+            'await': round(float(wait_ms) / ios, 1) if ios else 0.0,
+            'queue_depth': round(delta[DISK_WEIGHTED_MS] / ms, 2),
+            'util': round(min(100.0 * delta[DISK_IO_MS] / ms, 100.0), 1)}
+
+
+def net_rates(prev, cur, seconds):
+    """Calculate the activity of a network interface between two
+    /proc/net/dev lines.
+
+    Counters going backwards, when an interface is recreated, are taken as
+    restarted from 0.
+
+    Args:
+        prev (List[int]): previous interface counters, None for the host
+            boot.
+        cur (List[int]): current interface counters.
+        seconds (float): time elapsed between the two lines.
+
+    Returns:
+        dict: the NET_FIELDS values, received and sent bytes, packets,
+            errors and dropped packets per second.
+
+    """
+    if prev:
+        cur = [c - p if c >= p else c for c, p in zip(cur, prev)]
+    return dict((field, round(value / seconds, 1))
+                for field, value in zip(NET_FIELDS, cur))
+
+
+def numa_rates(prev, cur, seconds):
+    """Calculate the memory usage and allocations of a NUMA node.
+
+    Args:
+        prev (dict): previous numa_stats() counters, None for the host boot.
+        cur (dict): current counters.
+        seconds (float): time between the two.
+
+    Returns:
+        dict: 'memory_total', 'memory_free' and 'memory_used' in bytes, and
+            the 'numa_hit', 'numa_miss' and 'numa_foreign' pages per second.
+
+    """
+    prev = prev or {}
+    rates = {'memory_total': cur['MemTotal'], 'memory_free': cur['MemFree'],
+             'memory_used': cur['MemTotal'] - cur['MemFree']}
+    for key in NUMA_COUNTERS:
+        if key in cur:
+            rates[key] = (cur[key] - prev.get(key, 0)) / seconds
+    return rates
+
+
+def power_rates(prev, cur, seconds):
+    """Calculate the frequency, idle states residency and thermal throttling
+    of a CPU between two power_stats().
+
+    Args:
+        prev (dict): previous power_stats() counters, None for the host boot.
+        cur (dict): current counters.
+        seconds (float): time between the two.
+
+    Returns:
+        dict: the 'freq' in MHz, the percentage of time spent in each idle
+            state, as 'idle_<state>', and the 'core_throttle' and
+            'package_throttle' events per second. Counters the kernel does
+            not provide for the CPU are left out.
+
+    """
+    prev = prev or {}
+    rates = {}
+    for key, value in cur.iteritems():
+        delta = value - prev.get(key, 0)
+        if key == 'freq':
+            rates['freq'] = value / 1000.0
+        elif key.startswith('idle.'):
+            residency = 100.0 * delta / (seconds * 1000000)
+            rates['idle_' + key[5:]] = round(min(residency, 100.0), 1)
+        else:
+            rates[key] = delta / seconds
+    return rates
+
+
+def filesystem_rates(prev, cur, seconds):
+    """Calculate the usage of a filesystem, and how fast it fills up
+    between two filesystem_stats().
+
+    Args:
+        prev (dict): filesystem_stats() counters at the start of the period
+            the fill rates are calculated over, None to leave them out.
+        cur (dict): current counters.
+        seconds (float): time between the two.
+
+    Returns:
+        dict: the 'size', 'used' and 'avail' bytes, 'used_percent' of the
+            space available to users as reported by df, the 'inodes',
+            'inodes_used' and 'inodes_free' counts and 'inodes_used_percent',
+            and the 'fill_rate' in bytes per second and 'inodes_fill_rate' in
+            inodes per second. While the filesystem fills up, 'time_to_full'
+            and 'inodes_time_to_full' project the seconds until there is no
+            space or inode left. Filesystems without a fixed number of
+            inodes, like btrfs, do not report them.
+
+    """
+    used = cur['size'] - cur['free']
+    usable = used + cur['avail']
+    rates = {'size': cur['size'], 'used': used, 'avail': cur['avail'],
+             'used_percent': round(100.0 * used / usable, 1) if usable
+             else 0.0}
+    if prev is not None:
+        fill_rate = (used - (prev['size'] - prev['free'])) / seconds
+        rates['fill_rate'] = fill_rate
+        if fill_rate > 0:
+            rates['time_to_full'] = cur['avail'] / fill_rate
+
+    if cur['files']:
+        inodes_used = cur['files'] - cur['files_free']
+        rates.update({'inodes': cur['files'], 'inodes_used': inodes_used,
+                      'inodes_free': cur['files_free'],
+                      'inodes_used_percent': round(
+                          100.0 * inodes_used / cur['files'], 1)})
+        if prev is not None:
+            fill_rate = (inodes_used - (prev['files'] - prev['files_free'])) \
+                / seconds
+            rates['inodes_fill_rate'] = fill_rate
+            if fill_rate > 0:
+                rates['inodes_time_to_full'] = cur['files_free'] / fill_rate
+    return rates
+
+
+def parse_cpulist(cpulist):
+    """Parse a sysfs CPU list, like '0-3,8'.
+
+    Returns:
+        List[str]: the CPU labels of /proc/stat, like 'cpu0'.
+
+    """
+    cpus = []
+    for item in cpulist.split(','):
+        if not item:
+            continue
+        first, _, last = item.partition('-')
+        cpus += ['cpu%d' % cpu for cpu in xrange(int(first),
+                                                 int(last or first) + 1)]
+    return cpus
+
+
+def cgroup_rates(prev, cur, seconds, cpus):
+    """Calculate the activity of a cgroup between two cgroup_stats().
+
+    Counters the kernel does not provide for the cgroup, like those of the
+    controllers not enabled for it, are left out.
+
+    Args:
+        prev (dict): previous counters, None for the cgroup creation.
+        cur (dict): current counters.
+        seconds (float): time between the two.
+        cpus (int): number of CPUs of the host.
+
+    Returns:
+        dict: 'cpu_utilization' as a percentage of the host CPUs,
+            'cpu_throttled' and '<resource>_stall' in microseconds per
+            second, 'memory' in bytes, read and write bytes and I/Os per
+            second.
+
+    """
+    prev = prev or {}
+    rates = {}
+    deltas = {}
+    for key, value in cur.iteritems():
+        delta = value - prev.get(key, 0)
+        # the cgroup was recreated, its counters restarted from 0
+        deltas[key] = delta if delta >= 0 else value
+
+    if 'usage_usec' in cur:
+        rates['cpu_utilization'] = min(
+            100.0 * deltas['usage_usec'] / 1000000 / seconds / cpus, 100.0)
+    if 'memory' in cur:
+        rates['memory'] = cur['memory']
+    for field, key in CGROUP_RATES:
+        if key in cur:
+            rates[field] = deltas[key] / seconds
+    return rates
+
+
+def cgroup_attrs(cgroup):
+    """Get the type and name of a cgroup returned by cgroup_stats().
+
+    Args:
+        cgroup (str): the cgroup path, relative to the cgroup root.
+
+    Returns:
+        dict: 'type', 'slice' or 'vm', and 'name', the slice or guest name.
+
+    """
+    if '/' not in cgroup:
+        return {'type': 'slice', 'name': cgroup}
+
+    scope = cgroup.rsplit('/', 1)[1]
+    match = CGROUP_QEMU_RE.match(scope)
+    if match:
+        name = match.group(1)
+    else:
+        name = scope[:-len('.scope')]
+        if name.startswith('machine-'):
+            name = name[len('machine-'):]
+    # systemd escapes the unit names, like '-' as \x2d
+    name = CGROUP_ESCAPE_RE.sub(lambda m: chr(int(m.group(1), 16)), name)
+    return {'type': 'vm', 'name': name}
+
+
+def _read(path, default=None):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except (IOError, OSError):
+        return default
+
+
+def _read_int(path, default=None):
+    try:
+        with open(path) as f:
+            return int(f.read())
+    except (IOError, OSError, ValueError):
+        return default
+
+
+def process_counters(pid):
+    """Get the counters of a process.
+
+    The I/O counters are only readable by the process owner and root: they
+    are 0 when they cannot be read.
+
+    Args:
+        pid (str): the process id.
+
+    Returns:
+        tuple: command name, start time since boot in USER_HZ, CPU time in
+            USER_HZ, resident memory in bytes, bytes read and bytes written
+            from storage, or None if the process is gone.
+
+    """
+    stat = _read(PROC_PID % (pid, 'stat'))
+    statm = _read(PROC_PID % (pid, 'statm'))
+    if stat is None or statm is None:
+        return None
+
+    # the command name may contain spaces and parentheses
+    head, _, tail = stat.rpartition(')')
+    fields = tail.split()
+    io = dict(PID_IO_RE.findall(_read(PROC_PID % (pid, 'io'), '')))
+    return (head.split('(', 1)[1], int(fields[PID_STARTTIME]),
+            int(fields[PID_UTIME]) + int(fields[PID_STIME]),
+            int(statm.split()[1]) * PAGE_SIZE,
+            int(io.get('read_bytes', 0)), int(io.get('write_bytes', 0)))
+
+
+class ProcessStats(object):
+    """Reader of the resource usage of every process.
+
+    The counters of each process are kept from one scan of /proc to the
+    next, to calculate its usage between them. Processes seen for the first
+    time, including those reusing the id of a process that exited, are
+    accounted since they started.
+
+    """
+
+    def __init__(self):
+        # pid: (start time, CPU time, read bytes, written bytes)
+        self._counters = {}
+        self._uptime = None
+
+    def scan(self):
+        """Get the resource usage of the processes since the last scan.
+
+        Returns:
+            List[dict]: for each process, its 'pid', command 'name',
+                'cpu_utilization' (100 for one CPU busy), resident memory
+                ('rss') in bytes, and 'read_rate' and 'write_rate' from
+                storage in bytes per second.
+
+        """
+        uptime = float(_read(PROC_UPTIME, '0').split()[0])
+        counters = {}
+        processes = []
+        for pid in os.listdir(PROC_DIR):
+            if not pid.isdigit():
+                continue
+            process = process_counters(pid)
+            if process is None:
+                continue
+
+            name, start, cpu, rss, read, write = process
+            counters[pid] = (start, cpu, read, write)
+            prev = self._counters.get(pid)
+            if prev is None or prev[0] != start:
+                prev = (start, 0, 0, 0)
+                seconds = uptime - float(start) / CLOCK_TICKS
+            else:
+                seconds = uptime - self._uptime
+            # at least a clock tick, for processes that just started
+            seconds = max(seconds, 1.0 / CLOCK_TICKS)
+            processes.append({
+                'pid': int(pid),
+                'name': name,
+                'cpu_utilization': 100.0 * (cpu - prev[1]) / CLOCK_TICKS /
+                seconds,
+                'rss': rss,
+                'read_rate': (read - prev[2]) / seconds,
+                'write_rate': (write - prev[3]) / seconds})
+
+        self._counters = counters
+        self._uptime = uptime
+        return processes
+
+
+class ProcStats(object):
+    """Reader of the host counters used by the statistics collector.
+
+    The /proc files are opened once and parsed with as little allocation as
+    possible, which keeps the cost of a sample low enough for sub-second
+    sampling. The physical network interfaces and the block devices layout
+    are only looked up in sysfs when the set of devices changes.
+
+    """
+
+    def __init__(self):
+        self._stat = open_proc_file(PROC_STAT)
+        # /proc/stat content read by the last cpu_times() call
+        self._stat_data = None
+        self._loadavg = open_proc_file(PROC_LOADAVG)
+        self._meminfo = open_proc_file(PROC_MEMINFO)
+        self._vmstat = open_proc_file(PROC_VMSTAT)
+        # kernels built without KSM do not have its counters
+        self._ksm = [open_proc_file(KSM_COUNTER % name)
+                     for name in ['pages_shared', 'pages_sharing']]
+        self._diskstats = open_proc_file(PROC_DISKSTATS)
+        self._net_dev = open_proc_file(PROC_NET_DEV)
+        # kernels built without IPv6 do not have the snmp6 and sockstat6
+        # files
+        self._net_snmp = [open_proc_file(path)
+                          for path in [PROC_NET_SNMP, PROC_NET_NETSTAT]]
+        self._net_snmp6 = open_proc_file(PROC_NET_SNMP6)
+        self._net_sockstat = [open_proc_file(path) for path in
+                              [PROC_NET_SOCKSTAT, PROC_NET_SOCKSTAT6]]
+        self._pressure = dict((resource,
+                               open_proc_file(PROC_PRESSURE % resource))
+                              for resource in PRESSURE_RESOURCES)
+        self._ifaces = None
+        self._physical_ifaces = frozenset()
+        self._cpus = None
+        self._cores = {}
+        self._disks = None
+        self._physical_disks = frozenset()
+        self._disk_names = {}
+        # cgroup: {file name: ProcFile or None when not provided}
+        self._cgroup_files = {}
+        # (machine.slice mtime, scopes) of the last scan, with the cgroups
+        # found and those without any counter
+        self._cgroup_scan = None
+        self._cgroups = []
+        self._absent_cgroups = set()
+        # node: (meminfo ProcFile, numastat ProcFile, CPU labels)
+        self._nodes = None
+        # CPU label: {counter: ProcFile}, for the CPUs of _power_cpus
+        self._power_cpus = None
+        self._power_files = {}
+        # thermal zone: (type, temp ProcFile)
+        self._zones = None
+
+    def close(self):
+        for proc_file in ([self._stat, self._loadavg, self._meminfo,
+                           self._vmstat,
+                           self._diskstats, self._net_dev] + self._ksm +
+                          self._net_snmp + [self._net_snmp6] +
+                          self._net_sockstat + self._pressure.values()):
+            if proc_file is not None:
+                proc_file.close()
+        for cgroup in self._cgroup_files.keys():
+            self._close_cgroup(cgroup)
+        for meminfo, numastat, _ in (self._nodes or {}).values():
+            for proc_file in [meminfo, numastat]:
+                if proc_file is not None:
+                    proc_file.close()
+        self._close_power_files()
+        for _, temp in (self._zones or {}).values():
+            temp.close()
+
+    def cpu_times(self):
+        """Get the host and per CPU times.
+
+        Returns:
+            dict: the values of the /proc/stat cpu lines, indexed by the
+                'cpu' (whole host) and 'cpu<N>' (logical CPUs) line labels.
+
+        """
+        cpu_times = {}
+        self._stat_data = self._stat.read()
+        for line in self._stat_data.splitlines():
+            if not line.startswith('cpu'):
+                break
+            fields = line.split()
+            cpu_times[fields[0]] = map(int, fields[1:])
+        return cpu_times
+
+    def kernel_activity(self):
+        """Get the load average and the kernel activity counters.
+
+        The counters are parsed from the /proc/stat content read by the
+        last cpu_times() call, so /proc/stat is only read once per sample.
+
+        Returns:
+            dict: 'load1', 'load5' and 'load15' load averages, the 'intr',
+                'ctxt', 'processes' (forks), 'procs_running' and
+                'procs_blocked' values of /proc/stat, and 'softirq', the
+                list of softirqs of each SOFTIRQ_TYPES.
+
+        """
+        if self._stat_data is None:
+            self._stat_data = self._stat.read()
+        activity = dict((key, int(value)) for key, value in
+                        STAT_COUNTER_RE.findall(self._stat_data))
+        match = STAT_SOFTIRQ_RE.search(self._stat_data)
+        if match:
+            activity['softirq'] = map(int, match.group(1).split())
+        if self._loadavg is not None:
+            fields = self._loadavg.read().split()
+            for key, value in zip(['load1', 'load5', 'load15'], fields):
+                activity[key] = float(value)
+        return activity
+
+    def core_times(self, cpu_times):
+        """Sum the times of the logical CPUs of each core.
+
+        The CPU topology is only read from sysfs when the set of online CPUs
+        changes.
+
+        Args:
+            cpu_times (dict): the cpu_times() result.
+
+        Returns:
+            dict: the summed cpu times, indexed by 'socket<N>_core<M>' core
+                labels.
+
+        """
+        cpus = frozenset(cpu_times)
+        if cpus != self._cpus:
+            self._cpus = cpus
+            self._cores = {}
+            for cpu in cpus - set(['cpu']):
+                package = _read_int(
+                    CPU_TOPOLOGY % (cpu, 'physical_package_id'), 0)
+                core = _read_int(CPU_TOPOLOGY % (cpu, 'core_id'))
+                if core is None:
+                    continue
+                label = 'socket%d_core%d' % (package, core)
+                self._cores.setdefault(label, []).append(cpu)
+
+        return dict((label, [sum(times) for times in
+                             zip(*[cpu_times[cpu] for cpu in cpus])])
+                    for label, cpus in self._cores.iteritems())
+
+    def pressure(self):
+        """Get the Pressure Stall Information of the CPU, memory and I/O.
+
+        Kernels built without PSI do not have the /proc/pressure files, and
+        those booted with psi=0 fail to read them: the resources are left
+        out in both cases.
+
+        Returns:
+            dict: (avg10, avg60, total) tuples, with the avg10 and avg60
+                percentages and the total stall time in microseconds,
+                indexed by (resource, 'some' or 'full').
+
+        """
+        pressure = {}
+        for resource, proc_file in self._pressure.items():
+            if proc_file is None:
+                continue
+            try:
+                data = proc_file.read()
+            except OSError:
+                proc_file.close()
+                self._pressure[resource] = None
+                continue
+            for kind, avg10, avg60, total in PRESSURE_RE.findall(data):
+                pressure[(resource, kind)] = (float(avg10), float(avg60),
+                                              int(total))
+        return pressure
+
+    def memory(self):
+        """Get the host memory statistics.
+
+        Returns:
+            dict: the /proc/meminfo values in bytes, or in pages for the
+                HugePages_* counts, indexed by field name.
+
+        """
+        return dict((key, int(value) * 1024 if unit else int(value))
+                    for key, value, unit in MEMINFO_RE.findall(
+                        self._meminfo.read()))
+
+    def paging(self):
+        """Get the host paging counters.
+
+        Returns:
+            dict: the 'pswpin' and 'pswpout' pages swapped in and out and the
+                'pgmajfault' major page faults from /proc/vmstat.
+
+        """
+        if self._vmstat is None:
+            return {}
+        return dict((key, int(value))
+                    for key, value in VMSTAT_RE.findall(self._vmstat.read()))
+
+    def ksm(self):
+        """Get the memory merged by Kernel Samepage Merging.
+
+        Returns:
+            tuple: bytes of the shared pages in use and bytes saved by
+                sharing them, 0 when KSM is not available.
+
+        """
+        return tuple(int(proc_file.read()) * PAGE_SIZE
+                     if proc_file is not None else 0
+                     for proc_file in self._ksm)
+
+    def disk_stats(self):
+        """Get the counters of the block devices.
+
+        Devices that never did any I/O, like unused loop devices, are left
+        out.
+
+        Returns:
+            dict: the /proc/diskstats counters, indexed by kernel device
+                name.
+
+        """
+        disk_stats = {}
+        if self._diskstats is None:
+            return disk_stats
+
+        for line in self._diskstats.read().splitlines():
+            fields = line.split()
+            counters = map(int, fields[3:14])
+            if counters[DISK_READS] or counters[DISK_WRITES]:
+                disk_stats[fields[2]] = counters
+
+        disks = frozenset(disk_stats)
+        if disks != self._disks:
+            self._disks = disks
+            self._update_disks_layout(disks)
+        return disk_stats
+
+    def _update_disks_layout(self, disks):
+        # Partitions are accounted in their disk, and device mapper and md
+        # devices in the devices they are built on (their slaves), so only
+        # the whole disks without slaves do physical I/O. Loop devices have
+        # no slaves, but their I/O goes to the disk of their backing file.
+        physical_disks = set()
+        self._disk_names = {}
+        for disk in disks:
+            path = BLOCK_DEVICE % disk
+            try:
+                slaves = os.listdir(os.path.join(path, 'slaves'))
+            except OSError:
+                slaves = []
+            if not slaves and \
+                    not os.path.exists(os.path.join(path, 'partition')) and \
+                    not os.path.exists(os.path.join(path, 'loop')):
+                physical_disks.add(disk)
+            # dm-N devices are named after the LV or multipath map
+            self._disk_names[disk] = _read(os.path.join(path, 'dm', 'name'),
+                                           disk)
+        self._physical_disks = frozenset(physical_disks)
+
+    def disk_io(self, disk_stats):
+        """Get the bytes read from and written to the physical disks.
+
+        Partitions, device mapper, md and loop devices are left out, as
+        their I/O is already accounted in the disks they are built on.
+
+        Args:
+            disk_stats (dict): the disk_stats() result.
+
+        Returns:
+            tuple: read bytes and written bytes.
+
+        """
+        read_sectors = 0
+        write_sectors = 0
+        for disk in self._physical_disks:
+            read_sectors += disk_stats[disk][DISK_READ_SECTORS]
+            write_sectors += disk_stats[disk][DISK_WRITE_SECTORS]
+        return read_sectors * SECTOR_SIZE, write_sectors * SECTOR_SIZE
+
+    def disk_name(self, disk):
+        """Get the user visible name of a block device.
+
+        Args:
+            disk (str): kernel device name, like 'sda' or 'dm-0'.
+
+        Returns:
+            str: the device mapper name of dm devices ('<vg>-<lv>' for
+                logical volumes), the kernel name otherwise.
+
+        """
+        return self._disk_names.get(disk, disk)
+
+    @property
+    def physical_disks(self):
+        """The disks without partitions and slaves found by the last
+        disk_stats() call."""
+        return self._physical_disks
+
+    def net_stats(self):
+        """Get the counters of the network interfaces.
+
+        Returns:
+            dict: received bytes, packets, errors and drops then sent bytes,
+                packets, errors and drops, indexed by interface name.
+
+        """
+        net_stats = {}
+        if self._net_dev is None:
+            return net_stats
+
+        # skip the two header lines
+        for line in self._net_dev.read().splitlines()[2:]:
+            name, data = line.split(':', 1)
+            fields = data.split()
+            net_stats[name.strip()] = [int(fields[i]) for i in NET_COLUMNS]
+
+        ifaces = frozenset(net_stats)
+        if ifaces != self._ifaces:
+            self._ifaces = ifaces
+            self._physical_ifaces = frozenset(
+                iface for iface in ifaces
+                if os.path.exists(NET_DEVICE % iface) or
+                os.path.exists(NET_WIRELESS % iface))
+        return net_stats
+
+    def net_io(self, net_stats):
+        """Get the bytes received and sent by the physical interfaces.
+
+        Bonds, bridges, VLANs and virtual interfaces are left out, as their
+        traffic goes through the physical interfaces or does not leave the
+        host.
+
+        Args:
+            net_stats (dict): the net_stats() result.
+
+        Returns:
+            tuple: received bytes and sent bytes.
+
+        """
+        recv_bytes = 0
+        sent_bytes = 0
+        for iface in self._physical_ifaces:
+            recv_bytes += net_stats[iface][NET_RECV_BYTES]
+            sent_bytes += net_stats[iface][NET_SENT_BYTES]
+        return recv_bytes, sent_bytes
+
+    @property
+    def physical_ifaces(self):
+        """The nics and wlans found by the last net_stats() call."""
+        return self._physical_ifaces
+
+    def protocol_stats(self):
+        """Get the TCP and UDP counters and the sockets counts.
+
+        Returns:
+            dict: the PROTOCOL_COUNTERS counters and the SOCKET_COUNTS
+                counts, indexed by name. Those the kernel does not provide
+                are left out.
+
+        """
+        values = {}
+        # a line of counter names then a line of values, for each table
+        for proc_file in self._net_snmp:
+            if proc_file is None:
+                continue
+            lines = proc_file.read().splitlines()
+            for names, counters in zip(lines[::2], lines[1::2]):
+                table, names = names.split(':', 1)
+                counters = counters.split(':', 1)[1]
+                for name, value in zip(names.split(), counters.split()):
+                    values[table + name] = int(value)
+        # one counter per line, already prefixed by its table
+        if self._net_snmp6 is not None:
+            for line in self._net_snmp6.read().splitlines():
+                name, value = line.split()
+                values[name] = int(value)
+        # name and value pairs after the protocol
+        for proc_file in self._net_sockstat:
+            if proc_file is None:
+                continue
+            for line in proc_file.read().splitlines():
+                table, fields = line.split(':', 1)
+                fields = fields.split()
+                for name, value in zip(fields[::2], fields[1::2]):
+                    values[table + name] = int(value)
+
+        stats = {}
+        for key, names in PROTOCOL_COUNTERS + SOCKET_COUNTS:
+            found = [values[name] for name in names if name in values]
+            if found:
+                stats[key] = sum(found)
+        return stats
+
+    def cgroup_stats(self):
+        """Get the counters of the top-level slices and of the guests.
+
+        Only the cgroup v2 hierarchy provides them. Its files are kept open
+        while the cgroup exists. Cgroups without any counter are only looked
+        up again once the guests scopes change.
+
+        Returns:
+            dict: 'usage_usec' and 'throttled_usec' from cpu.stat, 'memory'
+                from memory.current, 'rbytes', 'wbytes', 'rios' and 'wios'
+                summed over the devices of io.stat, and the '<resource>_stall'
+                total of the 'some' line of the pressure files, indexed by
+                cgroup path relative to the cgroup root. Counters of files
+                the kernel does not provide are left out.
+
+        """
+        machines = os.path.join(CGROUP_ROOT, CGROUP_MACHINES)
+        try:
+            scan = (os.stat(machines).st_mtime, sorted(os.listdir(machines)))
+        except OSError:
+            # cgroup v1, or no guest was ever started
+            scan = (None, [])
+        if scan != self._cgroup_scan:
+            self._cgroup_scan = scan
+            self._cgroups = CGROUP_SLICES + [CGROUP_MACHINES + '/' + scope
+                                             for scope in scan[1]
+                                             if scope.endswith('.scope')]
+            self._absent_cgroups = set()
+
+        cgroup_stats = {}
+        for cgroup in self._cgroups:
+            if cgroup in self._absent_cgroups:
+                continue
+            counters = self._cgroup_counters(cgroup)
+            if counters:
+                cgroup_stats[cgroup] = counters
+            else:
+                self._absent_cgroups.add(cgroup)
+        for cgroup in set(self._cgroup_files) - set(cgroup_stats):
+            self._close_cgroup(cgroup)
+        return cgroup_stats
+
+    def _cgroup_counters(self, cgroup):
+        counters = {}
+        data = self._read_cgroup_file(cgroup, 'cpu.stat')
+        for key, value in CGROUP_CPU_RE.findall(data):
+            counters[key] = int(value)
+        data = self._read_cgroup_file(cgroup, 'memory.current')
+        if data:
+            counters['memory'] = int(data)
+        data = self._read_cgroup_file(cgroup, 'io.stat')
+        if data:
+            for key in ['rbytes', 'wbytes', 'rios', 'wios']:
+                counters[key] = 0
+            for key, value in CGROUP_IO_RE.findall(data):
+                counters[key] += int(value)
+        for resource in PRESSURE_RESOURCES:
+            data = self._read_cgroup_file(cgroup, resource + '.pressure')
+            for kind, _, _, total in PRESSURE_RE.findall(data):
+                if kind == 'some':
+                    counters[resource + '_stall'] = int(total)
+        return counters
+
+    def _read_cgroup_file(self, cgroup, name):
+        files = self._cgroup_files.setdefault(cgroup, {})
+        if name not in files:
+            files[name] = open_proc_file(os.path.join(CGROUP_ROOT, cgroup,
+                                                      name))
+        proc_file = files[name]
+        if proc_file is None:
+            return ''
+        try:
+            return proc_file.read()
+        except OSError:
+            # the cgroup was removed
+            proc_file.close()
+            files[name] = None
+            return ''
+
+    def _close_cgroup(self, cgroup):
+        for proc_file in self._cgroup_files.pop(cgroup).values():
+            if proc_file is not None:
+                proc_file.close()
+
+    def numa_stats(self):
+        """Get the memory counters of the NUMA nodes.
+
+        The nodes are looked up once, their files are kept open.
+
+        Returns:
+            dict: the 'MemTotal' and 'MemFree' bytes of the node meminfo,
+                and the 'numa_hit', 'numa_miss' and 'numa_foreign' pages of
+                its numastat, indexed by node name, like 'node0'. Empty on
+                kernels without NUMA support.
+
+        """
+        if self._nodes is None:
+            self._nodes = {}
+            try:
+                nodes = os.listdir(NODE_DIR)
+            except OSError:
+                nodes = []
+            for node in nodes:
+                if not NODE_NAME_RE.match(node):
+                    continue
+                path = os.path.join(NODE_DIR, node)
+                meminfo = open_proc_file(os.path.join(path, 'meminfo'))
+                if meminfo is None:
+                    continue
+                self._nodes[node] = (
+                    meminfo, open_proc_file(os.path.join(path, 'numastat')),
+                    parse_cpulist(_read(os.path.join(path, 'cpulist'), '')))
+
+        numa_stats = {}
+        for node, (meminfo, numastat, _) in self._nodes.iteritems():
+            counters = dict((key, int(value) * 1024) for key, value in
+                            NODE_MEMINFO_RE.findall(meminfo.read()))
+            if numastat is not None:
+                counters.update((key, int(value)) for key, value in
+                                NUMASTAT_RE.findall(numastat.read()))
+            numa_stats[node] = counters
+        return numa_stats
+
+    def node_times(self, cpu_times):
+        """Sum the times of the CPUs of each NUMA node.
+
+        Args:
+            cpu_times (dict): the cpu_times() result.
+
+        Returns:
+            dict: the summed cpu times of the online CPUs of each node
+                found by numa_stats(), indexed by node name.
+
+        """
+        node_times = {}
+        for node, (_, _, cpus) in (self._nodes or {}).iteritems():
+            times = [cpu_times[cpu] for cpu in cpus if cpu in cpu_times]
+            if times:
+                node_times[node] = [sum(t) for t in zip(*times)]
+        return node_times
+
+    def power_stats(self, cpu_times):
+        """Get the frequency, idle states and throttling counters of the CPUs.
+
+        The sysfs files of the CPUs are only looked up when the set of online
+        CPUs changes, and are kept open.
+
+        Args:
+            cpu_times (dict): the cpu_times() result.
+
+        Returns:
+            dict: the current 'freq' in kHz, the time spent in each cpuidle
+                state in microseconds, as 'idle.<state>', and the
+                'core_throttle' and 'package_throttle' event counts, indexed
+                by CPU label. Counters the kernel does not provide, like the
+                frequency of guests without cpufreq, are left out.
+
+        """
+        cpus = frozenset(cpu_times) - set(['cpu'])
+        if cpus != self._power_cpus:
+            self._close_power_files()
+            self._power_cpus = cpus
+            for cpu in cpus:
+                self._power_files[cpu] = self._open_power_files(cpu)
+
+        power_stats = {}
+        for cpu, files in self._power_files.iteritems():
+            counters = {}
+            for key, proc_file in files.iteritems():
+                try:
+                    counters[key] = int(proc_file.read())
+                except (OSError, ValueError):
+                    # cpufreq fails to read the frequency of some drivers
+                    continue
+            power_stats[cpu] = counters
+        return power_stats
+
+    def _open_power_files(self, cpu):
+        files = {'freq': open_proc_file(CPU_SYSFS % (cpu, CPU_FREQ))}
+        for kind in THROTTLE_KINDS:
+            files[kind + '_throttle'] = open_proc_file(
+                CPU_SYSFS % (cpu, CPU_THROTTLE % kind))
+        idle_dir = CPU_SYSFS % (cpu, CPUIDLE_DIR)
+        try:
+            states = os.listdir(idle_dir)
+        except OSError:
+            states = []
+        for state in states:
+            if not CPUIDLE_STATE_RE.match(state):
+                continue
+            name = _read(os.path.join(idle_dir, state, 'name'))
+            if name:
+                files['idle.' + name.lower()] = open_proc_file(
+                    os.path.join(idle_dir, state, 'time'))
+        return dict((key, proc_file) for key, proc_file in files.iteritems()
+                    if proc_file is not None)
+
+    def _close_power_files(self):
+        for files in self._power_files.values():
+            for proc_file in files.values():
+                proc_file.close()
+        self._power_files = {}
+
+    def thermal_stats(self):
+        """Get the temperature of the thermal zones.
+
+        The zones are looked up once, their files are kept open.
+
+        Returns:
+            dict: the temperature in millidegrees Celsius, indexed by zone
+                name, like 'thermal_zone0'. Zones whose sensor fails to
+                read are left out.
+
+        """
+        if self._zones is None:
+            self._zones = {}
+            try:
+                zones = os.listdir(THERMAL_DIR)
+            except OSError:
+                zones = []
+            for zone in zones:
+                if not THERMAL_ZONE_RE.match(zone):
+                    continue
+                path = os.path.join(THERMAL_DIR, zone)
+                temp = open_proc_file(os.path.join(path, 'temp'))
+                if temp is not None:
+                    self._zones[zone] = (
+                        _read(os.path.join(path, 'type'), zone), temp)
+
+        thermal_stats = {}
+        for zone, (_, temp) in self._zones.iteritems():
+            try:
+                thermal_stats[zone] = int(temp.read())
+            except (OSError, ValueError):
+                continue
+        return thermal_stats
+
+    @property
+    def thermal_zones(self):
+        """The type of the thermal zones found by thermal_stats(), like
+        'x86_pkg_temp', indexed by zone name."""
+        return dict((zone, zone_type)
+                    for zone, (zone_type, _) in (self._zones or {}).items())
+
+    def filesystem_stats(self):
+        """Get the capacity and inode usage of the mounted filesystems.
+
+        Only the filesystems backed by a block device are reported: pseudo
+        filesystems, like proc, sysfs or tmpfs, are left out, and so are the
+        network filesystems, whose statvfs() hangs while their server is
+        unreachable. A device mounted more than once, like with bind mounts,
+        is reported once, by its shortest mount point.
+
+        Returns:
+            dict: the 'device' and filesystem 'type', the 'size', 'free' and
+                'avail' (to unprivileged users) bytes, and the 'files' and
+                'files_free' inodes, indexed by mount point.
+
+        """
+        nodev = set(line.split()[-1] for line in
+                    _read(PROC_FILESYSTEMS, '').splitlines()
+                    if line.startswith('nodev'))
+
+        def unescape(path):
+            return MOUNTINFO_ESCAPE_RE.sub(lambda m: chr(int(m.group(1), 8)),
+                                           path)
+
+        # device number: (mount point, filesystem type, source)
+        mounts = {}
+        for line in _read(PROC_MOUNTINFO, '').splitlines():
+            fields = line.split()
+            try:
+                separator = fields.index('-', MOUNTINFO_OPTIONAL)
+                fstype, source = fields[separator + 1:separator + 3]
+            except ValueError:
+                continue
+            if fstype in nodev:
+                continue
+            mountpoint = unescape(fields[MOUNTINFO_MOUNTPOINT])
+            device = fields[MOUNTINFO_DEVICE]
+            if device in mounts and \
+                    len(mounts[device][0]) <= len(mountpoint):
+                continue
+            mounts[device] = (mountpoint, fstype, unescape(source))
+
+        filesystem_stats = {}
+        for mountpoint, fstype, source in mounts.itervalues():
+            try:
+                st = os.statvfs(mountpoint)
+            except OSError:
+                continue
+            if not st.f_blocks:
+                continue
+            filesystem_stats[mountpoint] = {
+                'device': source, 'type': fstype,
+                'size': st.f_blocks * st.f_frsize,
+                'free': st.f_bfree * st.f_frsize,
+                'avail': st.f_bavail * st.f_frsize,
+                'files': st.f_files, 'files_free': st.f_ffree}
+        return filesystem_stats
@@ -0,0 +1,916 @@
+#
+# Project Ginger Base
+#
+# Copyright IBM Corp, 2017
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+"""Fixed-capacity history buffers and collector bookkeeping for host
+statistics."""
+
+import array
+import bisect
+import collections
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+
+# Integer columns hold byte counts and rates, which need 64 bits. Fall back
+# to doubles (exact up to 2**53) where a C long is only 32 bits wide.
+INT_TYPECODE = 'l' if array.array('l').itemsize >= 8 else 'd'
+FLOAT_TYPECODE = 'd'
+NAN = float('nan')
+
+# MappedStatsBuffer file header: magic, sequence number and the length of
+# the JSON columns layout that follows it
+STATS_FILE_MAGIC = 'GGBSTATS'
+STATS_FILE_HEADER = struct.Struct('=8sQI')
+STATS_FILE_SEQ_OFFSET = 8
+
+# relative error of the quantiles estimated by QuantileSketch
+SKETCH_ACCURACY = 0.01
+SUMMARY_QUANTILES = [('p50', 0.5), ('p90', 0.9), ('p99', 0.99)]
+# history resampling methods: average, minimum and maximum of buckets of the
+# same duration, or Largest-Triangle-Three-Buckets selection of samples
+RESAMPLE_MINMAX = 'minmax'
+RESAMPLE_LTTB = 'lttb'
+
+
+class RingBuffer(object):
+    """Circular buffer of numbers backed by a typed array.
+
+    Appending is O(1) and never reallocates: once ``capacity`` values are
+    stored, every new value overwrites the oldest one.
+
+    Args:
+        capacity (int): maximum number of values kept.
+        typecode (str): array typecode used to store the values.
+
+    """
+
+    def __init__(self, capacity, typecode=FLOAT_TYPECODE):
+        if capacity < 1:
+            raise ValueError('RingBuffer capacity must be positive')
+        self.capacity = capacity
+        self._data = array.array(typecode, [0]) * capacity
+        self._next = 0
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def append(self, value):
+        self._set(self._next, value)
+        self._next = (self._next + 1) % self.capacity
+        if self._len < self.capacity:
+            self._len += 1
+
+    def last(self):
+        if not self._len:
+            raise IndexError('last() on an empty RingBuffer')
+        return self._get(self._next - 1)
+
+    def window(self, count=None):
+        """Get the most recent values, oldest first.
+
+        Only the requested slice of the underlying array is copied.
+
+        Args:
+            count (int): number of values to return. All stored values are
+                returned when it is None or larger than the buffer length.
+
+        Returns:
+            List: the values.
+
+        """
+        if count is None or count > self._len:
+            count = self._len
+        if count <= 0:
+            return []
+
+        start = self._next - count
+        if start >= 0:
+            return self._slice(start, self._next)
+        return (self._slice(start + self.capacity, self.capacity) +
+                self._slice(0, self._next))
+
+    def _get(self, index):
+        return self._data[index]
+
+    def _set(self, index, value):
+        self._data[index] = value
+
+    def _slice(self, start, stop):
+        return self._data[start:stop].tolist()
+
+
+class MappedRingBuffer(RingBuffer):
+    """RingBuffer stored in a region of a memory mapped file.
+
+    Values are packed into and unpacked from the mapping in place, without
+    intermediate copies.
+
+    Args:
+        mapping (mmap.mmap): the memory mapped file.
+        offset (int): position of the region in the file.
+        capacity (int): maximum number of values kept.
+        typecode (str): struct format character used to store the values.
+        count (int): number of values appended to the region so far.
+
+    """
+
+    def __init__(self, mapping, offset, capacity, typecode, count):
+        self.capacity = capacity
+        self._map = mapping
+        self._offset = offset
+        self._typecode = typecode
+        self._itemsize = struct.calcsize(typecode)
+        self._next = count % capacity
+        self._len = min(count, capacity)
+
+    def _get(self, index):
+        index %= self.capacity
+        return struct.unpack_from(self._typecode, self._map,
+                                  self._offset + index * self._itemsize)[0]
+
+    def _set(self, index, value):
+        struct.pack_into(self._typecode, self._map,
+                         self._offset + index * self._itemsize, value)
+
+    def _slice(self, start, stop):
+        return list(struct.unpack_from('%d%s' % (stop - start, self._typecode),
+                                       self._map,
+                                       self._offset + start * self._itemsize))
+
+
+class StatsBuffer(object):
+    """Named RingBuffer columns that are appended to as a single sample.
+
+    Every sample gets a sequence number, starting at 1, which allows clients
+    to fetch only the samples stored after the last one they have seen.
+
+    Args:
+        columns (List[tuple]): (name, typecode) pair of each column.
+        capacity (int): number of samples kept.
+
+    """
+
+    def __init__(self, columns, capacity):
+        self.capacity = capacity
+        self.columns = [name for name, _ in columns]
+        self._buffers = dict((name, RingBuffer(capacity, typecode))
+                             for name, typecode in columns)
+        self.seq = 0
+        # samples are written by the collector thread and read by the
+        # request threads, keep the columns of a sample consistent
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.seq, self.capacity)
+
+    def append(self, sample):
+        """Store a sample.
+
+        Args:
+            sample (dict): value of every column, indexed by column name.
+
+        """
+        with self._lock:
+            for name in self.columns:
+                self._buffers[name].append(sample[name])
+            self.seq += 1
+
+    def last(self):
+        """Get the most recent sample.
+
+        Returns:
+            dict: value of every column, indexed by column name, and the
+                sample sequence number, indexed by 'seq'.
+
+        """
+        with self._lock:
+            sample = dict((name, buf.last())
+                          for name, buf in self._buffers.iteritems())
+            sample['seq'] = self.seq
+            return sample
+
+    def window(self, count=None, columns=None, since=None):
+        """Get the most recent samples as lists of values, oldest first.
+
+        Args:
+            count (int): number of samples to return, None for all of them.
+            columns (List[str]): columns to return, None for all of them.
+            since (int): only return the samples with a sequence number
+                greater than this one.
+
+        Returns:
+            dict: list of values of each column, indexed by column name, and
+                the samples sequence numbers, indexed by 'seq'.
+
+        """
+        with self._lock:
+            length = len(self)
+            if since is not None:
+                length = min(length, max(self.seq - since, 0))
+            if count is not None:
+                length = min(length, max(count, 0))
+            window = dict((name, self._buffers[name].window(length))
+                          for name in columns or self.columns)
+            window['seq'] = range(self.seq - length + 1, self.seq + 1)
+            return window
+
+
+class MappedStatsBuffer(StatsBuffer):
+    """StatsBuffer kept in a memory mapped file, so it survives restarts.
+
+    The file has a fixed size: a header with the sequence number and the
+    columns layout, then a region of ``capacity`` values for each column.
+    The sequence number is written after the values of a sample, so an
+    interrupted append is discarded. A file with a different layout is
+    reset.
+
+    Args:
+        columns (List[tuple]): (name, typecode) pair of each column.
+        capacity (int): number of samples kept.
+        path (str): path of the file.
+
+    """
+
+    def __init__(self, columns, capacity, path):
+        super(MappedStatsBuffer, self).__init__([], capacity)
+        self.path = path
+        self.columns = [name for name, _ in columns]
+
+        layout = json.dumps([capacity, [[name, typecode,
+                                         struct.calcsize(typecode)]
+                                        for name, typecode in columns]])
+        header_size = STATS_FILE_HEADER.size + len(layout)
+        # the columns start on a page boundary
+        data_offset = -(-header_size // mmap.PAGESIZE) * mmap.PAGESIZE
+        size = data_offset + sum(struct.calcsize(typecode) * capacity
+                                 for _, typecode in columns)
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0644)
+        try:
+            if os.fstat(fd).st_size != size:
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, size)
+            self._map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+        magic, seq, layout_size = STATS_FILE_HEADER.unpack_from(self._map)
+        stored_layout = self._map[STATS_FILE_HEADER.size:
+                                  STATS_FILE_HEADER.size + layout_size]
+        if magic == STATS_FILE_MAGIC and stored_layout == layout:
+            self.seq = seq
+        else:
+            self._map[:data_offset] = '\0' * data_offset
+            STATS_FILE_HEADER.pack_into(self._map, 0, STATS_FILE_MAGIC, 0,
+                                        len(layout))
+            self._map[STATS_FILE_HEADER.size:header_size] = layout
+
+        offset = data_offset
+        for name, typecode in columns:
+            self._buffers[name] = MappedRingBuffer(self._map, offset,
+                                                   capacity, typecode,
+                                                   self.seq)
+            offset += struct.calcsize(typecode) * capacity
+
+    def append(self, sample):
+        with self._lock:
+            for name in self.columns:
+                self._buffers[name].append(sample[name])
+            self.seq += 1
+            struct.pack_into('=Q', self._map, STATS_FILE_SEQ_OFFSET, self.seq)
+
+    def close(self):
+        with self._lock:
+            self._map.flush()
+            self._map.close()
+
+
+def open_stats_buffer(columns, capacity, path=None):
+    """Create a StatsBuffer, stored in a file if a path is given.
+
+    Args:
+        columns (List[tuple]): (name, typecode) pair of each column.
+        capacity (int): number of samples kept.
+        path (str): path of the file keeping the samples, None to keep them
+            in memory only.
+
+    Returns:
+        StatsBuffer: the buffer.
+
+    """
+    if path is None:
+        return StatsBuffer(columns, capacity)
+    return MappedStatsBuffer(columns, capacity, path)
+
+
+class DynamicStatsBuffer(StatsBuffer):
+    """StatsBuffer whose columns are the keys of the samples appended.
+
+    It holds series whose set changes over time, like per device
+    statistics. All the columns store floats. A column missing from a
+    sample gets a NaN value, returned as None, and a column missing from all
+    the samples kept is dropped.
+
+    Args:
+        capacity (int): number of samples kept.
+        seq (int): sequence number of the sample before the first one, to
+            number the samples as those of another buffer.
+
+    """
+
+    def __init__(self, capacity, seq=0):
+        super(DynamicStatsBuffer, self).__init__([], capacity)
+        self.seq = seq
+        self._start = seq
+        # sequence number of the last sample with a value for each column
+        self._seen = {}
+
+    def __len__(self):
+        return min(self.seq - self._start, self.capacity)
+
+    def append(self, sample):
+        with self._lock:
+            for name in sample:
+                if name not in self._buffers:
+                    self._add_column(name)
+            self.seq += 1
+            for name in self.columns:
+                if name in sample:
+                    self._buffers[name].append(sample[name])
+                    self._seen[name] = self.seq
+                else:
+                    self._buffers[name].append(NAN)
+
+            expired = [name for name in self.columns
+                       if self.seq - self._seen[name] >= self.capacity]
+            for name in expired:
+                self.columns.remove(name)
+                del self._buffers[name]
+                del self._seen[name]
+
+    def _add_column(self, name):
+        buf = RingBuffer(self.capacity, FLOAT_TYPECODE)
+        # previous samples did not have the column
+        buf._data = array.array(FLOAT_TYPECODE, [NAN]) * self.capacity
+        buf._next = self.seq % self.capacity
+        buf._len = len(self)
+        self.columns.append(name)
+        self._buffers[name] = buf
+        self._seen[name] = self.seq
+
+    def last(self):
+        sample = super(DynamicStatsBuffer, self).last()
+        return dict((name, None if value != value else value)
+                    for name, value in sample.iteritems())
+
+    def window(self, count=None, columns=None, since=None):
+        window = super(DynamicStatsBuffer, self).window(count, columns, since)
+        for name, values in window.iteritems():
+            if name != 'seq':
+                window[name] = [None if value != value else value
+                                for value in values]
+        return window
+
+
+class StatsRollup(object):
+    """Downsample samples into buckets of a fixed duration.
+
+    The minimum, maximum and sum of every column are updated as samples
+    arrive. When a sample falls out of the current bucket, the bucket is
+    closed and stored in a StatsBuffer: the average in the '<column>'
+    column, the minimum and maximum in 'min.<column>' and 'max.<column>' and
+    the bucket start time in 'timestamp'.
+
+    Args:
+        columns (List[tuple]): (name, typecode) pair of each column.
+        resolution (int): bucket duration in seconds.
+        capacity (int): number of buckets kept.
+        path (str): path of the file keeping the buckets, None to keep them
+            in memory only.
+
+    """
+
+    def __init__(self, columns, resolution, capacity, path=None):
+        self.resolution = resolution
+        self.columns = columns
+        rollup_columns = [('timestamp', FLOAT_TYPECODE)]
+        for name, typecode in columns:
+            rollup_columns += [(name, typecode),
+                               ('min.' + name, typecode),
+                               ('max.' + name, typecode)]
+        self.buckets = open_stats_buffer(rollup_columns, capacity, path)
+        self._start = None
+        self._count = 0
+        self._min = {}
+        self._max = {}
+        self._sum = {}
+
+    def add(self, sample, timestamp):
+        """Account a sample in its bucket.
+
+        Args:
+            sample (dict): value of every column, indexed by column name.
+            timestamp (float): time the sample was collected.
+
+        """
+        start = int(timestamp // self.resolution) * self.resolution
+        if start != self._start:
+            self._close()
+            self._start = start
+
+        if not self._count:
+            self._min = dict((name, sample[name]) for name, _ in self.columns)
+            self._max = dict(self._min)
+            self._sum = dict(self._min)
+        else:
+            for name, _ in self.columns:
+                value = sample[name]
+                self._sum[name] += value
+                if value < self._min[name]:
+                    self._min[name] = value
+                elif value > self._max[name]:
+                    self._max[name] = value
+        self._count += 1
+
+    def _close(self):
+        if not self._count:
+            return
+
+        bucket = {'timestamp': self._start}
+        for name, typecode in self.columns:
+            avg = float(self._sum[name]) / self._count
+            if typecode != FLOAT_TYPECODE:
+                avg = int(round(avg))
+            bucket[name] = avg
+            bucket['min.' + name] = self._min[name]
+            bucket['max.' + name] = self._max[name]
+        self.buckets.append(bucket)
+        self._count = 0
+
+
+def lttb_indices(x, y, points):
+    """Select the samples best preserving the shape of a series.
+
+    Largest-Triangle-Three-Buckets: the first and last samples are kept, and
+    the samples in between are split in points - 2 buckets. In each bucket,
+    the sample forming the largest triangle with the sample selected in the
+    previous bucket and the average of the next bucket is selected.
+
+    Args:
+        x (List[float]): sorted sample times.
+        y (List[float]): sample values.
+        points (int): number of samples to select.
+
+    Returns:
+        List[int]: indices of the selected samples, in order.
+
+    """
+    count = len(x)
+    if points >= count:
+        return range(count)
+    if points < 3:
+        return [0, count - 1][:points]
+
+    every = float(count - 2) / (points - 2)
+    indices = [0]
+    selected = 0
+    for bucket in xrange(points - 2):
+        start = int(bucket * every) + 1
+        end = int((bucket + 1) * every) + 1
+        next_end = min(int((bucket + 2) * every) + 1, count)
+        avg_x = float(sum(x[end:next_end])) / (next_end - end)
+        avg_y = float(sum(y[end:next_end])) / (next_end - end)
+        ax = x[selected]
+        ay = y[selected]
+        dx = ax - avg_x
+        dy = avg_y - ay
+        # twice the triangle area, up to the sign
+        selected = max(xrange(start, end),
+                       key=lambda i: abs(dx * (y[i] - ay) - (ax - x[i]) * dy))
+        indices.append(selected)
+    indices.append(count - 1)
+    return indices
+
+
+class StatsResampler(object):
+    """Resample history columns to a given number of samples.
+
+    With RESAMPLE_MINMAX, the samples are grouped in buckets of the same
+    duration, and each bucket is reduced to the average, minimum and maximum
+    of its samples. With RESAMPLE_LTTB, the samples preserving the shape of
+    one series are selected, see lttb_indices(). Either way, the samples are
+    handled as slices of the columns, so the per-sample work is done by the
+    sum(), min() and max() builtins.
+
+    Args:
+        timestamps (List[float]): sorted sample times.
+        points (int): maximum number of samples returned.
+        method (str): RESAMPLE_MINMAX or RESAMPLE_LTTB.
+        values (List[float]): the series preserved by RESAMPLE_LTTB.
+
+    """
+
+    def __init__(self, timestamps, points, method=RESAMPLE_MINMAX,
+                 values=None):
+        count = len(timestamps)
+        if method == RESAMPLE_LTTB:
+            self.slices = [(i, i + 1) for i in
+                           lttb_indices(timestamps, values, points)]
+            return
+
+        if count <= points:
+            self.slices = [(i, i + 1) for i in xrange(count)]
+            return
+
+        start = timestamps[0]
+        duration = float(timestamps[-1] - start) / points
+        ends = [bisect.bisect_left(timestamps, start + duration * bucket)
+                for bucket in xrange(1, points)] + [count]
+        self.slices = []
+        begin = 0
+        for end in ends:
+            if end > begin:
+                self.slices.append((begin, end))
+                begin = end
+
+    def first(self, values):
+        """Get the first value of each bucket, like its start time."""
+        return [values[start] for start, _ in self.slices]
+
+    def last(self, values):
+        """Get the last value of each bucket, like its sequence number."""
+        return [values[end - 1] for _, end in self.slices]
+
+    def aggregate(self, values):
+        """Reduce a column to the average, minimum and maximum per bucket.
+
+        The averages of integer columns are rounded. None and NaN values are
+        ignored; buckets without other values are reduced to None.
+
+        Args:
+            values (List): values of the column.
+
+        Returns:
+            tuple: the lists of averages, minimums and maximums.
+
+        """
+        buckets = [values[start:end] for start, end in self.slices]
+        try:
+            totals = map(sum, buckets)
+        except TypeError:
+            totals = [NAN] * len(buckets)
+        for i, total in enumerate(totals):
+            if total != total:
+                buckets[i] = [value for value in buckets[i]
+                              if value is not None and value == value]
+                totals[i] = sum(buckets[i]) if buckets[i] else None
+
+        averages = []
+        for total, bucket in zip(totals, buckets):
+            if total is None:
+                averages.append(None)
+            elif isinstance(total, float):
+                averages.append(total / len(bucket))
+            else:
+                averages.append(int(round(float(total) / len(bucket))))
+        minimums = [min(bucket) if bucket else None for bucket in buckets]
+        maximums = [max(bucket) if bucket else None for bucket in buckets]
+        return averages, minimums, maximums
+
+
+class QuantileSketch(object):
+    """Estimate quantiles of a multiset of non-negative values.
+
+    Values are counted in buckets whose bounds grow geometrically, so every
+    quantile is estimated within a relative error of 'accuracy', whatever
+    the range of the values. Values can be added and removed in constant
+    time; the number of buckets only grows with the logarithm of the range.
+
+    Args:
+        accuracy (float): relative error of the estimated quantiles.
+
+    """
+
+    def __init__(self, accuracy=SKETCH_ACCURACY):
+        self._gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self._gamma)
+        # bucket index: number of values, values of at most 0 are in None
+        self.buckets = {}
+        self.count = 0
+
+    def _bucket(self, value):
+        if value <= 0:
+            return None
+        return int(math.ceil(math.log(value) / self._log_gamma))
+
+    def add(self, value):
+        bucket = self._bucket(value)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+
+    def remove(self, value):
+        """Remove a value previously added."""
+        bucket = self._bucket(value)
+        count = self.buckets[bucket] - 1
+        if count:
+            self.buckets[bucket] = count
+        else:
+            del self.buckets[bucket]
+        self.count -= 1
+
+    def quantile(self, q):
+        """Estimate a quantile.
+
+        Args:
+            q (float): the quantile, between 0 and 1.
+
+        Returns:
+            float: the estimated value, None without values.
+
+        """
+        if not self.count:
+            return None
+
+        rank = q * (self.count - 1)
+        seen = self.buckets.get(None, 0)
+        if rank < seen:
+            return 0.0
+        for bucket in sorted(b for b in self.buckets if b is not None):
+            seen += self.buckets[bucket]
+            if rank < seen:
+                # the value minimizing the relative error in the bucket
+                return 2 * self._gamma ** bucket / (self._gamma + 1)
+
+
+class StatsSummary(object):
+    """Quantiles, maximum and histogram of columns over a sliding window.
+
+    The summaries are updated as samples arrive: samples entering the window
+    are added to a QuantileSketch and to a fixed-bucket histogram, samples
+    leaving it are removed from them, and the maximum is kept by a monotonic
+    queue. Reading a summary never scans the samples.
+
+    Args:
+        columns (List[tuple]): (name, bounds) pair of each column, where
+            bounds are the ascending upper bounds of its histogram buckets.
+            A last bucket counts the values above them.
+        window (float): duration covered by the summaries, in seconds.
+
+    """
+
+    def __init__(self, columns, window):
+        self.columns = columns
+        self.window = window
+        # (timestamp, values) of the samples in the window
+        self._samples = collections.deque()
+        self._sketches = [QuantileSketch() for _ in columns]
+        self._histograms = [[0] * (len(bounds) + 1) for _, bounds in columns]
+        # (timestamp, value) of the samples that may become the maximum,
+        # with decreasing values
+        self._maxima = [collections.deque() for _ in columns]
+
+    def __len__(self):
+        return len(self._samples)
+
+    def add(self, sample, timestamp):
+        """Account a sample, and expire the ones older than the window.
+
+        Args:
+            sample (dict): value of every column, indexed by column name.
+            timestamp (float): time the sample was collected.
+
+        """
+        values = tuple(sample[name] for name, _ in self.columns)
+        self._samples.append((timestamp, values))
+        for i, (_, bounds) in enumerate(self.columns):
+            value = values[i]
+            self._sketches[i].add(value)
+            self._histograms[i][bisect.bisect_left(bounds, value)] += 1
+            maxima = self._maxima[i]
+            while maxima and maxima[-1][1] <= value:
+                maxima.pop()
+            maxima.append((timestamp, value))
+
+        start = timestamp - self.window
+        while self._samples[0][0] <= start:
+            _, values = self._samples.popleft()
+            for i, (_, bounds) in enumerate(self.columns):
+                self._sketches[i].remove(values[i])
+                self._histograms[i][bisect.bisect_left(bounds,
+                                                       values[i])] -= 1
+        for maxima in self._maxima:
+            while maxima[0][0] <= start:
+                maxima.popleft()
+
+    def summary(self):
+        """Summaries of the samples in the window.
+
+        Returns:
+            dict: indexed by column name, a dictionary with the 'p50', 'p90'
+                and 'p99' quantiles, the 'max' value, the 'count' of samples
+                and the 'histogram', as 'bounds' and the 'counts' of each
+                bucket. Quantiles and maximum are None without samples.
+
+        """
+        summary = {}
+        for i, (name, bounds) in enumerate(self.columns):
+            values = dict((key, self._sketches[i].quantile(q))
+                          for key, q in SUMMARY_QUANTILES)
+            values['max'] = self._maxima[i][0][1] if self._maxima[i] \
+                else None
+            values['count'] = len(self._samples)
+            values['histogram'] = {'bounds': list(bounds),
+                                   'counts': list(self._histograms[i])}
+            summary[name] = values
+        return summary
+
+
+class CollectorHealth(object):
+    """Timing of the ticks of a periodic statistics collector.
+
+    It records how long each producer of a sample takes and how far apart
+    the ticks actually are, compared with the expected interval. A tick
+    taking more than one and a half intervals means samples were missed.
+
+    Args:
+        interval (float): expected time between ticks, in seconds.
+
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.ticks = 0
+        self.missed_ticks = 0
+        self.last_interval = None
+        self.max_interval = 0.0
+        # producer name: [total, last, max] run time in seconds
+        self.producers = {}
+
+    def tick(self, interval=None, expected=None):
+        """Account a tick.
+
+        Args:
+            interval (float): time since the previous tick, None if it is
+                not expected to be periodic, like the first one.
+            expected (float): expected time since the previous tick, when
+                it differs from the collector interval.
+
+        """
+        self.ticks += 1
+        if interval is None:
+            return
+
+        self.last_interval = interval
+        self.max_interval = max(self.max_interval, interval)
+        missed = int(round(interval / (expected or self.interval))) - 1
+        if missed > 0:
+            self.missed_ticks += missed
+
+    def account(self, producer, seconds):
+        """Account the run time of a producer.
+
+        Args:
+            producer (str): the producer name.
+            seconds (float): its run time.
+
+        """
+        times = self.producers.get(producer)
+        if times is None:
+            self.producers[producer] = [seconds, seconds, seconds]
+        else:
+            times[0] += seconds
+            times[1] = seconds
+            times[2] = max(times[2], seconds)
+
+
+class StatsPublisher(object):
+    """Hand the samples of a single producer over to many consumers.
+
+    The producer publishes every sample once. Consumers block until a sample
+    newer than the last one they got is published, so the number of
+    consumers has no effect on how often samples are collected. Samples are
+    encoded at most once, by the first consumer that needs them.
+
+    Args:
+        encode (callable): function converting a sample to the form handed
+            to the consumers.
+
+    """
+
+    def __init__(self, encode):
+        self.encode = encode
+        self.seq = 0
+        self.subscribers = 0
+        self._sample = None
+        self._encoded = None
+        self._encoded_seq = None
+        self._cond = threading.Condition()
+
+    def publish(self, seq, sample):
+        """Publish a sample and wake up all the consumers.
+
+        Args:
+            seq (int): sequence number of the sample.
+            sample: the sample.
+
+        """
+        with self._cond:
+            self.seq = seq
+            self._sample = sample
+            self._cond.notify_all()
+
+    def reserve(self, limit):
+        """Count a consumer ahead of listen(), unless there are too many.
+
+        The check and the count are atomic, so concurrent consumers cannot
+        exceed the limit. A reserved consumer must be released.
+
+        Args:
+            limit (int): maximum number of consumers.
+
+        Returns:
+            bool: whether the consumer was counted.
+
+        """
+        with self._cond:
+            if self.subscribers >= limit:
+                return False
+            self.subscribers += 1
+            return True
+
+    def release(self):
+        """Uncount a consumer counted by reserve()."""
+        with self._cond:
+            self.subscribers -= 1
+
+    def listen(self, seq=None, timeout=None, reserved=False):
+        """Iterate over the samples published from now on.
+
+        If a consumer is slower than the producer, it skips to the most
+        recent sample.
+
+        Args:
+            seq (int): sequence number of the last sample the consumer got,
+                by default the last one published.
+            timeout (float): seconds to wait for a sample before yielding a
+                None sample, for the consumer to keep its connection alive
+                while the producer is late or stopped. None to wait forever.
+            reserved (bool): whether the consumer was counted by reserve(),
+                in which case the caller releases it.
+
+        Yields:
+            tuple: the sequence number and the encoded sample, or None.
+
+        """
+        with self._cond:
+            if not reserved:
+                self.subscribers += 1
+            if seq is None:
+                seq = self.seq
+
+        try:
+            while True:
+                with self._cond:
+                    deadline = None if timeout is None else \
+                        time.time() + timeout
+                    while self.seq <= seq:
+                        if deadline is None:
+                            self._cond.wait()
+                            continue
+                        remaining = deadline - time.time()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    if self.seq <= seq:
+                        encoded = None
+                    else:
+                        seq = self.seq
+                        if self._encoded_seq != seq:
+                            self._encoded = self.encode(self._sample)
+                            self._encoded_seq = seq
+                        encoded = self._encoded
+                yield seq, encoded
+        finally:
+            if not reserved:
+                self.release()
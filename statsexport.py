@@ -0,0 +1,127 @@
+#
+# Project Ginger Base
+#
+# Copyright IBM Corp, 2017
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+"""Bulk export encodings of the host statistics history."""
+
+import csv
+import struct
+from StringIO import StringIO
+
+# Columnar encoding: a header with the magic, the number of rows and the
+# number of columns, then the type and name of each column, then the values
+# of each column, all little-endian. Integer columns are stored as int64
+# deltas from the previous row (the first row is absolute) and float
+# columns as float32, with NaN for unknown values.
+COLUMNS_MAGIC = 'GGBCOLS1'
+COLUMNS_HEADER = struct.Struct('<8sIH')
+COLUMN_HEADER = struct.Struct('<cH')
+COLUMN_INT = 'q'
+COLUMN_FLOAT = 'f'
+NAN = float('nan')
+
+
+def encode_columns(columns):
+    """Encode columns in the compact columnar binary format.
+
+    Args:
+        columns (List[tuple]): (name, COLUMN_INT or COLUMN_FLOAT, values)
+            of each column. All columns have the same number of values.
+            None float values are stored as NaN.
+
+    Returns:
+        str: the encoded columns.
+
+    """
+    rows = len(columns[0][2]) if columns else 0
+    parts = [COLUMNS_HEADER.pack(COLUMNS_MAGIC, rows, len(columns))]
+    for name, kind, _ in columns:
+        name = name.encode('utf-8')
+        parts.append(COLUMN_HEADER.pack(kind, len(name)))
+        parts.append(name)
+
+    for _, kind, values in columns:
+        if kind == COLUMN_INT:
+            values = [int(value) for value in values]
+            values = values[:1] + [cur - prev for prev, cur in
+                                   zip(values, values[1:])]
+        else:
+            values = [NAN if value is None else value for value in values]
+        parts.append(struct.pack('<%d%s' % (rows, kind), *values))
+    return ''.join(parts)
+
+
+def decode_columns(data):
+    """Decode columns encoded by encode_columns().
+
+    Args:
+        data (str): the encoded columns.
+
+    Returns:
+        List[tuple]: (name, kind, values) of each column.
+
+    Raises:
+        ValueError: if the data is not in the columnar format.
+
+    """
+    if not data.startswith(COLUMNS_MAGIC):
+        raise ValueError('not a columnar statistics export')
+
+    _, rows, count = COLUMNS_HEADER.unpack_from(data)
+    offset = COLUMNS_HEADER.size
+    header = []
+    for _ in xrange(count):
+        kind, length = COLUMN_HEADER.unpack_from(data, offset)
+        offset += COLUMN_HEADER.size
+        header.append((data[offset:offset + length].decode('utf-8'), kind))
+        offset += length
+
+    columns = []
+    for name, kind in header:
+        values = list(struct.unpack_from('<%d%s' % (rows, kind), data,
+                                         offset))
+        offset += rows * struct.calcsize(kind)
+        if kind == COLUMN_INT:
+            for i in xrange(1, rows):
+                values[i] += values[i - 1]
+        columns.append((name, kind, values))
+    return columns
+
+
+def encode_csv(columns):
+    """Encode columns as CSV, with a header row of the column names.
+
+    Args:
+        columns (List[tuple]): (name, values) of each column. None and NaN
+            values are left empty.
+
+    Returns:
+        str: the CSV text.
+
+    """
+    def format_value(value):
+        if value is None or value != value:
+            return ''
+        return repr(value) if isinstance(value, float) else str(value)
+
+    output = StringIO()
+    writer = csv.writer(output, lineterminator='\n')
+    writer.writerow([name for name, _ in columns])
+    for row in zip(*[values for _, values in columns]):
+        writer.writerow([format_value(value) for value in row])
+    return output.getvalue()
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+#
+# Project Ginger Base
+#
+# Copyright IBM Corp, 2017
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+import unittest
+
+from wok.plugins.gingerbase.alerts import ALERT_CLEARED, ALERT_RAISED
+from wok.plugins.gingerbase.alerts import AlertRule
+
+
+class AlertRuleTests(unittest.TestCase):
+
+    def test_parse(self):
+        rule = AlertRule('cpu', 'cpu_utilization > 90 for 60s clear 80')
+        self.assertEqual('cpu_utilization', rule.metric)
+        self.assertEqual(90.0, rule.threshold)
+        self.assertEqual(60, rule.duration)
+        self.assertEqual(80.0, rule.clear)
+
+        rule = AlertRule('avail', 'memory.avail<=1e9')
+        self.assertEqual('memory.avail', rule.metric)
+        self.assertEqual(0, rule.duration)
+        self.assertEqual(1e9, rule.clear)
+
+        for invalid in ['cpu_utilization', 'cpu_utilization = 90',
+                        'cpu_utilization > 90 for 1m',
+                        'cpu_utilization > 90 clear 95']:
+            self.assertRaises(ValueError, AlertRule, 'cpu', invalid)
+
+    def test_duration(self):
+        rule = AlertRule('cpu', 'cpu_utilization > 90 for 10s')
+        self.assertEqual(None, rule.evaluate(95.0, 100))
+        self.assertEqual(None, rule.evaluate(95.0, 105))
+        # the condition must hold for the whole duration
+        self.assertEqual(None, rule.evaluate(50.0, 108))
+        self.assertEqual(None, rule.evaluate(95.0, 110))
+        self.assertEqual(None, rule.evaluate(95.0, 115))
+        self.assertEqual(ALERT_RAISED, rule.evaluate(95.0, 120))
+        self.assertTrue(rule.active)
+        self.assertEqual(120, rule.since)
+
+    def test_hysteresis(self):
+        rule = AlertRule('cpu', 'cpu_utilization > 90 clear 80')
+        self.assertEqual(ALERT_RAISED, rule.evaluate(95.0, 1))
+        # raised once, and kept until the value drops under 80
+        self.assertEqual(None, rule.evaluate(99.0, 2))
+        self.assertEqual(None, rule.evaluate(85.0, 3))
+        self.assertEqual(None, rule.evaluate(float('nan'), 4))
+        self.assertEqual(ALERT_CLEARED, rule.evaluate(80.0, 5))
+        self.assertEqual(None, rule.evaluate(85.0, 6))
+        self.assertEqual({'name': 'cpu', 'rule': 'cpu_utilization > 90 '
+                          'clear 80', 'metric': 'cpu_utilization',
+                          'active': False, 'since': 5, 'value': 85.0},
+                         rule.info())
@@ -34,7 +34,8 @@ from mock import patch
 from tests.utils import patch_auth, request
 from tests.utils import run_server, wait_task
 
-from wok.plugins.gingerbase.model.host import HostModel
+from wok.plugins.gingerbase.model.host import HostModel, HostStatsModel
+from wok.plugins.gingerbase.statsexport import decode_columns
 
 test_server = None
 model = None
@@ -84,7 +85,9 @@ class HostTests(unittest.TestCase):
     def test_hoststats(self):
         time.sleep(1)
         stats_keys = ['cpu_utilization', 'memory', 'disk_read_rate',
-                      'disk_write_rate', 'net_recv_rate', 'net_sent_rate']
+                      'disk_write_rate', 'net_recv_rate', 'net_sent_rate',
+                      'pressure', 'kernel', 'power', 'protocols', 'filesystem',
+                      'timestamp', 'seq']
         resp = self.request('/plugins/gingerbase/host/stats').read()
         stats = json.loads(resp)
         self.assertEquals(sorted(stats_keys), sorted(stats.keys()))
@@ -100,10 +103,370 @@ class HostTests(unittest.TestCase):
         self.assertIn('cached', memory_stats)
         self.assertIn('buffers', memory_stats)
         self.assertIn('avail', memory_stats)
+        for key in ['swap_used', 'dirty', 'writeback', 'slab',
+                    'hugepages_total', 'ksm_sharing', 'committed']:
+            self.assertTrue(memory_stats[key] >= 0)
+        self.assertTrue(memory_stats['swap_in_rate'] >= 0)
+        self.assertTrue(memory_stats['major_faults'] >= 0)
+
+        # the values are None on kernels without PSI
+        pressure = stats['pressure']
+        self.assertEquals(['cpu', 'io', 'memory'], sorted(pressure.keys()))
+        self.assertEquals(['avg10', 'avg60', 'stall'],
+                          sorted(pressure['io']['some'].keys()))
+
+        kernel = stats['kernel']
+        self.assertTrue(kernel['load1'] >= 0)
+        self.assertTrue(kernel['procs_running'] >= 1)
+        self.assertTrue(kernel['ctxt_rate'] > 0)
+        self.assertIn('net_rx', kernel['softirqs'])
+
+        # the values are None on hosts without cpufreq or thermal zones
+        self.assertEquals(['core_throttle_rate', 'freq',
+                           'package_throttle_rate', 'temp'],
+                          sorted(stats['power'].keys()))
+
+        protocols = stats['protocols']
+        self.assertIn('tcp_retrans_rate', protocols)
+        self.assertTrue(protocols['sockets'] > 0)
 
         resp = self.request('/plugins/gingerbase/host/stats/history').read()
         history = json.loads(resp)
         self.assertEquals(sorted(stats_keys), sorted(history.keys()))
+        self.assertEquals(len(history['seq']), len(history['timestamp']))
+        self.assertEquals(len(history['seq']),
+                          len(history['cpu_utilization']))
+
+    def test_hoststats_history_since(self):
+        time.sleep(1)
+        uri = '/plugins/gingerbase/host/stats/history'
+        history = json.loads(self.request(uri).read())
+        last_seq = history['seq'][-1]
+        self.assertEquals(range(history['seq'][0], last_seq + 1),
+                          history['seq'])
+        self.assertEquals(sorted(history['timestamp']), history['timestamp'])
+
+        time.sleep(2)
+        history = json.loads(self.request(uri + '?since=%d' % last_seq).read())
+        self.assertTrue(len(history['seq']) > 0)
+        self.assertTrue(all(seq > last_seq for seq in history['seq']))
+        self.assertEquals(len(history['seq']),
+                          len(history['cpu_utilization']))
+
+        # a sequence number from before a reset of the history
+        since = history['seq'][-1] + 1000000
+        history = json.loads(self.request(uri + '?since=%d&groups=cpus' %
+                                          since).read())
+        self.assertTrue(len(history['seq']) > 0)
+        self.assertTrue(all(seq < since for seq in history['seq']))
+        self.assertEquals(len(history['seq']),
+                          len(history['cpus']['cpu0']['user']))
+
+        resp = self.request(uri + '?since=-1')
+        self.assertEquals(400, resp.status)
+
+    def test_hoststats_history_resolution(self):
+        stats_keys = ['cpu_utilization', 'memory', 'disk_read_rate',
+                      'disk_write_rate', 'net_recv_rate', 'net_sent_rate',
+                      'pressure', 'kernel', 'power', 'protocols',
+                      'filesystem']
+        uri = '/plugins/gingerbase/host/stats/history?resolution=10&range=600'
+        history = json.loads(self.request(uri).read())
+        self.assertEquals(sorted(stats_keys + ['min', 'max', 'timestamp',
+                                               'seq']),
+                          sorted(history.keys()))
+        self.assertEquals(sorted(stats_keys), sorted(history['min'].keys()))
+        self.assertEquals(sorted(stats_keys), sorted(history['max'].keys()))
+        self.assertTrue(len(history['cpu_utilization']) <= 60)
+
+        uri = '/plugins/gingerbase/host/stats/history?range=30'
+        history = json.loads(self.request(uri).read())
+        self.assertEquals(sorted(stats_keys + ['timestamp', 'seq']),
+                          sorted(history.keys()))
+        self.assertTrue(len(history['cpu_utilization']) <= 30)
+
+        uri = '/plugins/gingerbase/host/stats/history?resolution=7'
+        resp = self.request(uri)
+        self.assertEquals(400, resp.status)
+        uri = '/plugins/gingerbase/host/stats/history?range=-1'
+        resp = self.request(uri)
+        self.assertEquals(400, resp.status)
+
+    def test_hoststats_history_summary(self):
+        time.sleep(1)
+        uri = '/plugins/gingerbase/host/stats/history?summary=60'
+        summary = json.loads(self.request(uri).read())['summary']
+        self.assertEquals(60, summary['window'])
+        self.assertEquals(sorted(['window', 'cpu_utilization',
+                                  'disk_read_rate', 'disk_write_rate',
+                                  'net_recv_rate', 'net_sent_rate']),
+                          sorted(summary.keys()))
+        cpu = summary['cpu_utilization']
+        self.assertTrue(cpu['count'] > 0)
+        self.assertTrue(cpu['p50'] <= cpu['p90'] <= cpu['p99'])
+        self.assertEquals(range(10, 100, 10), cpu['histogram']['bounds'])
+        self.assertEquals(cpu['count'], sum(cpu['histogram']['counts']))
+
+        uri = '/plugins/gingerbase/host/stats/history?summary=7'
+        resp = self.request(uri)
+        self.assertEquals(400, resp.status)
+
+    def test_hoststats_history_points(self):
+        time.sleep(2)
+        uri = '/plugins/gingerbase/host/stats/history?range=60&points=2'
+        history = json.loads(self.request(uri).read())
+        self.assertTrue(len(history['seq']) <= 2)
+        self.assertEquals(len(history['seq']), len(history['min']['memory']))
+        self.assertTrue(all(low <= high for low, high in
+                            zip(history['min']['cpu_utilization'],
+                                history['max']['cpu_utilization'])))
+
+        uri += '&resample=lttb&groups=cpus'
+        history = json.loads(self.request(uri).read())
+        self.assertTrue(len(history['seq']) <= 2)
+        self.assertNotIn('min', history)
+        self.assertIn('cpus', history)
+
+        for params in ['points=0', 'points=2&resample=spline']:
+            uri = '/plugins/gingerbase/host/stats/history?' + params
+            resp = self.request(uri)
+            self.assertEquals(400, resp.status)
+
+    def test_hoststats_history_export(self):
+        time.sleep(1)
+        uri = '/plugins/gingerbase/host/stats/history?range=30&format=csv'
+        resp = self.request(uri)
+        self.assertEquals(200, resp.status)
+        lines = resp.read().splitlines()
+        header = lines[0].split(',')
+        self.assertEquals(['timestamp', 'seq', 'cpu_utilization'],
+                          header[:3])
+        self.assertIn('memory.total', header)
+        self.assertTrue(len(lines) > 1)
+        self.assertTrue(all(len(line.split(',')) == len(header)
+                            for line in lines[1:]))
+
+        uri = '/plugins/gingerbase/host/stats/history?resolution=10'
+        resp = self.request(uri, headers={'Accept': 'text/csv'})
+        header = resp.read().splitlines()[0].split(',')
+        self.assertIn('min.cpu_utilization', header)
+        self.assertIn('max.cpu_utilization', header)
+
+        uri = '/plugins/gingerbase/host/stats/history?range=30'
+        resp = self.request(uri, headers={
+            'Accept': 'application/vnd.gingerbase.columns'})
+        self.assertEquals(200, resp.status)
+        columns = dict((name, values) for name, _, values in
+                       decode_columns(resp.read()))
+        self.assertIn('timestamp_ms', columns)
+        self.assertIn('memory.total', columns)
+        self.assertEquals(len(columns['seq']),
+                          len(columns['cpu_utilization']))
+        self.assertEquals(sorted(columns['timestamp_ms']),
+                          columns['timestamp_ms'])
+
+        uri = '/plugins/gingerbase/host/stats/history?format=xml'
+        resp = self.request(uri)
+        self.assertEquals(400, resp.status)
+
+    def test_hoststats_processes(self):
+        uri = '/plugins/gingerbase/host/stats/processes?top=3'
+        processes = json.loads(self.request(uri).read())
+        self.assertEquals(sorted(['timestamp', 'cpu', 'rss', 'io']),
+                          sorted(processes.keys()))
+        self.assertEquals(3, len(processes['rss']))
+        self.assertEquals(sorted(['pid', 'name', 'cpu_utilization', 'rss',
+                                  'read_rate', 'write_rate']),
+                          sorted(processes['cpu'][0].keys()))
+        rss = [process['rss'] for process in processes['rss']]
+        self.assertEquals(sorted(rss, reverse=True), rss)
+
+        # the scan is shared by the requests within the interval
+        again = json.loads(self.request(uri).read())
+        self.assertEquals(processes['timestamp'], again['timestamp'])
+
+        uri = '/plugins/gingerbase/host/stats/processes?top=0'
+        resp = self.request(uri)
+        self.assertEquals(400, resp.status)
+
+    def test_hoststats_alerts(self):
+        uri = '/plugins/gingerbase/host/stats/alerts'
+        req = json.dumps({'name': 'busy',
+                          'rule': 'cpu_utilization >= 0 clear -1'})
+        resp = self.request(uri, req, 'POST')
+        self.assertEquals(201, resp.status)
+        self.assertEquals('busy', json.loads(resp.read())['name'])
+
+        # the rule is raised on the next sample, and never cleared
+        time.sleep(2)
+        alert = json.loads(self.request(uri + '/busy').read())
+        self.assertEquals('cpu_utilization', alert['metric'])
+        self.assertTrue(alert['active'])
+        alerts = json.loads(self.request(uri).read())
+        self.assertEquals(['busy'], [a['name'] for a in alerts])
+
+        # duplicated names, unknown metrics and invalid rules are refused
+        resp = self.request(uri, req, 'POST')
+        self.assertEquals(400, resp.status)
+        for rule in ['foo > 1', 'cpu_utilization ~ 1']:
+            req = json.dumps({'name': 'bad', 'rule': rule})
+            resp = self.request(uri, req, 'POST')
+            self.assertEquals(400, resp.status)
+
+        resp = self.request(uri + '/busy', '{}', 'DELETE')
+        self.assertEquals(204, resp.status)
+        resp = self.request(uri + '/busy')
+        self.assertEquals(404, resp.status)
+
+    def test_hoststats_groups(self):
+        uri = '/plugins/gingerbase/host/stats?groups=cpus,cores,disks,nics'
+        stats = json.loads(self.request(uri).read())
+        self.assertIn('cpu0', stats['cpus'])
+        self.assertEquals(sorted(['user', 'system', 'iowait', 'steal', 'irq',
+                                  'softirq', 'guest']),
+                          sorted(stats['cpus']['cpu0'].keys()))
+        self.assertIn('cores', stats)
+        for disk_stats in stats['disks'].values():
+            self.assertEquals(sorted(['read_iops', 'write_iops', 'read_rate',
+                                      'write_rate', 'await', 'queue_depth',
+                                      'util']),
+                              sorted(disk_stats.keys()))
+        self.assertEquals('unknown', stats['nics']['lo']['type'])
+        self.assertNotIn('cgroups', stats)
+        self.assertIn('recv_drops', stats['nics']['lo'])
+
+        uri = '/plugins/gingerbase/host/stats/history?groups=cpus'
+        history = json.loads(self.request(uri).read())
+        self.assertEquals(len(history['seq']),
+                          len(history['cpus']['cpu0']['user']))
+        self.assertNotIn('cores', history)
+
+        uri = '/plugins/gingerbase/host/stats?groups=numa'
+        stats = json.loads(self.request(uri).read())
+        for node_stats in stats['numa'].values():
+            self.assertTrue(node_stats['memory_used'] <=
+                            node_stats['memory_total'])
+            self.assertIn('numa_miss', node_stats)
+
+        uri = '/plugins/gingerbase/host/stats?groups=thermal'
+        stats = json.loads(self.request(uri).read())
+        for series, values in stats['thermal'].iteritems():
+            if series.startswith('thermal_zone'):
+                self.assertIn('type', values)
+                self.assertIn('temp', values)
+
+        uri = '/plugins/gingerbase/host/stats?groups=filesystems'
+        stats = json.loads(self.request(uri).read())
+        self.assertIn('/', stats['filesystems'])
+        for values in stats['filesystems'].values():
+            self.assertIn('device', values)
+            self.assertIn('type', values)
+            self.assertTrue(0 <= values['used_percent'] <= 100)
+
+        uri = '/plugins/gingerbase/host/stats?groups=cgroups'
+        stats = json.loads(self.request(uri).read())
+        for cgroup_stats in stats['cgroups'].values():
+            self.assertIn(cgroup_stats['type'], ['slice', 'vm'])
+            self.assertIn('name', cgroup_stats)
+
+        resp = self.request('/plugins/gingerbase/host/stats?groups=foo')
+        self.assertEquals(400, resp.status)
+
+    def _read_event(self, resp):
+        # the stream never ends, so it is read up to the end of an event
+        event = ''
+        while not event.endswith('\n\n'):
+            data = resp.read(1)
+            self.assertTrue(data)
+            event += data
+        if event.startswith(':'):
+            # keepalive comment
+            return self._read_event(resp)
+        fields = dict(line.split(': ', 1) for line in event.splitlines())
+        return int(fields['id']), json.loads(fields['data'])
+
+    def test_hoststats_stream(self):
+        uri = '/plugins/gingerbase/host/stats/stream'
+        resp = self.request(uri)
+        self.assertEquals(200, resp.status)
+        self.assertEquals('text/event-stream',
+                          resp.getheader('Content-Type'))
+        seq, sample = self._read_event(resp)
+        self.assertEquals(seq, sample['seq'])
+        self.assertIn('cpu_utilization', sample)
+        next_seq, sample = self._read_event(resp)
+        self.assertTrue(next_seq > seq)
+        resp.close()
+
+        # EventSource clients resume after the last event they received,
+        # the missed samples are sent from the history
+        resp = self.request(uri, headers={'Last-Event-ID': str(seq)})
+        self.assertEquals(200, resp.status)
+        self.assertEquals(seq + 1, self._read_event(resp)[0])
+        resp.close()
+        resp = self.request(uri + '?since=%d' % seq)
+        self.assertEquals(200, resp.status)
+        self.assertEquals(seq + 1, self._read_event(resp)[0])
+        resp.close()
+
+        resp = self.request(uri, headers={'Last-Event-ID': 'foo'})
+        self.assertEquals(400, resp.status)
+
+        # every subscriber holds a server thread
+        with patch.object(HostStatsModel(), 'stream_subscribers', 0):
+            resp = self.request(uri)
+            self.assertEquals(503, resp.status)
+            self.assertEquals('60', resp.getheader('Retry-After'))
+
+    def test_hoststats_idle_ticks(self):
+        stats = HostStatsModel()
+        with patch.multiple(stats, interval=1, idle_interval=10,
+                            idle_timeout=300), \
+                patch.object(stats.publisher, 'subscribers', 0):
+            stats._collector_tick()
+            missed_ticks = stats.health.missed_ticks
+            # nobody read the statistics for a while, the collector backs
+            # off to one sample every 10 seconds
+            stats.last_read = time.time() - 600
+            stats.timestamp = time.time() - 10
+            stats._collector_tick()
+            self.assertEquals(missed_ticks, stats.health.missed_ticks)
+            self.assertEquals(10, stats._tick_interval)
+        stats.mark_read()
+
+    @mock.patch('wok.plugins.gingerbase.model.host.wok_log')
+    def test_hoststats_alerts_failure(self, mock_woklog):
+        stats = HostStatsModel()
+        with patch.object(stats, '_evaluate_alerts',
+                          side_effect=Exception('notification failed')):
+            seq = stats.host_stats.seq
+            stats.update_host_stats()
+            stats.update_host_stats()
+            # the samples are still recorded, the failure is logged once
+            self.assertEquals(seq + 2, stats.host_stats.seq)
+            errors = [args[0] for args, _ in mock_woklog.error.call_args_list
+                      if 'alerts' in args[0]]
+            self.assertEquals(1, len(errors))
+        stats.update_host_stats()
+        self.assertNotIn('alerts', stats._failed_producers)
+
+    def test_metrics(self):
+        time.sleep(1)
+        resp = self.request('/plugins/gingerbase/metrics')
+        self.assertEquals(200, resp.status)
+        self.assertTrue(resp.getheader('Content-Type').startswith(
+            'application/openmetrics-text'))
+        metrics = resp.read()
+        self.assertTrue(metrics.endswith('# EOF\n'))
+        self.assertIn('# TYPE gingerbase_cpu_utilization_ratio gauge\n',
+                      metrics)
+        self.assertIn('# TYPE gingerbase_disk_read_bytes counter\n', metrics)
+        self.assertIn('\ngingerbase_network_received_bytes_total ', metrics)
+        self.assertIn('gingerbase_memory_bytes{type="total"} ', metrics)
+        self.assertIn('\ngingerbase_collector_ticks_total ', metrics)
+        self.assertIn('\ngingerbase_network_tcp_retrans_total ', metrics)
+        self.assertIn('gingerbase_collector_producer_seconds_total'
+                      '{producer="cpu"} ', metrics)
 
     def test_host_actions(self):
         resp = self.request('/plugins/gingerbase/host/shutdown', '{}', 'POST')
@@ -0,0 +1,666 @@
+# -*- coding: utf-8 -*-
+#
+# Project Ginger Base
+#
+# Copyright IBM Corp, 2017
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+import wok.plugins.gingerbase.procstats as procstats
+from wok.plugins.gingerbase.procstats import cgroup_attrs, cgroup_rates
+from wok.plugins.gingerbase.procstats import cpu_breakdown, cpu_busy_percent
+from wok.plugins.gingerbase.procstats import disk_rates, filesystem_rates
+from wok.plugins.gingerbase.procstats import net_rates
+from wok.plugins.gingerbase.procstats import numa_rates, parse_cpulist
+from wok.plugins.gingerbase.procstats import power_rates
+from wok.plugins.gingerbase.procstats import ProcessStats, ProcFile
+
+PROC_STAT = """\
+cpu  100 10 50 800 40 0 0 0 20 0
+cpu0 50 5 25 400 20 0 0 0 10 0
+cpu1 50 5 25 400 20 0 0 0 10 0
+intr 1000 0 0
+ctxt 5000
+btime 1500000000
+processes 300
+procs_running 2
+procs_blocked 1
+softirq 100 1 20 2 30 5 0 0 10 2 30
+"""
+
+PROC_MOUNTINFO = """\
+22 1 0:21 / /proc rw,nosuid shared:5 - proc proc rw
+25 1 8:1 / / rw,relatime shared:1 - ext4 /dev/sda1 rw
+26 25 8:2 / /boot rw,relatime shared:2 - xfs /dev/sda2 rw,attr2
+27 25 0:23 / /run rw,nosuid master:3 shared:6 - tmpfs tmpfs rw,mode=755
+28 25 8:1 /srv /srv/data rw,relatime shared:1 - ext4 /dev/sda1 rw
+29 25 253:0 / /mnt/my\\040disk rw - ext4 /dev/mapper/vg-data rw
+"""
+
+PROC_FILESYSTEMS = """\
+nodev\tsysfs
+nodev\ttmpfs
+nodev\tproc
+\text4
+\txfs
+"""
+
+PROC_LOADAVG = """\
+0.50 0.25 0.10 2/200 1234
+"""
+
+PROC_MEMINFO = """\
+MemTotal:        8000000 kB
+MemFree:         1000000 kB
+MemAvailable:    5000000 kB
+Buffers:          200000 kB
+Cached:          3000000 kB
+SwapTotal:       2000000 kB
+SwapFree:        1500000 kB
+HugePages_Total:      16
+Hugepagesize:       2048 kB
+"""
+
+PROC_VMSTAT = """\
+nr_free_pages 250000
+pgpgin 1000
+pswpin 10
+pswpout 20
+pgfault 50000
+pgmajfault 300
+"""
+
+PROC_DISKSTATS = """\
+   8       0 sda 100 0 2000 10 50 0 1000 20 0 30 30
+   8       1 sda1 90 0 1800 10 40 0 800 20 0 30 30
+ 253       0 dm-0 90 0 1800 10 40 0 800 20 0 30 30
+   7       0 loop0 0 0 0 0 0 0 0 0 0 0 0
+   7       1 loop1 20 0 160 5 0 0 0 0 0 5 5
+"""
+
+PRESSURE_CPU = """\
+some avg10=1.50 avg60=0.75 avg300=0.10 total=123456
+"""
+
+PRESSURE_MEMORY = """\
+some avg10=0.00 avg60=0.20 avg300=0.05 total=5000
+full avg10=0.00 avg60=0.10 avg300=0.02 total=2000
+"""
+
+PROC_NET_DEV = """\
+Inter-|   Receive                                                |  Transmit
+ face |bytes    packets errs drop fifo frame compressed multicast|bytes    \
+packets errs drop fifo colls carrier compressed
+    lo:  5000      50    0    0    0     0          0         0  5000      \
+50    0    0    0     0       0          0
+  eth0: 10000     100    1    2    0     0          0         0 20000     \
+200    3    4    0     0       0          0
+"""
+
+
+PROC_NET_SNMP = """\
+Ip: Forwarding DefaultTTL InReceives
+Ip: 1 64 100000
+Tcp: RtoAlgorithm RtoMin MaxConn ActiveOpens AttemptFails EstabResets \
+CurrEstab RetransSegs OutRsts
+Tcp: 1 200 -1 500 20 10 12 300 40
+Udp: InDatagrams NoPorts InErrors OutDatagrams RcvbufErrors SndbufErrors
+Udp: 9000 3 7 8000 5 1
+"""
+
+PROC_NET_SNMP6 = """\
+Ip6InReceives                   4000
+Udp6InErrors                    2
+Udp6RcvbufErrors                2
+Udp6SndbufErrors                0
+"""
+
+PROC_NET_NETSTAT = """\
+TcpExt: SyncookiesSent ListenOverflows ListenDrops
+TcpExt: 0 6 8
+IpExt: InNoRoutes InTruncatedPkts
+IpExt: 0 0
+"""
+
+PROC_NET_SOCKSTAT = """\
+sockets: used 316
+TCP: inuse 15 orphan 1 tw 4 alloc 20 mem 3
+UDP: inuse 6 mem 2
+UDPLITE: inuse 0
+RAW: inuse 0
+FRAG: inuse 0 memory 0
+"""
+
+PROC_NET_SOCKSTAT6 = """\
+TCP6: inuse 5
+UDP6: inuse 2
+UDPLITE6: inuse 0
+RAW6: inuse 1
+FRAG6: inuse 0 memory 0
+"""
+
+PID_STAT = """\
+%(pid)s (%(name)s) S 1 1 1 0 -1 0 100 0 0 0 %(utime)d %(stime)d 0 0 20 0 \
+1 0 %(start)d 10000000 250 18446744073709551615 1 1 0 0 0 0 0 4096 0 0 0 0 17 \
+0 0 0 0 0 0
+"""
+
+PID_IO = """\
+rchar: 5000
+wchar: 6000
+syscr: 10
+syscw: 20
+read_bytes: %(read)d
+write_bytes: %(write)d
+cancelled_write_bytes: 0
+"""
+
+
+class ProcessStatsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.tmpdir, 'self'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, name, content):
+        with open(os.path.join(self.tmpdir, name), 'w') as f:
+            f.write(content)
+
+    def _process(self, pid, name, start, cpu, rss, read, write):
+        if not os.path.isdir(os.path.join(self.tmpdir, pid)):
+            os.mkdir(os.path.join(self.tmpdir, pid))
+        self._write(pid + '/stat', PID_STAT % {'pid': pid, 'name': name,
+                                               'utime': cpu, 'stime': 0,
+                                               'start': start})
+        self._write(pid + '/statm', '1000 %d 100 1 0 200 0\n' % rss)
+        self._write(pid + '/io', PID_IO % {'read': read, 'write': write})
+
+    def _scan(self, stats, uptime):
+        self._write('uptime', '%.2f 1000.00\n' % uptime)
+        with mock.patch.multiple(procstats, CLOCK_TICKS=100, PAGE_SIZE=4096,
+                                 PROC_DIR=self.tmpdir,
+                                 PROC_UPTIME=os.path.join(self.tmpdir,
+                                                          'uptime'),
+                                 PROC_PID=os.path.join(self.tmpdir, '%s',
+                                                       '%s')):
+            return dict((p['pid'], p) for p in stats.scan())
+
+    def test_scan(self):
+        stats = ProcessStats()
+        self._process('1', 'init', 0, 1000, 10, 0, 0)
+        self._process('42', 'kvm (vm 1)', 5000, 500, 100, 1000, 2000)
+        os.remove(os.path.join(self.tmpdir, '1', 'io'))
+
+        # the first scan accounts the processes since they started
+        processes = self._scan(stats, 100.0)
+        self.assertEqual(['1', '42'],
+                         sorted(str(pid) for pid in processes))
+        self.assertEqual('kvm (vm 1)', processes[42]['name'])
+        self.assertEqual(10.0, processes[1]['cpu_utilization'])
+        self.assertEqual(10.0, processes[42]['cpu_utilization'])
+        self.assertEqual(100 * 4096, processes[42]['rss'])
+        self.assertEqual(20.0, processes[42]['read_rate'])
+        self.assertEqual(0, processes[1]['write_rate'])
+
+        # pid 42 was reused by a process started at 105 seconds
+        self._process('1', 'init', 0, 1200, 10, 0, 0)
+        self._process('42', 'bash', 10500, 50, 1, 0, 0)
+        processes = self._scan(stats, 110.0)
+        self.assertEqual(20.0, processes[1]['cpu_utilization'])
+        self.assertEqual('bash', processes[42]['name'])
+        self.assertEqual(10.0, processes[42]['cpu_utilization'])
+
+        shutil.rmtree(os.path.join(self.tmpdir, '42'))
+        self.assertEqual([1], self._scan(stats, 120.0).keys())
+
+
+class ProcStatsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.files = {}
+        for name, content in [('PROC_STAT', PROC_STAT),
+                              ('PROC_MEMINFO', PROC_MEMINFO),
+                              ('PROC_VMSTAT', PROC_VMSTAT),
+                              ('PROC_LOADAVG', PROC_LOADAVG),
+                              ('PROC_DISKSTATS', PROC_DISKSTATS),
+                              ('PROC_NET_DEV', PROC_NET_DEV),
+                              ('PROC_NET_SNMP', PROC_NET_SNMP),
+                              ('PROC_NET_SNMP6', PROC_NET_SNMP6),
+                              ('PROC_NET_NETSTAT', PROC_NET_NETSTAT),
+                              ('PROC_NET_SOCKSTAT', PROC_NET_SOCKSTAT),
+                              ('PROC_NET_SOCKSTAT6', PROC_NET_SOCKSTAT6)]:
+            self.files[name] = self._write(name, content)
+        # the kernel does not report the I/O pressure
+        os.mkdir(os.path.join(self.tmpdir, 'pressure'))
+        self._write('pressure/cpu', PRESSURE_CPU)
+        self._write('pressure/memory', PRESSURE_MEMORY)
+        self.files['PROC_PRESSURE'] = os.path.join(self.tmpdir, 'pressure',
+                                                   '%s')
+        os.mkdir(os.path.join(self.tmpdir, 'ksm'))
+        self._write('ksm/pages_shared', '100\n')
+        self._write('ksm/pages_sharing', '300\n')
+        self.files['KSM_COUNTER'] = os.path.join(self.tmpdir, 'ksm', '%s')
+        os.makedirs(os.path.join(self.tmpdir, 'net', 'eth0', 'device'))
+        # cpu0 and cpu1 are hardware threads of the same core
+        for cpu in ['cpu0', 'cpu1']:
+            topology = os.path.join(self.tmpdir, cpu, 'topology')
+            os.makedirs(topology)
+            self._write(os.path.join(topology, 'physical_package_id'), '0\n')
+            self._write(os.path.join(topology, 'core_id'), '2\n')
+        # dm-0 is the vg-root LV, on the sda1 partition
+        block = os.path.join(self.tmpdir, 'block')
+        for path in ['sda', 'sda1', 'dm-0/slaves/sda1', 'dm-0/dm',
+                     'loop1/loop', 'loop1/slaves']:
+            os.makedirs(os.path.join(block, path))
+        # loop1 is backed by a file of the root filesystem
+        self._write(os.path.join(block, 'loop1', 'loop', 'backing_file'),
+                    '/var/lib/images/disk.img\n')
+        self._write(os.path.join(block, 'sda1', 'partition'), '1\n')
+        self._write(os.path.join(block, 'dm-0', 'dm', 'name'), 'vg-root\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, name, content):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def _proc_stats(self):
+        net_path = os.path.join(self.tmpdir, 'net', '%s')
+        with mock.patch.multiple(procstats,
+                                 NET_DEVICE=net_path + '/device',
+                                 NET_WIRELESS=net_path + '/wireless',
+                                 **self.files):
+            return procstats.ProcStats()
+
+    def _disk_stats(self, stats):
+        block = os.path.join(self.tmpdir, 'block', '%s')
+        with mock.patch.object(procstats, 'BLOCK_DEVICE', block):
+            return stats.disk_stats()
+
+    def _core_times(self, stats, cpu_times):
+        topology = os.path.join(self.tmpdir, '%s', 'topology', '%s')
+        with mock.patch.object(procstats, 'CPU_TOPOLOGY', topology):
+            return stats.core_times(cpu_times)
+
+    def test_proc_file_reread(self):
+        path = self._write('counter', '1\n')
+        proc_file = ProcFile(path)
+        self.assertEqual('1\n', proc_file.read())
+        self._write('counter', '2' * 70000)
+        self.assertEqual('2' * 70000, proc_file.read())
+        proc_file.close()
+
+    def test_proc_file_short_reads(self):
+        # seq_file backed files return a page per read
+        content = ''.join('eth%d: %s\n' % (i, ' '.join(['1'] * 16))
+                          for i in xrange(500))
+        path = self._write('net_dev', content)
+        os_read = os.read
+        with mock.patch('os.read',
+                        side_effect=lambda fd, size: os_read(fd, 4096)):
+            proc_file = ProcFile(path)
+            self.assertEqual(content, proc_file.read())
+            proc_file.close()
+
+    def test_cpu(self):
+        stats = self._proc_stats()
+        cpu_times = stats.cpu_times()
+        self.assertEqual(['cpu', 'cpu0', 'cpu1'], sorted(cpu_times))
+        cpu_times = cpu_times['cpu']
+        self.assertEqual([100, 10, 50, 800, 40, 0, 0, 0, 20, 0], cpu_times)
+        # 160 busy out of 1000, since boot
+        self.assertEqual(16.0, cpu_busy_percent(None, cpu_times))
+        # guest time is already accounted in user time
+        cur = [150, 10, 100, 850, 90, 0, 0, 0, 40, 0]
+        self.assertEqual(50.0, cpu_busy_percent(cpu_times, cur))
+        self.assertEqual(0.0, cpu_busy_percent(cur, cur))
+
+    def test_kernel_activity(self):
+        stats = self._proc_stats()
+        stats.cpu_times()
+        self.assertEqual({'intr': 1000, 'ctxt': 5000, 'processes': 300,
+                          'procs_running': 2, 'procs_blocked': 1,
+                          'softirq': [1, 20, 2, 30, 5, 0, 0, 10, 2, 30],
+                          'load1': 0.5, 'load5': 0.25, 'load15': 0.1},
+                         stats.kernel_activity())
+
+    def test_cpu_breakdown(self):
+        prev = [100, 10, 50, 800, 40, 0, 0, 0, 20, 0]
+        cur = [150, 20, 80, 900, 60, 10, 20, 10, 30, 0]
+        # guest time is taken out of user time
+        self.assertEqual({'user': 20.0, 'system': 12.0, 'iowait': 8.0,
+                          'irq': 4.0, 'softirq': 8.0, 'steal': 4.0,
+                          'guest': 4.0}, cpu_breakdown(prev, cur))
+        self.assertEqual(0.0, cpu_breakdown(cur, cur)['user'])
+
+    def test_core_times(self):
+        stats = self._proc_stats()
+        core_times = self._core_times(stats, stats.cpu_times())
+        self.assertEqual({'socket0_core2': [100, 10, 50, 800, 40, 0, 0, 0,
+                                            20, 0]}, core_times)
+
+    def test_memory(self):
+        memory = self._proc_stats().memory()
+        self.assertEqual(8000000 * 1024, memory['MemTotal'])
+        self.assertEqual(5000000 * 1024, memory['MemAvailable'])
+        self.assertEqual(3000000 * 1024, memory['Cached'])
+        # the huge pages are counted in pages
+        self.assertEqual(16, memory['HugePages_Total'])
+        self.assertEqual(2048 * 1024, memory['Hugepagesize'])
+
+    def test_paging(self):
+        stats = self._proc_stats()
+        self.assertEqual({'pswpin': 10, 'pswpout': 20, 'pgmajfault': 300},
+                         stats.paging())
+        with mock.patch.object(procstats, 'PAGE_SIZE', 4096):
+            self.assertEqual((100 * 4096, 300 * 4096), stats.ksm())
+
+    def test_pressure(self):
+        self.assertEqual({('cpu', 'some'): (1.5, 0.75, 123456),
+                          ('memory', 'some'): (0.0, 0.2, 5000),
+                          ('memory', 'full'): (0.0, 0.1, 2000)},
+                         self._proc_stats().pressure())
+
+    def test_disk_io(self):
+        stats = self._proc_stats()
+        disk_stats = self._disk_stats(stats)
+        # unused devices are left out
+        self.assertEqual(['dm-0', 'loop1', 'sda', 'sda1'],
+                         sorted(disk_stats))
+        self.assertEqual([100, 0, 2000, 10, 50, 0, 1000, 20, 0, 30, 30],
+                         disk_stats['sda'])
+        # sda1, dm-0 and loop1 I/O is already accounted in sda
+        self.assertEqual(frozenset(['sda']), stats.physical_disks)
+        self.assertEqual((2000 * 512, 1000 * 512), stats.disk_io(disk_stats))
+        self.assertEqual('vg-root', stats.disk_name('dm-0'))
+        self.assertEqual('sda1', stats.disk_name('sda1'))
+
+    def test_disk_rates(self):
+        prev = [100, 0, 2000, 10, 50, 0, 1000, 20, 0, 30, 30]
+        cur = [200, 0, 4000, 110, 150, 0, 3000, 320, 2, 530, 1030]
+        self.assertEqual({'read_iops': 50.0, 'write_iops': 50.0,
+                          'read_rate': 512000.0, 'write_rate': 512000.0,
+                          'await': 2.0, 'queue_depth': 0.5, 'util': 25.0},
+                         disk_rates(prev, cur, 2.0))
+        self.assertEqual(0.0, disk_rates(cur, cur, 1.0)['await'])
+
+    def test_net_io(self):
+        stats = self._proc_stats()
+        net_stats = stats.net_stats()
+        self.assertEqual({'lo': [5000, 50, 0, 0, 5000, 50, 0, 0],
+                          'eth0': [10000, 100, 1, 2, 20000, 200, 3, 4]},
+                         net_stats)
+        self.assertEqual(frozenset(['eth0']), stats.physical_ifaces)
+        self.assertEqual((10000, 20000), stats.net_io(net_stats))
+
+    def test_net_rates(self):
+        prev = [10000, 100, 1, 2, 20000, 200, 3, 4]
+        cur = [30000, 120, 1, 6, 20000, 200, 3, 4]
+        self.assertEqual({'recv_rate': 10000.0, 'recv_packets': 10.0,
+                          'recv_errors': 0.0, 'recv_drops': 2.0,
+                          'sent_rate': 0.0, 'sent_packets': 0.0,
+                          'sent_errors': 0.0, 'sent_drops': 0.0},
+                         net_rates(prev, cur, 2.0))
+        # the interface was recreated, its counters restarted from 0
+        self.assertEqual(100.0, net_rates(cur, prev, 1.0)['recv_packets'])
+
+    def test_protocols(self):
+        # the Udp counters are summed over IPv4 and IPv6
+        self.assertEqual({'tcp_retrans': 300, 'tcp_resets': 40,
+                          'tcp_estab_resets': 10, 'tcp_attempt_fails': 20,
+                          'tcp_listen_overflows': 6, 'tcp_listen_drops': 8,
+                          'udp_errors': 9, 'udp_rcvbuf_errors': 7,
+                          'udp_sndbuf_errors': 1, 'sockets': 316,
+                          'tcp_established': 12, 'tcp_inuse': 20,
+                          'tcp_time_wait': 4, 'tcp_orphan': 1,
+                          'udp_inuse': 8},
+                         self._proc_stats().protocol_stats())
+
+    def _cgroup(self, cgroup, files):
+        path = os.path.join(self.tmpdir, 'cgroup', cgroup)
+        os.makedirs(path)
+        for name, content in files.iteritems():
+            self._write(os.path.join(path, name), content)
+
+    def test_cgroups(self):
+        guest = 'machine.slice/machine-qemu\\x2d1\\x2dvm\\x2d1.scope'
+        self._cgroup('machine.slice', {
+            'cpu.stat': 'usage_usec 3000000\nuser_usec 2000000\n'
+                        'system_usec 1000000\nnr_periods 0\n'
+                        'nr_throttled 0\nthrottled_usec 500\n',
+            'memory.current': '1048576\n',
+            'io.stat': '8:0 rbytes=4096 wbytes=8192 rios=1 wios=2 dbytes=0 '
+                       'dios=0\n253:0 rbytes=4096 wbytes=0 rios=1 wios=0 '
+                       'dbytes=0 dios=0\n',
+            'cpu.pressure': PRESSURE_CPU,
+            'memory.pressure': PRESSURE_MEMORY})
+        # the memory and io controllers are not enabled for the guest
+        self._cgroup(guest, {'cpu.stat': 'usage_usec 1000\n'})
+        self._cgroup('machine.slice/libvirtd.service', {})
+
+        stats = self._proc_stats()
+        with mock.patch.object(procstats, 'CGROUP_ROOT',
+                               os.path.join(self.tmpdir, 'cgroup')):
+            cgroup_stats = stats.cgroup_stats()
+        self.assertEqual(['machine.slice', guest], sorted(cgroup_stats))
+        self.assertEqual({'usage_usec': 3000000, 'throttled_usec': 500,
+                          'memory': 1048576, 'rbytes': 8192, 'wbytes': 8192,
+                          'rios': 2, 'wios': 2, 'cpu_stall': 123456,
+                          'memory_stall': 5000},
+                         cgroup_stats['machine.slice'])
+        self.assertEqual({'usage_usec': 1000}, cgroup_stats[guest])
+        self.assertEqual({'type': 'vm', 'name': 'vm-1'}, cgroup_attrs(guest))
+        self.assertEqual({'type': 'slice', 'name': 'system.slice'},
+                         cgroup_attrs('system.slice'))
+
+        # the missing slices are not looked up again until a guest starts
+        with mock.patch.object(procstats, 'CGROUP_ROOT',
+                               os.path.join(self.tmpdir, 'cgroup')), \
+                mock.patch.object(procstats, 'open_proc_file',
+                                  wraps=procstats.open_proc_file) as open_file:
+            self.assertEqual(cgroup_stats, stats.cgroup_stats())
+            self.assertFalse(open_file.called)
+            self._cgroup('system.slice', {'cpu.stat': 'usage_usec 2000\n'})
+            self._cgroup('machine.slice/machine-qemu\\x2d2\\x2dvm2.scope',
+                         {})
+            stats.cgroup_stats()
+            self.assertIn(os.path.join(self.tmpdir, 'cgroup', 'system.slice',
+                                       'cpu.stat'),
+                          [args[0] for args, _ in open_file.call_args_list])
+        stats.close()
+
+    def test_cgroup_rates(self):
+        prev = {'usage_usec': 1000000, 'memory': 4096, 'rbytes': 0,
+                'io_stall': 100}
+        cur = {'usage_usec': 3000000, 'memory': 8192, 'rbytes': 1000,
+               'io_stall': 300}
+        # 2 CPUs busy out of 4 during one second
+        self.assertEqual({'cpu_utilization': 50.0, 'memory': 8192,
+                          'read_rate': 1000.0, 'io_stall': 200.0},
+                         cgroup_rates(prev, cur, 1.0, 4))
+
+    def test_numa(self):
+        node = os.path.join(self.tmpdir, 'node', 'node0')
+        os.makedirs(node)
+        os.mkdir(os.path.join(self.tmpdir, 'node', 'power'))
+        self._write(os.path.join(node, 'meminfo'),
+                    'Node 0 MemTotal:       8000000 kB\n'
+                    'Node 0 MemFree:        1000000 kB\n'
+                    'Node 0 HugePages_Total:     0\n')
+        self._write(os.path.join(node, 'numastat'),
+                    'numa_hit 5000\nnuma_miss 20\nnuma_foreign 10\n'
+                    'interleave_hit 100\nlocal_node 5000\nother_node 20\n')
+        self._write(os.path.join(node, 'cpulist'), '0-1\n')
+
+        stats = self._proc_stats()
+        with mock.patch.object(procstats, 'NODE_DIR',
+                               os.path.join(self.tmpdir, 'node')):
+            numa_stats = stats.numa_stats()
+        self.assertEqual({'node0': {'MemTotal': 8000000 * 1024,
+                                    'MemFree': 1000000 * 1024,
+                                    'numa_hit': 5000, 'numa_miss': 20,
+                                    'numa_foreign': 10}}, numa_stats)
+        self.assertEqual({'node0': [100, 10, 50, 800, 40, 0, 0, 0, 20, 0]},
+                         stats.node_times(stats.cpu_times()))
+        stats.close()
+
+    def test_numa_rates(self):
+        prev = {'MemTotal': 8192, 'MemFree': 4096, 'numa_hit': 100,
+                'numa_miss': 0, 'numa_foreign': 5}
+        cur = {'MemTotal': 8192, 'MemFree': 1024, 'numa_hit': 300,
+               'numa_miss': 10, 'numa_foreign': 5}
+        self.assertEqual({'memory_total': 8192, 'memory_free': 1024,
+                          'memory_used': 7168, 'numa_hit': 100.0,
+                          'numa_miss': 5.0, 'numa_foreign': 0.0},
+                         numa_rates(prev, cur, 2.0))
+        self.assertEqual(['cpu0', 'cpu1', 'cpu2', 'cpu8'],
+                         parse_cpulist('0-2,8'))
+
+    def test_power(self):
+        cpu0 = os.path.join(self.tmpdir, 'cpu', 'cpu0')
+        for name in ['cpufreq', 'thermal_throttle', 'cpuidle/state0',
+                     'cpuidle/state1']:
+            os.makedirs(os.path.join(cpu0, name))
+        self._write(os.path.join(cpu0, 'cpufreq', 'scaling_cur_freq'),
+                    '2400000\n')
+        self._write(os.path.join(cpu0, 'thermal_throttle',
+                                 'core_throttle_count'), '3\n')
+        self._write(os.path.join(cpu0, 'thermal_throttle',
+                                 'package_throttle_count'), '7\n')
+        for state, name, usec in [('state0', 'POLL', 10),
+                                  ('state1', 'C1E', 500000)]:
+            self._write(os.path.join(cpu0, 'cpuidle', state, 'name'),
+                        name + '\n')
+            self._write(os.path.join(cpu0, 'cpuidle', state, 'time'),
+                        '%d\n' % usec)
+        zone = os.path.join(self.tmpdir, 'thermal', 'thermal_zone0')
+        os.makedirs(zone)
+        os.mkdir(os.path.join(self.tmpdir, 'thermal', 'cooling_device0'))
+        self._write(os.path.join(zone, 'type'), 'x86_pkg_temp\n')
+        self._write(os.path.join(zone, 'temp'), '54000\n')
+
+        stats = self._proc_stats()
+        with mock.patch.object(procstats, 'CPU_SYSFS',
+                               os.path.join(self.tmpdir, 'cpu', '%s', '%s')):
+            power_stats = stats.power_stats(stats.cpu_times())
+        # cpu1 has no cpufreq, cpuidle nor thermal throttling
+        self.assertEqual({'cpu0': {'freq': 2400000, 'core_throttle': 3,
+                                   'package_throttle': 7, 'idle.poll': 10,
+                                   'idle.c1e': 500000},
+                          'cpu1': {}}, power_stats)
+        with mock.patch.object(procstats, 'THERMAL_DIR',
+                               os.path.join(self.tmpdir, 'thermal')):
+            self.assertEqual({'thermal_zone0': 54000}, stats.thermal_stats())
+        self.assertEqual({'thermal_zone0': 'x86_pkg_temp'},
+                         stats.thermal_zones)
+        stats.close()
+
+    def test_power_rates(self):
+        prev = {'freq': 1200000, 'idle.c6': 1000000, 'core_throttle': 10}
+        cur = {'freq': 3000000, 'idle.c6': 2500000, 'core_throttle': 30}
+        self.assertEqual({'freq': 3000.0, 'idle_c6': 75.0,
+                          'core_throttle': 10.0},
+                         power_rates(prev, cur, 2.0))
+
+    def test_filesystems(self):
+        self.files['PROC_MOUNTINFO'] = self._write('mountinfo',
+                                                   PROC_MOUNTINFO)
+        self.files['PROC_FILESYSTEMS'] = self._write('filesystems',
+                                                     PROC_FILESYSTEMS)
+        stats = self._proc_stats()
+
+        def statvfs(path):
+            if path == '/boot':
+                raise OSError(13, 'Permission denied')
+            return mock.Mock(f_frsize=4096, f_blocks=1000, f_bfree=400,
+                             f_bavail=300, f_files=100, f_ffree=90)
+
+        with mock.patch.multiple(procstats, **self.files):
+            with mock.patch('os.statvfs', side_effect=statvfs):
+                filesystem_stats = stats.filesystem_stats()
+        # the pseudo filesystems and the bind mount are left out
+        self.assertEqual(['/', '/mnt/my disk'], sorted(filesystem_stats))
+        self.assertEqual({'device': '/dev/sda1', 'type': 'ext4',
+                          'size': 4096000, 'free': 1638400,
+                          'avail': 1228800, 'files': 100, 'files_free': 90},
+                         filesystem_stats['/'])
+        self.assertEqual('/dev/mapper/vg-data',
+                         filesystem_stats['/mnt/my disk']['device'])
+        stats.close()
+
+    def test_filesystem_rates(self):
+        prev = {'size': 1000, 'free': 600, 'avail': 500, 'files': 0,
+                'files_free': 0}
+        cur = {'size': 1000, 'free': 400, 'avail': 300, 'files': 0,
+               'files_free': 0}
+        # btrfs does not have a fixed number of inodes
+        self.assertEqual({'size': 1000, 'used': 600, 'avail': 300,
+                          'used_percent': 66.7, 'fill_rate': 20.0,
+                          'time_to_full': 15.0},
+                         filesystem_rates(prev, cur, 10.0))
+
+        cur.update({'files': 100, 'files_free': 80})
+        rates = filesystem_rates(None, cur, 10.0)
+        self.assertEqual(20.0, rates['inodes_used_percent'])
+        self.assertEqual(80, rates['inodes_free'])
+        self.assertNotIn('fill_rate', rates)
+
+        prev.update({'free': 400, 'files': 100, 'files_free': 70})
+        rates = filesystem_rates(prev, cur, 10.0)
+        self.assertEqual(0.0, rates['fill_rate'])
+        self.assertEqual(-1.0, rates['inodes_fill_rate'])
+        self.assertNotIn('time_to_full', rates)
+        self.assertNotIn('inodes_time_to_full', rates)
+
+    def test_missing_files(self):
+        self.files['PROC_DISKSTATS'] = os.path.join(self.tmpdir, 'none')
+        self.files['PROC_NET_DEV'] = os.path.join(self.tmpdir, 'none')
+        for name in ['PROC_NET_SNMP', 'PROC_NET_SNMP6', 'PROC_NET_NETSTAT',
+                     'PROC_NET_SOCKSTAT', 'PROC_NET_SOCKSTAT6']:
+            self.files[name] = os.path.join(self.tmpdir, 'none')
+        self.files['PROC_PRESSURE'] = os.path.join(self.tmpdir, 'none', '%s')
+        self.files['PROC_VMSTAT'] = os.path.join(self.tmpdir, 'none')
+        self.files['KSM_COUNTER'] = os.path.join(self.tmpdir, 'none', '%s')
+        stats = self._proc_stats()
+        self.assertEqual({}, self._disk_stats(stats))
+        self.assertEqual((0, 0), stats.disk_io({}))
+        self.assertEqual({}, stats.net_stats())
+        self.assertEqual((0, 0), stats.net_io({}))
+        self.assertEqual({}, stats.protocol_stats())
+        self.assertEqual({}, stats.pressure())
+        self.assertEqual({}, stats.paging())
+        self.assertEqual((0, 0), stats.ksm())
+        with mock.patch.object(procstats, 'CGROUP_ROOT',
+                               os.path.join(self.tmpdir, 'none')):
+            self.assertEqual({}, stats.cgroup_stats())
+        with mock.patch.object(procstats, 'NODE_DIR',
+                               os.path.join(self.tmpdir, 'none')):
+            self.assertEqual({}, stats.numa_stats())
+        with mock.patch.object(procstats, 'THERMAL_DIR',
+                               os.path.join(self.tmpdir, 'none')):
+            self.assertEqual({}, stats.thermal_stats())
@@ -0,0 +1,404 @@
+# -*- coding: utf-8 -*-
+#
+# Project Ginger Base
+#
+# Copyright IBM Corp, 2017
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from wok.plugins.gingerbase.statsbuffer import CollectorHealth
+from wok.plugins.gingerbase.statsbuffer import DynamicStatsBuffer
+from wok.plugins.gingerbase.statsbuffer import INT_TYPECODE, RingBuffer
+from wok.plugins.gingerbase.statsbuffer import MappedStatsBuffer
+from wok.plugins.gingerbase.statsbuffer import lttb_indices, QuantileSketch
+from wok.plugins.gingerbase.statsbuffer import RESAMPLE_LTTB
+from wok.plugins.gingerbase.statsbuffer import StatsBuffer, StatsPublisher
+from wok.plugins.gingerbase.statsbuffer import StatsResampler, StatsRollup
+from wok.plugins.gingerbase.statsbuffer import StatsSummary
+
+
+class RingBufferTests(unittest.TestCase):
+
+    def test_empty_buffer(self):
+        buf = RingBuffer(5)
+        self.assertEqual(0, len(buf))
+        self.assertEqual([], buf.window())
+        self.assertRaises(IndexError, buf.last)
+
+    def test_append_within_capacity(self):
+        buf = RingBuffer(5, INT_TYPECODE)
+        for value in xrange(3):
+            buf.append(value)
+        self.assertEqual(3, len(buf))
+        self.assertEqual(2, buf.last())
+        self.assertEqual([0, 1, 2], buf.window())
+        self.assertEqual([1, 2], buf.window(2))
+
+    def test_append_wraps_around(self):
+        buf = RingBuffer(5, INT_TYPECODE)
+        for value in xrange(12):
+            buf.append(value)
+        self.assertEqual(5, len(buf))
+        self.assertEqual(11, buf.last())
+        self.assertEqual([7, 8, 9, 10, 11], buf.window())
+        self.assertEqual([9, 10, 11], buf.window(3))
+        self.assertEqual([7, 8, 9, 10, 11], buf.window(50))
+        self.assertEqual([], buf.window(0))
+
+    def test_invalid_capacity(self):
+        self.assertRaises(ValueError, RingBuffer, 0)
+
+
+class StatsBufferTests(unittest.TestCase):
+
+    def test_samples(self):
+        stats = StatsBuffer([('cpu', 'd'), ('mem', INT_TYPECODE)], 3)
+        for value in xrange(4):
+            stats.append({'cpu': value / 2.0, 'mem': value * 1024})
+
+        self.assertEqual(3, len(stats))
+        self.assertEqual({'cpu': 1.5, 'mem': 3072, 'seq': 4}, stats.last())
+        self.assertEqual({'cpu': [0.5, 1.0, 1.5],
+                          'mem': [1024, 2048, 3072],
+                          'seq': [2, 3, 4]}, stats.window())
+        self.assertEqual({'mem': [2048, 3072], 'seq': [3, 4]},
+                         stats.window(2, columns=['mem']))
+
+    def test_since(self):
+        stats = StatsBuffer([('cpu', 'd')], 3)
+        self.assertEqual({'cpu': [], 'seq': []}, stats.window(since=0))
+        for value in xrange(5):
+            stats.append({'cpu': float(value)})
+
+        self.assertEqual({'cpu': [4.0], 'seq': [5]}, stats.window(since=4))
+        self.assertEqual({'cpu': [], 'seq': []}, stats.window(since=5))
+        self.assertEqual({'cpu': [], 'seq': []}, stats.window(since=9))
+        # samples older than the buffer capacity are lost
+        self.assertEqual({'cpu': [2.0, 3.0, 4.0], 'seq': [3, 4, 5]},
+                         stats.window(since=0))
+        self.assertEqual({'cpu': [4.0], 'seq': [5]},
+                         stats.window(1, since=3))
+
+
+class MappedStatsBufferTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'host.stats')
+        self.columns = [('cpu', 'd'), ('mem', INT_TYPECODE)]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_samples(self):
+        stats = MappedStatsBuffer(self.columns, 3, self.path)
+        self.assertEqual({'cpu': [], 'mem': [], 'seq': []}, stats.window())
+        for value in xrange(4):
+            stats.append({'cpu': value / 2.0, 'mem': 2 ** 40 + value})
+
+        self.assertEqual({'cpu': 1.5, 'mem': 2 ** 40 + 3, 'seq': 4},
+                         stats.last())
+        self.assertEqual({'cpu': [0.5, 1.0, 1.5],
+                          'mem': [2 ** 40 + 1, 2 ** 40 + 2, 2 ** 40 + 3],
+                          'seq': [2, 3, 4]}, stats.window())
+        self.assertEqual({'cpu': [1.5], 'seq': [4]},
+                         stats.window(columns=['cpu'], since=3))
+
+    def test_reopen(self):
+        stats = MappedStatsBuffer(self.columns, 3, self.path)
+        for value in xrange(4):
+            stats.append({'cpu': float(value), 'mem': value})
+        stats.close()
+
+        # the samples are kept across restarts
+        stats = MappedStatsBuffer(self.columns, 3, self.path)
+        self.assertEqual({'cpu': [1.0, 2.0, 3.0], 'mem': [1, 2, 3],
+                          'seq': [2, 3, 4]}, stats.window())
+        stats.append({'cpu': 4.0, 'mem': 4})
+        self.assertEqual({'cpu': 4.0, 'mem': 4, 'seq': 5}, stats.last())
+        stats.close()
+
+        # but dropped when the layout changes
+        stats = MappedStatsBuffer(self.columns, 5, self.path)
+        self.assertEqual(0, len(stats))
+        self.assertEqual({'cpu': [], 'mem': [], 'seq': []}, stats.window())
+        stats.close()
+
+
+class DynamicStatsBufferTests(unittest.TestCase):
+
+    def test_columns(self):
+        stats = DynamicStatsBuffer(3)
+        stats.append({('sda', 'util'): 1.0})
+        stats.append({('sda', 'util'): 2.0, ('sdb', 'util'): 5.0})
+        self.assertEqual({('sda', 'util'): 2.0, ('sdb', 'util'): 5.0,
+                          'seq': 2}, stats.last())
+        self.assertEqual({('sda', 'util'): [1.0, 2.0],
+                          ('sdb', 'util'): [None, 5.0],
+                          'seq': [1, 2]}, stats.window())
+
+        # sda is gone, it is dropped once it is missing from all samples
+        stats.append({('sdb', 'util'): 6.0})
+        stats.append({('sdb', 'util'): 7.0})
+        self.assertEqual({('sda', 'util'): [2.0, None, None],
+                          ('sdb', 'util'): [5.0, 6.0, 7.0],
+                          'seq': [2, 3, 4]}, stats.window())
+        stats.append({})
+        self.assertEqual({('sdb', 'util'): [6.0, 7.0, None],
+                          'seq': [3, 4, 5]}, stats.window())
+
+    def test_seq(self):
+        # numbered after the 52 samples of a restored history
+        stats = DynamicStatsBuffer(5, 52)
+        self.assertEqual({'seq': []}, stats.window())
+        for value in [1.0, 2.0, 3.0]:
+            stats.append({('sda', 'util'): value})
+        self.assertEqual({('sda', 'util'): [2.0, 3.0], 'seq': [54, 55]},
+                         stats.window(since=53))
+        self.assertEqual({('sda', 'util'): [1.0, 2.0, 3.0],
+                          'seq': [53, 54, 55]}, stats.window())
+
+
+class StatsRollupTests(unittest.TestCase):
+
+    def test_buckets(self):
+        rollup = StatsRollup([('cpu', 'd'), ('mem', INT_TYPECODE)], 10, 5)
+        for second in xrange(100, 125):
+            rollup.add({'cpu': float(second % 10), 'mem': second}, second)
+
+        # the bucket starting at 120 is still open
+        self.assertEqual(2, len(rollup.buckets))
+        self.assertEqual({'timestamp': [100.0, 110.0],
+                          'seq': [1, 2],
+                          'cpu': [4.5, 4.5],
+                          'min.cpu': [0.0, 0.0],
+                          'max.cpu': [9.0, 9.0],
+                          'mem': [105, 115],
+                          'min.mem': [100, 110],
+                          'max.mem': [109, 119]},
+                         rollup.buckets.window())
+
+    def test_gap_closes_bucket(self):
+        rollup = StatsRollup([('cpu', 'd')], 60, 5)
+        rollup.add({'cpu': 10.0}, 61.5)
+        rollup.add({'cpu': 30.0}, 62.5)
+        rollup.add({'cpu': 50.0}, 300.0)
+        self.assertEqual({'timestamp': [60.0], 'seq': [1], 'cpu': [20.0],
+                          'min.cpu': [10.0], 'max.cpu': [30.0]},
+                         rollup.buckets.window())
+
+
+class StatsResamplerTests(unittest.TestCase):
+
+    def test_minmax_buckets(self):
+        timestamps = [float(t) for t in range(100)]
+        values = [t % 10 for t in range(100)]
+        resampler = StatsResampler(timestamps, 10)
+        self.assertEqual(10, len(resampler.slices))
+        self.assertEqual(range(0, 100, 10), resampler.first(timestamps))
+        self.assertEqual(range(9, 100, 10), resampler.last(timestamps))
+        averages, minimums, maximums = resampler.aggregate(values)
+        # the averages of integer columns are rounded
+        self.assertEqual([5] * 10, averages)
+        self.assertEqual([0] * 10, minimums)
+        self.assertEqual([9] * 10, maximums)
+
+    def test_sparse_samples(self):
+        # buckets have the same duration, not the same number of samples
+        timestamps = [0.0, 1.0, 2.0, 3.0, 10.0, 20.0]
+        resampler = StatsResampler(timestamps, 4)
+        self.assertEqual([(0, 4), (4, 5), (5, 6)], resampler.slices)
+
+        values = [1.0, float('nan'), 3.0, None, float('nan'), 5.0]
+        averages, minimums, maximums = resampler.aggregate(values)
+        self.assertEqual([2.0, None, 5.0], averages)
+        self.assertEqual([1.0, None, 5.0], minimums)
+        self.assertEqual([3.0, None, 5.0], maximums)
+
+    def test_fewer_samples(self):
+        resampler = StatsResampler([0.0, 1.0], 300)
+        self.assertEqual([(0, 1), (1, 2)], resampler.slices)
+
+    def test_lttb(self):
+        x = range(9)
+        y = [0, 0, 0, 10, 0, 0, 0, 0, 5]
+        indices = lttb_indices(x, y, 4)
+        self.assertEqual(4, len(indices))
+        self.assertEqual([0, 8], [indices[0], indices[-1]])
+        # the spike is kept
+        self.assertIn(3, indices)
+        self.assertEqual(range(9), lttb_indices(x, y, 20))
+
+        resampler = StatsResampler(x, 4, RESAMPLE_LTTB, y)
+        self.assertEqual(indices, resampler.first(x))
+        self.assertEqual([y[i] for i in indices], resampler.aggregate(y)[0])
+
+
+class QuantileSketchTests(unittest.TestCase):
+
+    def test_quantiles(self):
+        sketch = QuantileSketch()
+        self.assertEqual(None, sketch.quantile(0.5))
+        for value in xrange(1, 1001):
+            sketch.add(value)
+        for q, value in [(0.5, 500), (0.9, 900), (0.99, 990)]:
+            self.assertAlmostEqual(value, sketch.quantile(q),
+                                   delta=value * 0.01 + 1)
+
+        # zeroes are counted apart
+        for _ in xrange(1000):
+            sketch.add(0)
+        self.assertEqual(0.0, sketch.quantile(0.4))
+        for value in xrange(1, 1001):
+            sketch.remove(value)
+        self.assertEqual(1000, sketch.count)
+        self.assertEqual(0.0, sketch.quantile(0.99))
+
+
+class StatsSummaryTests(unittest.TestCase):
+
+    def test_sliding_window(self):
+        summary = StatsSummary([('cpu', [50, 90])], 10)
+        self.assertEqual({'cpu': {'p50': None, 'p90': None, 'p99': None,
+                                  'max': None, 'count': 0,
+                                  'histogram': {'bounds': [50, 90],
+                                                'counts': [0, 0, 0]}}},
+                         summary.summary())
+        for second in xrange(100):
+            summary.add({'cpu': float(second)}, second)
+
+        # only the last 10 seconds are accounted
+        cpu = summary.summary()['cpu']
+        self.assertEqual(10, cpu['count'])
+        self.assertEqual(99.0, cpu['max'])
+        self.assertAlmostEqual(94.0, cpu['p50'], delta=1)
+        self.assertAlmostEqual(99.0, cpu['p99'], delta=1)
+        # bounds are inclusive
+        self.assertEqual([0, 1, 9], cpu['histogram']['counts'])
+
+        # the maximum expires with its sample
+        summary.add({'cpu': 10.0}, 109)
+        self.assertEqual(10.0, summary.summary()['cpu']['max'])
+        self.assertEqual([1, 0, 0], summary.summary()['cpu']['histogram'][
+            'counts'])
+
+
+class CollectorHealthTests(unittest.TestCase):
+
+    def test_ticks(self):
+        health = CollectorHealth(1)
+        health.tick()
+        health.tick(1.01)
+        self.assertEqual(0, health.missed_ticks)
+        # two samples were skipped
+        health.tick(3.2)
+        health.tick(0.9)
+        self.assertEqual(4, health.ticks)
+        self.assertEqual(2, health.missed_ticks)
+        self.assertEqual(0.9, health.last_interval)
+        self.assertEqual(3.2, health.max_interval)
+
+    def test_expected_interval(self):
+        health = CollectorHealth(1)
+        # the collector was backing off to one sample every 10 seconds
+        health.tick(10.1, 10)
+        self.assertEqual(0, health.missed_ticks)
+        health.tick(20.0, 10)
+        self.assertEqual(1, health.missed_ticks)
+
+    def test_producers(self):
+        health = CollectorHealth(1)
+        health.account('cpu', 0.5)
+        health.account('cpu', 0.25)
+        health.account('disk', 0.125)
+        self.assertEqual({'cpu': [0.75, 0.25, 0.5],
+                          'disk': [0.125, 0.125, 0.125]}, health.producers)
+
+
+class StatsPublisherTests(unittest.TestCase):
+
+    def test_fan_out(self):
+        encoded = []
+
+        def encode(sample):
+            encoded.append(sample)
+            return json.dumps(sample)
+
+        publisher = StatsPublisher(encode)
+        publisher.publish(1, {'cpu': 1.0})
+        listeners = [publisher.listen() for _ in xrange(3)]
+        received = []
+
+        def consume(listener):
+            received.append(next(listener))
+
+        # listeners are registered on their first iteration
+        threads = [threading.Thread(target=consume, args=(listener,))
+                   for listener in listeners]
+        for thread in threads:
+            thread.start()
+        while publisher.subscribers < 3:
+            time.sleep(0.01)
+        publisher.publish(2, {'cpu': 2.0})
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual([(2, '{"cpu": 2.0}')] * 3, received)
+        # the sample was encoded only once for all the consumers
+        self.assertEqual([{'cpu': 2.0}], encoded)
+
+        for listener in listeners:
+            listener.close()
+        self.assertEqual(0, publisher.subscribers)
+
+    def test_resume(self):
+        publisher = StatsPublisher(str)
+        publisher.publish(5, 'five')
+        # a consumer behind the producer gets the last sample right away
+        listener = publisher.listen(3)
+        self.assertEqual((5, 'five'), next(listener))
+        listener.close()
+
+    def test_reserve(self):
+        publisher = StatsPublisher(str)
+        self.assertTrue(publisher.reserve(2))
+        self.assertTrue(publisher.reserve(2))
+        self.assertFalse(publisher.reserve(2))
+        # reserved consumers are released by the caller only
+        listener = publisher.listen(0, reserved=True)
+        publisher.publish(1, 'one')
+        self.assertEqual((1, 'one'), next(listener))
+        listener.close()
+        self.assertEqual(2, publisher.subscribers)
+        publisher.release()
+        self.assertTrue(publisher.reserve(2))
+
+    def test_timeout(self):
+        publisher = StatsPublisher(str)
+        publisher.publish(5, 'five')
+        # nothing was published in time, the consumer keeps its place
+        listener = publisher.listen(timeout=0.05)
+        self.assertEqual((5, None), next(listener))
+        publisher.publish(6, 'six')
+        self.assertEqual((6, 'six'), next(listener))
+        listener.close()
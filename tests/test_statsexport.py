@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+#
+# Project Ginger Base
+#
+# Copyright IBM Corp, 2017
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+import math
+import unittest
+
+from wok.plugins.gingerbase.statsexport import COLUMN_FLOAT, COLUMN_INT
+from wok.plugins.gingerbase.statsexport import decode_columns
+from wok.plugins.gingerbase.statsexport import encode_columns, encode_csv
+
+
+class StatsExportTests(unittest.TestCase):
+
+    def test_columns(self):
+        timestamps = [1500000000000 + 1000 * i for i in range(5)]
+        memory = [8 << 30, (8 << 30) - 4096, 8 << 30, 0, 1]
+        cpu = [0.5, None, 100.0, 12.25, 3.0]
+        data = encode_columns([('timestamp_ms', COLUMN_INT, timestamps),
+                               ('memory.free', COLUMN_INT, memory),
+                               ('cpu_utilization', COLUMN_FLOAT, cpu)])
+        columns = decode_columns(data)
+        self.assertEqual(['timestamp_ms', 'memory.free', 'cpu_utilization'],
+                         [name for name, _, _ in columns])
+        self.assertEqual(timestamps, columns[0][2])
+        self.assertEqual(memory, columns[1][2])
+        self.assertEqual(COLUMN_FLOAT, columns[2][1])
+        self.assertTrue(math.isnan(columns[2][2][1]))
+        self.assertEqual([0.5, 100.0, 12.25, 3.0],
+                         columns[2][2][:1] + columns[2][2][2:])
+
+        # 8 bytes per integer and 4 bytes per float value
+        self.assertEqual(5 * (8 + 8 + 4),
+                         len(data) - len(encode_columns(
+                             [('timestamp_ms', COLUMN_INT, []),
+                              ('memory.free', COLUMN_INT, []),
+                              ('cpu_utilization', COLUMN_FLOAT, [])])))
+
+    def test_empty(self):
+        self.assertEqual([('seq', COLUMN_INT, [])],
+                         decode_columns(encode_columns(
+                             [('seq', COLUMN_INT, [])])))
+        self.assertRaises(ValueError, decode_columns, 'not columns')
+
+    def test_csv(self):
+        text = encode_csv([('timestamp', [1.5, 2.5]), ('seq', [1, 2]),
+                           ('cpu_utilization', [None, float('nan')])])
+        self.assertEqual('timestamp,seq,cpu_utilization\n1.5,1,\n2.5,2,\n',
+                         text)
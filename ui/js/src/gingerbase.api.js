@@ -87,11 +87,13 @@ var gingerbase = {
     },
 
     /**
-     * Get the historic host stats.
+     * Get the historic host stats. If since is given, only the samples
+     * collected after the one with that sequence number are returned.
      */
-    getHostStatsHistory : function(suc, err) {
+    getHostStatsHistory : function(since, suc, err) {
+        var query = since === null ? '' : '?since=' + since;
         wok.requestJSON({
-            url : 'plugins/gingerbase/host/stats/history',
+            url : 'plugins/gingerbase/host/stats/history' + query,
             type : 'GET',
             resend: true,
             contentType : 'application/json',
@@ -603,27 +603,66 @@ gingerbase.init_dashboard = function() {
         };
 
 
-        var statsCallback = function(stats) {
+        // Sequence number of the last sample received, so only newer
+        // samples are requested
+        var lastSeq = null;
+        var source = null;
+
+        var addStats = function(stats) {
+            var seq = stats['seq'];
+            if (Array.isArray(seq)) {
+                seq = seq.length ? seq[seq.length - 1] : null;
+            }
+            if (seq === null || seq === lastSeq) {
+                return;
+            }
+            lastSeq = seq;
             var unifiedStats = UnifyStats(stats);
             statsPool.add(unifiedStats);
             for (var key in charts) {
                 var chart = charts[key];
                 chart.updateUI(statsPool.get(key));
             }
+        };
+
+        var statsCallback = function(stats) {
+            addStats(stats);
             timer = setTimeout(function() {
                 continueTrack();
             }, 1000);
         };
 
-        var track = function() {
-            gingerbase.getHostStatsHistory(statsCallback,
-                function() {
+        // Samples are pushed by the server when the browser supports
+        // Server-Sent Events, otherwise the history is polled.
+        var openStream = function() {
+            var url = 'plugins/gingerbase/host/stats/stream';
+            source = new EventSource(lastSeq === null ? url : url + '?since=' + lastSeq);
+            source.onmessage = function(event) {
+                addStats(JSON.parse(event.data));
+            };
+            // the stream is refused when too many clients are subscribed
+            source.onerror = function() {
+                if (source.readyState === EventSource.CLOSED) {
+                    source = null;
                     continueTrack();
-                });
+                }
+            };
+        };
+
+        var track = function() {
+            lastSeq = null;
+            if (!window.EventSource) {
+                continueTrack();
+                return;
+            }
+            gingerbase.getHostStatsHistory(null, function(stats) {
+                addStats(stats);
+                openStream();
+            }, openStream);
         };
 
         var continueTrack = function() {
-            gingerbase.getHostStats(statsCallback,
+            gingerbase.getHostStatsHistory(lastSeq, statsCallback,
                 function() {
                     continueTrack();
                 });
@@ -632,6 +671,8 @@ gingerbase.init_dashboard = function() {
         var destroy = function() {
             timer && clearTimeout(timer);
             timer = null;
+            source && source.close();
+            source = null;
         };
 
         return {